@@ -0,0 +1,124 @@
+import json, re
+import numpy as np
+
+URL_PATTERN = r'https?://[^\s\x00]+'
+# Teléfono: (?<!\d)\+?\d[\d\s\-\(\)]{7,}(?!\d), escrito como una alternativa por
+# carácter inicial para que `re` pueda saltar directo a los candidatos ('+' o dígito).
+PHONE_PATTERNS = [r'\+(?<!\d\+)\d[\d\s\-\(\)]{7,}(?!\d)'] + [
+    rf'{d}(?<!\d{d})[\d\s\-\(\)]{{7,}}(?!\d)' for d in "0123456789"
+]
+SEP = "\x00"          # separador entre bloques al puntuar en batch
+AD_SCORE = 2          # score mínimo para que un bloque cuente como anuncio
+
+def trie_branches(words) -> list:
+    """
+    Alternativas de un trie de `words`, una por carácter inicial y
+    factorizadas por prefijo común (p(?:atrocina|r(?:esenta|omoción))).
+    Cada una empieza con un literal: unidas con | al nivel superior, `re`
+    arma el conjunto de caracteres iniciales y salta directo a ellos.
+    """
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    def walk(node):
+        alts = [re.escape(ch) + walk(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        opt = "" in node
+        body = alts[0] if len(alts) == 1 and not opt else "(?:" + "|".join(alts) + ")"
+        return body + "?" if opt else body
+    return [re.escape(ch) + walk(sub) for ch, sub in sorted(trie.items()) if ch]
+
+class AdRuleEngine:
+    """
+    Reglas de `ad_heuristics` compiladas una vez. URL y teléfono suman 2 por
+    aparición, cada keyword suma 1 por bloque (misma puntuación que la versión
+    bloque a bloque de detect_ads).
+    """
+    def __init__(self, heur: dict):
+        pats = heur.get("patterns", {})
+        self.url = re.compile(URL_PATTERN) if pats.get("url") else None
+        self.phone = re.compile("|".join(PHONE_PATTERNS)) if pats.get("phone") else None
+        self.keywords = sorted({k.lower() for k in heur.get("keywords", [])})
+        self.by_first = {}
+        for kw in self.keywords:
+            if kw:
+                self.by_first.setdefault(kw[0], []).append(kw)
+        # una sola alternación plana (URL | teléfono | trie de keywords): todas
+        # sus ramas arrancan con un literal, así `re` salta a los candidatos
+        alts = ([URL_PATTERN] if self.url else []) + (PHONE_PATTERNS if self.phone else [])
+        alts += trie_branches(kw for kw in self.keywords if kw)
+        self.regex = re.compile("|".join(alts)) if alts else None
+        self.first = set(self.by_first) | set("h" * bool(self.url)) | set("+0123456789" * bool(self.phone))
+
+    def score(self, text: str):
+        """Devuelve (score, términos encontrados) para un bloque."""
+        scores, matched = self.score_blocks([text])
+        return int(scores[0]), matched[0]
+
+    def is_ad(self, text: str) -> bool:
+        return self.score(text)[0] >= AD_SCORE
+
+    def score_blocks(self, texts):
+        """
+        Puntúa todos los bloques de un transcript en una sola llamada: los
+        bloques se unen con SEP en un único buffer y un solo finditer (URL |
+        teléfono | trie de keywords) lo recorre. En el inicio de cada match y
+        dentro de su tramo se ve qué patrones empiezan ahí, para no perder
+        solapamientos (dígitos o keywords dentro de una URL). URL y teléfono
+        se cuentan sin solaparse consigo mismos (como findall) y cada keyword
+        una vez por bloque. Cada match se asigna a su bloque por offset.
+        Devuelve (np.ndarray de scores, lista de términos por bloque).
+        """
+        texts = [t.lower() for t in texts]  # antes de medir offsets
+        scores = np.zeros(len(texts), dtype=np.int32)
+        matched = [[] for _ in texts]
+        if not texts or self.regex is None:
+            return scores, matched
+        lens = np.fromiter((len(t) + 1 for t in texts), dtype=np.int64, count=len(texts))
+        starts = np.concatenate(([0], np.cumsum(lens)[:-1]))
+        hay = SEP.join(texts)
+
+        pos, terms, weights = [], [], []
+        ends = {"url": -1, "phone": -1}
+        for c in self.regex.finditer(hay):
+            for p in range(*c.span()):
+                if hay[p] not in self.first:
+                    continue
+                for kind, rx in (("url", self.url), ("phone", self.phone)):
+                    if rx is not None and p >= ends[kind]:
+                        m = rx.match(hay, p)
+                        if m:
+                            ends[kind] = m.end()
+                            pos.append(p); terms.append(m.group(0)); weights.append(2)
+                for kw in self.by_first.get(hay[p], ()):
+                    if hay.startswith(kw, p):
+                        pos.append(p); terms.append(kw); weights.append(1)
+        if not pos:
+            return scores, matched
+
+        pos = np.asarray(pos)
+        owner = (np.searchsorted(starts, pos, side="right") - 1).tolist()
+        seen = set()   # keyword: una vez por bloque
+        for b, t, w in zip(owner, terms, weights):
+            if w == 1:
+                if (b, t) in seen:
+                    continue
+                seen.add((b, t))
+            scores[b] += w
+            matched[b].append(t)
+        return scores, matched
+
+_ENGINES = {}
+
+def engine_for(cfg: dict) -> AdRuleEngine:
+    """Motor compilado para cfg["ad_heuristics"]; se cachea por contenido."""
+    heur = cfg["ad_heuristics"]
+    key = json.dumps(heur, sort_keys=True, ensure_ascii=False)
+    eng = _ENGINES.get(key)
+    if eng is None:
+        eng = _ENGINES[key] = AdRuleEngine(heur)
+    return eng
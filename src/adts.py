@@ -0,0 +1,181 @@
+"""
+Indexador de tramas ADTS sin decodificar (mmap + NumPy, sin ffprobe).
+
+Los segmentos Bronze son AAC en ADTS (-segment_format adts); con el
+fallback de streamlink el segment muxer los escribe como MPEG-TS. En los
+dos casos se recorren solo los encabezados de 7 bytes de cada trama:
+
+  - candidatos = todas las posiciones con syncword 0xFFF + layer 00 y
+    campos válidos, con su largo de trama;
+  - una trama es real si la siguiente empieza justo donde termina: la
+    cadena desde la primera trama se sigue con saltos de puntero
+    duplicados (log2(N) pasos vectorizados, no un bucle por trama);
+  - donde la cadena se corta hay pérdida de sync: los bytes hasta la
+    próxima trama encadenada se reportan como corruptos.
+
+Resultado por segmento: duración exacta, tramas, tasa de muestreo, canales,
+bitrate, offsets de pérdida de sync y rangos corruptos, y el índice de
+offsets de trama (uint32) que se guarda en <bronze>/frames/<stem>.npy.
+"""
+import mmap, os
+from pathlib import Path
+import numpy as np
+
+SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+SAMPLES_PER_FRAME = 1024
+TS_PACKET = 188
+
+def _candidates(b: np.ndarray):
+    """Posiciones con encabezado ADTS plausible → (pos, largo, sf_index, canales, bloques)."""
+    if len(b) < 7:
+        z = np.zeros(0, np.int64)
+        return z, z, z, z, z
+    c = np.flatnonzero((b[:-6] == 0xFF) & ((b[1:-5] & 0xF6) == 0xF0))
+    h2, h3, h4, h5, h6 = (b[c + k].astype(np.int64) for k in (2, 3, 4, 5, 6))
+    sf = (h2 >> 2) & 0xF
+    ch = ((h2 & 1) << 2) | (h3 >> 6)
+    flen = ((h3 & 3) << 11) | (h4 << 3) | (h5 >> 5)
+    hdr = np.where(b[c + 1] & 1, 7, 9)          # protection_absent=0 → 2 bytes de CRC
+    ok = (sf < len(SAMPLE_RATES)) & (flen > hdr)
+    return c[ok], flen[ok], sf[ok], ch[ok], (h6 & 3)[ok] + 1
+
+def _chain(start: int, jump: np.ndarray) -> np.ndarray:
+    """Índices alcanzables desde `start` siguiendo `jump` (punto fijo al final de la cadena)."""
+    on = np.zeros(len(jump), dtype=bool)
+    on[start] = True
+    step = jump
+    while True:
+        nodes = np.flatnonzero(on)
+        nxt = step[nodes]
+        if on[nxt].all():
+            return nodes
+        on[nxt] = True
+        step = step[step]
+
+def scan_frames(b: np.ndarray) -> tuple:
+    """Recorre las tramas ADTS de un buffer de bytes (ver docstring del módulo)."""
+    n = len(b)
+    pos, flen, sf, ch, blocks = _candidates(b)
+    end = pos + flen
+    k = np.searchsorted(pos, end)
+    linked = (k < len(pos)) & (pos[np.minimum(k, len(pos) - 1)] == end) if len(pos) else np.zeros(0, bool)
+    jump = np.where(linked, k, np.arange(len(pos)))
+    good = linked | (end == n)                  # arranques válidos: encadenan o cierran el archivo
+
+    frames, sync_losses, corrupt = [], [], []
+    cursor = 0                                  # fin de la última trama aceptada
+    i = int(np.argmax(good)) if good.any() else -1
+    while 0 <= i:
+        if pos[i] > cursor:
+            corrupt.append([cursor, int(pos[i])])
+        chain = _chain(i, jump)
+        last = int(chain[-1])
+        if end[last] == n:
+            frames.append(chain)
+            cursor = n
+            break
+        # la última trama no encadena: se corta la sync acá y se descarta esa trama
+        frames.append(chain[:-1])
+        sync_losses.append(int(pos[last]))
+        cursor = int(pos[last])
+        later = np.flatnonzero(good & (pos > pos[last]))
+        i = int(later[0]) if len(later) else -1
+    if cursor < n:
+        corrupt.append([cursor, n])
+
+    idx = np.concatenate(frames) if frames else np.zeros(0, np.int64)
+    info = {"frames": int(len(idx)), "bytes": int(n), "sync_losses": sync_losses, "corrupt": corrupt,
+            "corrupt_bytes": int(sum(e - s for s, e in corrupt))}
+    if not len(idx):
+        info.update(duration_sec=0.0, sample_rate=None, channels=None, bitrate=None)
+        return info, np.zeros(0, np.uint32)
+    sfi = int(np.bincount(sf[idx]).argmax())
+    rate = SAMPLE_RATES[sfi]
+    dur = float(blocks[idx].sum()) * SAMPLES_PER_FRAME / rate
+    info.update(duration_sec=round(dur, 4), sample_rate=rate, channels=int(np.bincount(ch[idx]).argmax()),
+                bitrate=int(flen[idx].sum() * 8 / dur) if dur else None)
+    return info, pos[idx].astype(np.uint32)
+
+def _ts_audio_payload(b: np.ndarray):
+    """
+    MPEG-TS → (bytes del ES de audio concatenados, offset en el archivo de cada uno).
+    Se toma el primer PID cuyo PES es de audio (stream_id 0xC0–0xDF).
+    """
+    n = len(b) // TS_PACKET
+    allp = b[:n * TS_PACKET].reshape(n, TS_PACKET)
+    rows = np.flatnonzero(allp[:, 0] == 0x47)   # paquetes sin sync se descartan
+    p = allp[rows]
+    r = np.arange(len(p))
+    pid = ((p[:, 1].astype(np.int32) & 0x1F) << 8) | p[:, 2]
+    afc = (p[:, 3] >> 4) & 3
+    has_payload = (afc & 1) != 0
+    start = np.where(afc & 2, 5 + p[:, 4].astype(np.int32), 4)
+    # PES de audio: 00 00 01 C0..DF al inicio del payload, ES después del encabezado PES
+    at = np.minimum(start, TS_PACKET - 9)
+    is_pes = (((p[:, 1] & 0x40) != 0) & has_payload
+              & (p[r, at] == 0) & (p[r, at + 1] == 0) & (p[r, at + 2] == 1))
+    audio = is_pes & (p[r, at + 3] >= 0xC0) & (p[r, at + 3] <= 0xDF)
+    if not audio.any():
+        return None, None
+    sel = (pid == pid[np.flatnonzero(audio)[0]]) & has_payload
+    es_start = np.where(is_pes, at + 9 + p[r, at + 8], start)
+    cols = np.arange(TS_PACKET)
+    mask = sel[:, None] & (cols[None, :] >= es_start[:, None])
+    file_pos = (rows[:, None] * TS_PACKET + cols[None, :])[mask]
+    return p[mask], file_pos
+
+def scan_file(path) -> tuple:
+    """(info, offsets) de un segmento; offsets = inicio de cada trama en el archivo."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return {"container": None, "frames": 0, "bytes": 0, "duration_sec": 0.0, "sample_rate": None,
+                "channels": None, "bitrate": None, "sync_losses": [], "corrupt": [], "corrupt_bytes": 0}, np.zeros(0, np.uint32)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        b = np.frombuffer(mm, dtype=np.uint8)
+        try:
+            if size > TS_PACKET and b[0] == 0x47 and b[TS_PACKET] == 0x47:
+                es, file_pos = _ts_audio_payload(b)
+                if es is None:
+                    info, offs = scan_frames(np.zeros(0, np.uint8))
+                else:
+                    info, offs = scan_frames(es)
+                    # pérdidas/corruptos también en offsets del archivo .ts
+                    to_file = lambda o: int(file_pos[min(o, len(file_pos) - 1)]) if len(file_pos) else 0
+                    info["sync_losses"] = [to_file(o) for o in info["sync_losses"]]
+                    info["corrupt"] = [[to_file(s), to_file(e - 1) + 1] for s, e in info["corrupt"]]
+                    offs = file_pos[offs].astype(np.uint32) if len(offs) else offs
+                info["bytes"] = size
+                info["container"] = "mpegts"
+            else:
+                info, offs = scan_frames(b)
+                info["container"] = "adts" if info["frames"] else None
+        finally:
+            del b
+    return info, offs
+
+def index_path(seg) -> Path:
+    return Path(seg).parent / "frames" / (Path(seg).stem + ".npy")
+
+def write_index(seg, offsets: np.ndarray) -> Path:
+    out = index_path(seg)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(f".{out.name}")
+    with open(tmp, "wb") as f:
+        np.save(f, offsets.astype(np.uint32))
+    os.replace(tmp, out)
+    return out
+
+def load_index(seg):
+    """Offsets de trama guardados por el manifest; None si faltan o son más viejos que el segmento."""
+    p = index_path(seg)
+    try:
+        if p.stat().st_mtime_ns >= os.stat(seg).st_mtime_ns:
+            return np.load(p, mmap_mode="r")
+    except OSError:
+        pass
+    return None
+
+def segment_duration(seg, default: float = None) -> float:
+    """Duración exacta por tramas; `default` si no es ADTS legible."""
+    info, _ = scan_file(seg)
+    return info["duration_sec"] if info["frames"] else default
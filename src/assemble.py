@@ -1,7 +1,187 @@
-import shlex, subprocess
+import json, os, re, shlex, shutil, subprocess, tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from .config import load_config
 from .paths import gold_dir
+from .stage_cache import StageCache
+from .utils import ffmpeg_bin
+from .assemble_crossfade import render_crossfade
+from .assemble_adts import plan_ranges, render_adts, source_bitrate
+from . import metrics
+
+# final_format -> (extensión, codec de salida, muxer)
+FORMATS = {
+    "mp3": (".mp3", "mp3", "mp3"),
+    "aac": (".aac", "aac", "adts"),
+    "m4a": (".m4a", "aac", "ipod"),
+}
+SEG_RE = re.compile(r"raw_segment_(\d+)_")
+# tolerancia de "segmento entero": una trama mp3/aac (~26 ms) + redondeo a ms del keeplist
+EDGE_TOL_SEC = 0.05
+
+def keeplist_files(keepfile: Path) -> list:
+    """Rutas únicas referenciadas por las líneas `file '...'` del keeplist."""
+    files = []
+    for line in keepfile.read_text(encoding="utf-8").splitlines():
+        if line.startswith("file '") and line.endswith("'"):
+            fp = line[6:-1]
+            if fp not in files:
+                files.append(fp)
+    return files
+
+def keeplist_entries(keepfile: Path) -> list:
+    """Entradas del keeplist: [{"file", "inpoint", "outpoint"}] (inpoint/outpoint opcionales)."""
+    entries = []
+    for line in keepfile.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line.startswith("file '") and line.endswith("'"):
+            entries.append({"file": line[6:-1], "inpoint": None, "outpoint": None})
+        elif entries and line.startswith(("inpoint ", "outpoint ")):
+            k, v = line.split(None, 1)
+            entries[-1][k] = float(v)
+    return entries
+
+def write_entries(entries: list, path: Path):
+    with open(path, "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(f"file '{e['file']}'\n")
+            if e["inpoint"] is not None:
+                f.write(f"inpoint {e['inpoint']:.3f}\n")
+            if e["outpoint"] is not None:
+                f.write(f"outpoint {e['outpoint']:.3f}\n")
+
+def probe_audio(path: str, cfg: dict) -> dict:
+    """codec/bitrate del primer stream de audio vía ffprobe; {} si no se puede."""
+    ffprobe = cfg.get("paths", {}).get("ffprobe") or shutil.which("ffprobe")
+    if not ffprobe:
+        return {}
+    cmd = [ffprobe, "-v", "error", "-select_streams", "a:0",
+           "-show_entries", "stream=codec_name,bit_rate,sample_rate,channels:format=bit_rate",
+           "-of", "json", str(path)]
+    try:
+        out = json.loads(subprocess.run(cmd, capture_output=True, check=True).stdout or b"{}")
+    except (subprocess.CalledProcessError, ValueError):
+        return {}
+    st = (out.get("streams") or [{}])[0]
+    br = st.get("bit_rate") or out.get("format", {}).get("bit_rate")
+    return {"codec": st.get("codec_name"), "bit_rate": int(br) if br else None}
+
+def _bps(rate: str) -> int:
+    rate = str(rate).lower()
+    return int(float(rate[:-1]) * 1000) if rate.endswith("k") else int(rate)
+
+def can_stream_copy(entries: list, final_format: str, target_bitrate: str, cfg: dict) -> bool:
+    """True si todos los archivos ya están en el codec final a ~la tasa pedida."""
+    acfg = cfg.get("assembly", {})
+    if not acfg.get("copy_if_compatible", True):
+        return False
+    tol = float(acfg.get("copy_bitrate_tolerance", 0.15))
+    want_codec = FORMATS[final_format][1]
+    want_bps = _bps(target_bitrate)
+    for fp in dict.fromkeys(e["file"] for e in entries):
+        info = probe_audio(fp, cfg)
+        if info.get("codec") != want_codec or not info.get("bit_rate"):
+            return False
+        if abs(info["bit_rate"] - want_bps) > tol * want_bps:
+            return False
+    return True
+
+def byte_copy_plan(entries: list, final_format: str, target_bitrate: str, cfg: dict):
+    """
+    Rangos de bytes para armar el final sin decodificar: fuentes ADTS, salida
+    AAC y bitrate dentro de la tolerancia de copia. None si no aplica.
+    """
+    acfg = cfg.get("assembly", {})
+    if FORMATS[final_format][1] != "aac" or not acfg.get("byte_copy", True) or not acfg.get("copy_if_compatible", True):
+        return None
+    tol = float(acfg.get("copy_bitrate_tolerance", 0.15))
+    want_bps = _bps(target_bitrate)
+    have_bps = source_bitrate(entries)
+    if not have_bps or abs(have_bps - want_bps) > tol * want_bps:
+        return None
+    return plan_ranges(entries)
+
+def seg_index(path: str):
+    m = SEG_RE.search(Path(path).name)
+    return int(m.group(1)) if m else None
+
+def probe_duration(path: str, cfg: dict):
+    """Duración del contenedor en segundos (ffprobe, o el encabezado de ffmpeg -i); None si no se puede."""
+    ffprobe = cfg.get("paths", {}).get("ffprobe") or shutil.which("ffprobe")
+    if ffprobe:
+        cmd = [ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)]
+        try:
+            return float(subprocess.run(cmd, capture_output=True, check=True).stdout)
+        except (subprocess.CalledProcessError, ValueError):
+            return None
+    err = subprocess.run([ffmpeg_bin(cfg), "-hide_banner", "-nostdin", "-i", str(path)],
+                         capture_output=True, text=True).stderr
+    m = re.search(r"Duration: (\d+):(\d+):([\d.]+)", err)
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3)) if m else None
+
+def file_durations(entries: list, cfg: dict, default_dur: float) -> dict:
+    """archivo -> duración (ffprobe, en paralelo); default_dur si no se puede medir."""
+    files = list(dict.fromkeys(e["file"] for e in entries))
+    with ThreadPoolExecutor(max_workers=min(8, len(files) or 1)) as ex:
+        durs = list(ex.map(lambda fp: probe_duration(fp, cfg), files))
+    return {fp: d or default_dur for fp, d in zip(files, durs)}
+
+def edit_points(entries: list, durations: dict) -> list:
+    """
+    edits[i]: True si entre entries[i] y entries[i+1] se quitó audio. La
+    unión es continua solo si la entrada llega al final de su segmento
+    (outpoint ausente o a una trama de la duración), la siguiente arranca en
+    0 y es el segmento que sigue (mismo índice + 1). keeplist fino y de
+    segmentos enteros se tratan igual: saltear un segmento es un corte.
+    """
+    edits = []
+    for e, nxt in zip(entries, entries[1:]):
+        out = e["outpoint"]
+        whole = out is None or out >= durations.get(e["file"], out) - EDGE_TOL_SEC
+        starts = (nxt["inpoint"] or 0.0) <= 0
+        i, j = seg_index(e["file"]), seg_index(nxt["file"])
+        follows = nxt["file"] != e["file"] and (i is None or j is None or j == i + 1)
+        edits.append(not (whole and starts and follows))
+    return edits
+
+def entry_edits(entries: list, cfg: dict):
+    """(duraciones por archivo, edit_points) del keeplist; duración por defecto = segment_time_sec."""
+    seg_time = float(cfg.get("recording", {}).get("segment_time_sec", cfg.get("segment_time_sec", 600)))
+    durations = file_durations(entries, cfg, seg_time)
+    return durations, edit_points(entries, durations)
+
+def split_entries(entries: list, n: int, durations: dict, edits: list) -> list:
+    """
+    Parte el keeplist en hasta n tramos contiguos de duración parecida. Solo
+    se corta en puntos de edición reales (edit_points): cada encoder agrega
+    su retardo inicial y relleno final, así que un corte en audio continuo
+    (fin de un segmento entero → inicio del siguiente) dejaría un hueco.
+    """
+    durs = [((e["outpoint"] if e["outpoint"] is not None else durations[e["file"]])
+             - (e["inpoint"] or 0.0)) for e in entries]
+    total = sum(durs)
+    n = max(1, min(n, len(entries)))
+    chunks, cur, acc = [], [], 0.0
+    for i, (e, d) in enumerate(zip(entries, durs)):
+        cur.append(e); acc += d
+        edit = i < len(edits) and edits[i]
+        if edit and len(chunks) < n - 1 and acc >= total * (len(chunks) + 1) / n:
+            chunks.append(cur); cur = []
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+def _encode_args(final_format: str, cfg: dict) -> list:
+    if final_format == "mp3":
+        return ["-vn", "-acodec", "libmp3lame", "-b:a", cfg.get("mp3_bitrate", "160k")]
+    return ["-vn", "-c:a", "aac", "-b:a", cfg.get("aac_bitrate", "128k")]
+
+def _ffmpeg(cfg: dict) -> list:
+    return [ffmpeg_bin(cfg), "-hide_banner", "-loglevel", "warning", "-y"]
+
+def _run(cmd) -> int:
+    print("Running:", " ".join(shlex.quote(str(c)) for c in cmd))
+    return metrics.call(cmd)
 
 def assemble_clean(cfg: dict = None):
     cfg = cfg or load_config()
@@ -10,32 +190,88 @@ def assemble_clean(cfg: dict = None):
     if not keepfile.exists():
         raise SystemExit(f"Not found: {keepfile}")
 
-    clean_ts = gdir / "program_clean.ts"
-    cmd1 = [
-        "ffmpeg", "-hide_banner", "-loglevel", "warning", "-y",
-        "-f", "concat", "-safe", "0", "-i", str(keepfile),
-        "-c", "copy", str(clean_ts)
-    ]
-    print("Running:", " ".join(shlex.quote(c) for c in cmd1))
-    rc = subprocess.call(cmd1)
-    if rc != 0: return rc
-
     final_format = cfg.get("final_format","mp3").lower()
-    if final_format == "mp3":
-        final_path = gdir / "program_clean.mp3"
-        cmd2 = [
-            "ffmpeg", "-hide_banner", "-loglevel", "warning", "-y",
-            "-i", str(clean_ts),
-            "-vn", "-acodec", "libmp3lame", "-b:a", cfg.get("mp3_bitrate","160k"),
-            str(final_path)
-        ]
+    if final_format not in FORMATS:
+        print("Unknown final_format:", final_format)
+        return 3
+    ext, _, muxer = FORMATS[final_format]
+    final_path = gdir / f"program_clean{ext}"
+    cache = StageCache.for_dir(gdir, cfg)
+    key = cache.key("assemble", [keepfile] + keeplist_files(keepfile), cfg,
+                    ["final_format", "mp3_bitrate", "aac_bitrate", "assembly"])
+    if cache.fresh(final_path, key):
+        print("Clean program up to date:", final_path)
+        cache.save()
+        return 0
+
+    entries = keeplist_entries(keepfile)
+    if not entries:
+        print("Keep list vacío:", keepfile)
+        return 1
+    bitrate = cfg.get("mp3_bitrate", "160k") if final_format == "mp3" else cfg.get("aac_bitrate", "128k")
+
+    crossfade = cfg.get("assembly", {}).get("mode") == "crossfade"
+    plan = None if crossfade else byte_copy_plan(entries, final_format, bitrate, cfg)
+    if crossfade:
+        rc = render_crossfade(entries, final_path, _encode_args(final_format, cfg), muxer, cfg,
+                              entry_edits(entries, cfg)[1])
+    elif plan is not None:
+        # recortes alineados a trama ADTS copiados como rangos de bytes, sin decoder
+        rc = render_adts(plan, final_path, muxer, lambda args: _run(_ffmpeg(cfg) + args))
+    elif can_stream_copy(entries, final_format, bitrate, cfg):
+        # mismo codec y tasa: concat directo al archivo final, sin recodificar
+        rc = _run(_ffmpeg(cfg) + ["-f", "concat", "-safe", "0", "-i", str(keepfile),
+                                  "-vn", "-c", "copy", "-f", muxer, str(final_path)])
     else:
-        final_path = gdir / "program_clean.aac"
-        cmd2 = [
-            "ffmpeg", "-hide_banner", "-loglevel", "warning", "-y",
-            "-i", str(clean_ts),
-            "-vn", "-c:a", "aac", "-b:a", cfg.get("aac_bitrate","128k"),
-            str(final_path)
-        ]
-    print("Running:", " ".join(shlex.quote(c) for c in cmd2))
-    return subprocess.call(cmd2)
+        rc = _encode_parallel(entries, final_path, final_format, muxer, cfg)
+    if rc == 0:
+        cache.record(final_path, key)
+    cache.save()
+    return rc
+
+def _encode_parallel(entries: list, final_path: Path, final_format: str, muxer: str, cfg: dict) -> int:
+    """
+    Recodifica en paralelo: cada tramo del keeplist se decodifica desde Bronze
+    y se codifica directo al formato final en su propio ffmpeg (los encoders
+    mp3/aac usan un solo core); después se unen con concat + copy. Los tramos
+    se separan solo en puntos de edición (split_entries): el audio continuo
+    pasa por un único encoder y queda sin huecos; sin puntos de edición hay
+    un solo encoder.
+    """
+    acfg = cfg.get("assembly", {})
+    workers = int(acfg.get("encode_workers", 0) or 0) or (os.cpu_count() or 1)
+    chunks = split_entries(entries, workers, *entry_edits(entries, cfg))
+    enc = _encode_args(final_format, cfg)
+
+    with tempfile.TemporaryDirectory(prefix=".assemble_", dir=final_path.parent) as tmp:
+        tmp = Path(tmp)
+        if len(chunks) == 1:
+            write_entries(chunks[0], tmp / "chunk_000.txt")
+            return _run(_ffmpeg(cfg) + ["-f", "concat", "-safe", "0", "-i", str(tmp / "chunk_000.txt")]
+                        + enc + ["-f", muxer, str(final_path)])
+
+        # tramos en un formato que se puede concatenar con copy (ADTS para aac)
+        piece_ext, piece_mux = (".mp3", "mp3") if final_format == "mp3" else (".aac", "adts")
+        jobs = []
+        for i, chunk in enumerate(chunks):
+            lst = tmp / f"chunk_{i:03d}.txt"
+            write_entries(chunk, lst)
+            out = tmp / f"chunk_{i:03d}{piece_ext}"
+            jobs.append((_ffmpeg(cfg) + ["-f", "concat", "-safe", "0", "-i", str(lst)]
+                         + enc + ["-write_xing", "0"] * (final_format == "mp3") + ["-f", piece_mux, str(out)], out))
+        print(f"[ASSEMBLE] encoding {len(chunks)} chunks in parallel")
+        with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+            rcs = list(ex.map(lambda j: _run(j[0]), jobs))
+        if any(rcs):
+            return next(rc for rc in rcs if rc)
+
+        # mp3 y ADTS son tramas autodelimitadas: unir bytes evita que el concat
+        # demuxer desplace timestamps con duraciones estimadas por bitrate.
+        joined = final_path if muxer == piece_mux else tmp / f"joined{piece_ext}"
+        with open(joined, "wb") as dst:
+            for _, out in jobs:
+                with open(out, "rb") as src:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+        if joined == final_path:
+            return 0
+        return _run(_ffmpeg(cfg) + ["-i", str(joined), "-c", "copy", "-f", muxer, str(final_path)])
@@ -0,0 +1,153 @@
+"""
+Render del keeplist con crossfades (assembly.mode = "crossfade").
+
+Cada tramo (inpoint/outpoint) se decodifica con su propio ffmpeg usando
+-ss antes de -i (seek, no se decodifica el segmento entero) y se procesa en
+bloques de tamaño fijo. En cada punto de edición (assemble.edit_points), los
+últimos `crossfade_sec` del tramo anterior se mezclan con los primeros del
+siguiente con curvas de igual potencia (cos/sin); donde no se quitó audio
+(fin de un segmento entero → inicio del siguiente) los tramos se pegan tal
+cual. Todo sale por un único encoder leyendo PCM de stdin:
+la memoria es O(bloque + crossfade), sin importar la duración del programa.
+"""
+import shlex, subprocess
+from pathlib import Path
+import numpy as np
+
+from .utils import ffmpeg_bin
+from .pcm import _read_full
+from . import metrics
+
+BLOCK_SEC = 1.0
+
+def _decoder(entry: dict, cfg: dict, rate: int, channels: int) -> subprocess.Popen:
+    start = entry["inpoint"] or 0.0
+    cmd = [ffmpeg_bin(cfg), "-hide_banner", "-loglevel", "error", "-nostdin"]
+    if start > 0:
+        cmd += ["-ss", f"{start:.3f}"]
+    cmd += ["-i", entry["file"]]
+    if entry["outpoint"] is not None:
+        cmd += ["-t", f"{entry['outpoint'] - start:.3f}"]
+    cmd += ["-vn", "-ac", str(channels), "-ar", str(rate), "-f", "s16le", "-"]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=0)
+
+def _frames(proc: subprocess.Popen, block_frames: int, channels: int):
+    """Bloques float32 (frames, channels) de un decoder; el buffer int16 se reutiliza."""
+    buf = np.empty(block_frames * channels, dtype=np.int16)
+    mv = memoryview(buf).cast("B")
+    frame_bytes = 2 * channels
+    try:
+        while True:
+            got = _read_full(proc.stdout, mv)
+            n = got - got % frame_bytes
+            if n:
+                yield buf[: n // 2].reshape(-1, channels).astype(np.float32)
+            if got < len(mv):
+                break
+    finally:
+        proc.stdout.close()
+        rc = proc.wait()
+    if rc != 0:
+        raise RuntimeError(f"ffmpeg decode failed ({rc})")
+
+def equal_power(n: int):
+    """Curvas (fade_out, fade_in) de n frames con fade_out² + fade_in² = 1."""
+    theta = (np.arange(n, dtype=np.float32) + 0.5) * (np.pi / 2 / n)
+    return np.cos(theta)[:, None], np.sin(theta)[:, None]
+
+class CrossfadeWriter:
+    """
+    Recibe tramos como iteradores de bloques y escribe PCM int16 en `out`.
+    Retiene siempre los últimos `xfade` frames (la cola) para mezclarlos con
+    la cabeza del tramo siguiente; nada más queda en memoria.
+    """
+    def __init__(self, out, xfade: int, channels: int):
+        self.out = out
+        self.xfade = xfade
+        self.tail = np.zeros((0, channels), dtype=np.float32)
+        self.frames = 0
+        self.joins = 0
+
+    def _write(self, x: np.ndarray):
+        if len(x):
+            self.out.write(np.clip(x, -32768, 32767).astype(np.int16).tobytes())
+            self.frames += len(x)
+
+    def add(self, blocks, crossfade: bool = True):
+        """Agrega un tramo; crossfade=False lo pega a continuación del anterior, sin mezclar."""
+        first = crossfade
+        carry = None
+        for b in blocks:
+            if first and len(self.tail):
+                # juntamos la cabeza completa antes de mezclar
+                carry = b if carry is None else np.concatenate([carry, b])
+                if len(carry) < self.xfade:
+                    continue
+                b = self._mix(carry)
+                carry = None
+            first = False
+            self._push(b)
+        if carry is not None:  # tramo más corto que el crossfade
+            self._push(self._mix(carry))
+
+    def _mix(self, head: np.ndarray) -> np.ndarray:
+        n = min(len(self.tail), len(head))
+        fo, fi = equal_power(n)
+        mixed = self.tail[len(self.tail) - n:] * fo + head[:n] * fi
+        self._write(self.tail[: len(self.tail) - n])
+        self.tail = self.tail[:0]
+        self.joins += 1
+        return np.concatenate([mixed, head[n:]])
+
+    def _push(self, b: np.ndarray):
+        if len(self.tail):
+            b = np.concatenate([self.tail, b])
+        cut = max(0, len(b) - self.xfade)
+        self._write(b[:cut])
+        self.tail = b[cut:].copy()
+
+    def close(self):
+        self._write(self.tail)
+        self.tail = self.tail[:0]
+
+def render_crossfade(entries: list, final_path: Path, enc_args: list, muxer: str, cfg: dict,
+                     edits: list = None) -> int:
+    """edits[i]: hay corte entre entries[i] y entries[i+1] (None = en todas las uniones)."""
+    acfg = cfg.get("assembly", {})
+    rate = int(acfg.get("render_sample_rate", 44100))
+    channels = int(acfg.get("render_channels", 2))
+    xfade = int(float(acfg.get("crossfade_sec", 0.25)) * rate)
+    block_frames = int(BLOCK_SEC * rate)
+
+    enc_cmd = [ffmpeg_bin(cfg), "-hide_banner", "-loglevel", "warning", "-y",
+               "-f", "s16le", "-ar", str(rate), "-ac", str(channels), "-i", "-"] + enc_args + ["-f", muxer, str(final_path)]
+    print("Running:", " ".join(shlex.quote(str(c)) for c in enc_cmd))
+    enc = subprocess.Popen(enc_cmd, stdin=subprocess.PIPE)
+    writer = CrossfadeWriter(enc.stdin, xfade, channels)
+    nxt = None
+    try:
+        # el decoder siguiente arranca (y hace el seek) mientras se consume el actual
+        nxt = _decoder(entries[0], cfg, rate, channels)
+        for i in range(len(entries)):
+            cur = nxt
+            nxt = _decoder(entries[i + 1], cfg, rate, channels) if i + 1 < len(entries) else None
+            writer.add(_frames(cur, block_frames, channels), crossfade=edits is None or i == 0 or edits[i - 1])
+        writer.close()
+    except BrokenPipeError:
+        pass
+    except BaseException:
+        enc.kill()
+        if nxt is not None:
+            nxt.kill()
+        raise
+    finally:
+        if enc.stdin and not enc.stdin.closed:
+            try:
+                enc.stdin.close()
+            except BrokenPipeError:
+                pass
+    rc = enc.wait()
+    print(f"[ASSEMBLE] crossfade: {len(entries)} tramos, {writer.joins} uniones, "
+          f"{writer.frames / rate:.1f}s de audio")
+    metrics.emit("crossfade", entries=len(entries), joins=writer.joins, audio_sec=writer.frames / rate)
+    return rc
@@ -1,16 +1,20 @@
 import os, glob, json
 from pathlib import Path
-from pydub import AudioSegment, silence
-import webrtcvad
 import numpy as np
-import wave
+from numpy.lib.stride_tricks import sliding_window_view
 
 from .config import load_config
 from .paths import bronze_dir, silver_dir
+from .stage_cache import StageCache
+from .pcm import segment_blocks, SAMPLE_RATE
+from . import lake, metrics
+
+VAD_FRAME = SAMPLE_RATE * 30 // 1000   # 30 ms → 480 muestras
 
 def analyze_segments(cfg: dict = None):
     """
-    Analiza segmentos de audio en Bronze para detectar silencios y actividad de voz.
+    Analiza segmentos de audio en Bronze: silencios, actividad de voz y
+    timeline voz / música / silencio.
     Guarda metadatos en JSON por cada segmento.
     """
     cfg = cfg or load_config()
@@ -23,59 +27,276 @@ def analyze_segments(cfg: dict = None):
         print("No hay segmentos en Bronze:", bdir)
         return 1
 
+    cache = StageCache.for_dir(sdir, cfg)
     for seg in segments:
-        # Convertimos con pydub
-        audio = AudioSegment.from_file(seg, format="ts")
-        
-        # Detectar silencios largos
-        silences = silence.detect_silence(audio, min_silence_len=1000, silence_thresh=-35)
-        silences = [(start/1000, stop/1000) for start, stop in silences]  # segs
-
-        # Exportar a WAV mono 16k para VAD
-        wav_path = str(Path(seg).with_suffix(".wav"))
-        audio.set_channels(1).set_frame_rate(16000).export(wav_path, format="wav")
-
-        vad = webrtcvad.Vad(2)  # 0=agresivo bajo, 3=alto
-        frames = read_frames(wav_path, frame_duration_ms=30)
-        speech_flags = [vad.is_speech(f.bytes, 16000) for f in frames]
-
-        voice_ratio = sum(speech_flags) / len(speech_flags) if speech_flags else 0.0
-
-        meta = {
-            "segment": os.path.basename(seg),
-            "duration_sec": audio.duration_seconds,
-            "silences": silences,
-            "voice_activity_ratio": voice_ratio,
-            "notes": f"Voz en {voice_ratio*100:.1f}% del segmento"
-        }
-
-        # Guardar en Silver
-        out_json = sdir / (Path(seg).stem + "_audio_meta.json")
-        with open(out_json, "w", encoding="utf-8") as f:
-            json.dump(meta, f, ensure_ascii=False, indent=2)
-
-        print("Guardado:", out_json)
+        analyze_segment(seg, sdir, cfg, cache)
+    cache.save()
+    return 0
+
+def analyze_segment(seg: str, sdir: Path, cfg: dict, cache: StageCache) -> int:
+    """Analiza un segmento y escribe <stem>_audio_meta.json (salvo que esté en caché)."""
+    out_json = sdir / (Path(seg).stem + "_audio_meta.json")
+    key = cache.key("audio-analysis", [seg], cfg, ["audio_analysis"])
+    if cache.fresh(out_json, key):
+        return 0
+
+    with metrics.span("analyze", segment=os.path.basename(seg)):
+        meta = analyze_file(seg, cfg, cfg.get("audio_analysis", {}), sdir)
+
+    # Guardar en Silver
+    with open(out_json, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    cache.record(out_json, key)
+    lake.put_audio_meta(cfg, meta)
 
+    print("Guardado:", out_json)
     return 0
 
-# Helpers para VAD
-class Frame(object):
-    def __init__(self, bytes, timestamp, duration):
-        self.bytes = bytes
-        self.timestamp = timestamp
-        self.duration = duration
-
-def read_frames(wav_path, frame_duration_ms=30):
-    with wave.open(wav_path, "rb") as wf:
-        sample_rate = wf.getframerate()
-        bytes_per_frame = int(sample_rate * 2 * frame_duration_ms / 1000)
-        timestamp = 0.0
-        duration = (float(bytes_per_frame) / (2 * sample_rate))
-        frames = []
-        while True:
-            data = wf.readframes(int(bytes_per_frame / 2))
-            if len(data) < bytes_per_frame:
-                break
-            frames.append(Frame(data, timestamp, duration))
-            timestamp += duration
-        return frames
+def analyze_file(seg: str, cfg: dict, acfg: dict = None, sdir: Path = None) -> dict:
+    """
+    Una sola decodificación (bloques NumPy fijos; con sdir, vistas sobre la
+    caché de PCM de Silver que después reusan transcribe y fingerprint):
+    silencios vectorizados por bloque y VAD sobre slices memoryview sin copia.
+    """
+    import webrtcvad  # trae pkg_resources: solo cuando se analiza audio
+    acfg = acfg or {}
+    silences = SilenceTracker(SAMPLE_RATE,
+                              thresh_db=float(acfg.get("silence_thresh_db", -35)),
+                              min_len_ms=int(acfg.get("min_silence_ms", 1000)))
+    classes = FrameClassifier(SAMPLE_RATE, thresh_db=float(acfg.get("silence_thresh_db", -35)),
+                              **acfg.get("classifier", {}))
+    vad = webrtcvad.Vad(int(acfg.get("vad_mode", 2)))  # 0=agresivo bajo, 3=alto
+    n_samples = 0
+    flags = bytearray()  # timeline de VAD: 1 byte por frame de 30 ms
+
+    for block in segment_blocks(seg, cfg, sdir):
+        n_samples += len(block)
+        silences.feed(block)
+        classes.feed(block)
+        _vad_feed(vad, block, flags)
+
+    speech = np.frombuffer(bytes(flags), dtype=np.uint8)
+    voice_ratio = float(speech.mean()) if len(speech) else 0.0
+    duration = n_samples / SAMPLE_RATE
+    labels = classes.finish()
+    fsec = classes.frame_sec
+    talk = label_runs(labels, SPEECH, fsec, duration)
+    counts = np.bincount(labels, minlength=3) / max(1, len(labels))
+    return {
+        "segment": os.path.basename(seg),
+        "duration_sec": duration,
+        "silences": silences.finish(),
+        "voice_activity_ratio": voice_ratio,
+        "speech_runs": speech_runs(speech),
+        # timeline compacto: un carácter por ventana de frame_sec ("_" silencio, "s" voz, "m" música)
+        "classes": {"frame_sec": fsec, "labels": "".join(np.asarray(list(LABELS))[labels]) if len(labels) else ""},
+        "music_runs": label_runs(labels, MUSIC, fsec, duration),
+        "speech_ratio": round(float(counts[SPEECH]), 4),
+        "music_ratio": round(float(counts[MUSIC]), 4),
+        "first_speech_start_sec": talk[0][0] if talk else duration,
+        "last_speech_end_sec": talk[-1][1] if talk else 0.0,
+        "notes": f"Voz en {voice_ratio*100:.1f}% del segmento, música en {counts[MUSIC]*100:.1f}%"
+    }
+
+def _vad_feed(vad, block: np.ndarray, flags: bytearray):
+    """VAD sobre slices memoryview del bloque (sin copia): un byte por frame de 30 ms."""
+    vad_bytes = VAD_FRAME * 2
+    mv = memoryview(block).cast("B")
+    for off in range(0, len(mv) - vad_bytes + 1, vad_bytes):
+        flags.append(vad.is_speech(mv[off:off + vad_bytes], SAMPLE_RATE))
+
+def vad_meta(seg: str, cfg: dict, sdir: Path = None) -> dict:
+    """
+    Solo el timeline de VAD (speech_runs + duración), con el mismo vad_mode
+    que analyze y sobre la misma caché de PCM: lo que necesita el plan de
+    Whisper, sin esperar al análisis completo del segmento.
+    """
+    import webrtcvad
+    vad = webrtcvad.Vad(int(cfg.get("audio_analysis", {}).get("vad_mode", 2)))
+    n_samples = 0
+    flags = bytearray()
+    for block in segment_blocks(seg, cfg, sdir):
+        n_samples += len(block)
+        _vad_feed(vad, block, flags)
+    return {"segment": os.path.basename(seg), "duration_sec": n_samples / SAMPLE_RATE,
+            "speech_runs": speech_runs(np.frombuffer(bytes(flags), dtype=np.uint8))}
+
+def speech_runs(flags: np.ndarray, frame_sec: float = VAD_FRAME / SAMPLE_RATE, bridge_frames: int = 10) -> list:
+    """
+    Timeline de VAD por frame → tramos [start, end] en segundos. Huecos de
+    hasta bridge_frames (300 ms) se unen para que el JSON no tenga un tramo
+    por sílaba.
+    """
+    edges = np.diff(np.concatenate(([0], flags.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1); ends = np.flatnonzero(edges == -1)
+    if len(starts) > 1:
+        keep = np.concatenate(([True], starts[1:] - ends[:-1] > bridge_frames))
+        starts, ends = starts[keep], np.concatenate((ends[:-1][keep[1:]], ends[-1:]))
+    return [[round(float(s * frame_sec), 2), round(float(e * frame_sec), 2)] for s, e in zip(starts, ends)]
+
+def load_audio_meta(sdir: Path, seg: str, cfg: dict = None) -> dict:
+    """Metadata de analyze: del lake si hay cfg y está ahí, si no del JSON de Silver; {} si no hay."""
+    meta = lake.get_audio_meta(cfg, Path(seg).name) if cfg is not None else None
+    if meta is not None:
+        return meta
+    p = Path(sdir) / (Path(seg).stem + "_audio_meta.json")
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def speech_regions(meta: dict, pad_sec: float = 0.3, merge_gap_sec: float = 1.0) -> list:
+    """
+    Regiones a transcribir: tramos de voz del VAD con `pad_sec` de margen a
+    cada lado, unidos si quedan a menos de merge_gap_sec. None si la
+    metadata no trae timeline (análisis viejo o ausente).
+    """
+    runs = meta.get("speech_runs")
+    if runs is None:
+        return None
+    dur = float(meta.get("duration_sec") or 0.0)
+    out = []
+    for s, e in runs:
+        s = max(0.0, s - pad_sec); e = min(dur, e + pad_sec) if dur else e + pad_sec
+        if out and s - out[-1][1] <= merge_gap_sec:
+            out[-1][1] = max(out[-1][1], e)
+        else:
+            out.append([s, e])
+    return [(s, e) for s, e in out]
+
+class SilenceTracker:
+    """
+    Silencios por energía en frames de 10 ms (dBFS < thresh_db) de al menos
+    min_len_ms. Procesa bloque a bloque y arrastra la racha abierta entre bloques.
+    """
+    def __init__(self, sample_rate: int, thresh_db: float = -35.0, min_len_ms: int = 1000, frame_ms: int = 10):
+        self.hop = sample_rate * frame_ms // 1000
+        self.frame_sec = frame_ms / 1000
+        self.thresh = 32768.0 * 10 ** (thresh_db / 20)  # umbral en amplitud RMS
+        self.min_frames = max(1, min_len_ms // frame_ms)
+        self.pos = 0          # índice global de frame al inicio del bloque
+        self.run_start = None # racha de silencio abierta
+        self.spans = []
+
+    def feed(self, block: np.ndarray):
+        n = len(block) // self.hop
+        if n == 0:
+            return
+        x = block[: n * self.hop].reshape(n, self.hop).astype(np.float32)
+        silent = np.sqrt(np.mean(x * x, axis=1)) < self.thresh
+        edges = np.diff(np.concatenate(([False], silent, [False])).astype(np.int8))
+        starts = np.flatnonzero(edges == 1) + self.pos
+        ends = np.flatnonzero(edges == -1) + self.pos
+        if self.run_start is not None:
+            if silent[0]:
+                starts[0] = self.run_start
+            else:
+                self._emit(self.run_start, self.pos)
+            self.run_start = None
+        if silent[-1]:
+            self.run_start = int(starts[-1])
+            starts, ends = starts[:-1], ends[:-1]
+        for s, e in zip(starts, ends):
+            self._emit(int(s), int(e))
+        self.pos += n
+
+    def _emit(self, s: int, e: int):
+        if e - s >= self.min_frames:
+            self.spans.append((round(s * self.frame_sec, 3), round(e * self.frame_sec, 3)))
+
+    def finish(self) -> list:
+        if self.run_start is not None:
+            self._emit(self.run_start, self.pos)
+            self.run_start = None
+        return self.spans
+
+# --- Clasificador voz / música / silencio ---
+SILENCE, SPEECH, MUSIC = 0, 1, 2
+LABELS = "_sm"
+
+def label_runs(labels: np.ndarray, value: int, frame_sec: float, duration: float = None) -> list:
+    """Tramos [start, end] en segundos de las ventanas con etiqueta `value`."""
+    edges = np.diff(np.concatenate(([0], (labels == value).astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) * frame_sec
+    ends = np.flatnonzero(edges == -1) * frame_sec
+    if duration is not None:
+        ends = np.minimum(ends, duration)
+    return [[round(float(s), 2), round(float(e), 2)] for s, e in zip(starts, ends)]
+
+class FrameClassifier:
+    """
+    Etiqueta ventanas de frame_sec como silencio, voz o música. Por bloque,
+    todos los frames de STFT (32 ms cada 20 ms) salen de una vista sin copia
+    y una sola rfft: energía, planitud espectral (100 Hz–4 kHz), flujo
+    espectral y cruces por cero. Por ventana:
+      - silencio si la energía media queda bajo thresh_db;
+      - voz si la fracción de frames con menos de la mitad de la energía
+        media supera low_energy_ratio (las pausas entre sílabas; la música
+        sostenida casi no las tiene);
+      - en la zona dudosa (entre la mitad y low_energy_ratio), voz si votan
+        al menos dos de: ZCR muy variable (sonoras/sordas), planitud de voz
+        (ni tonal ni ruido) y flujo espectral parejo;
+      - música en el resto. Al final se sacan ventanas sueltas (mayoría de 3).
+    Como SilenceTracker, se alimenta bloque a bloque y arrastra el resto.
+    """
+    N_FFT = 512
+    HOP = 320
+
+    def __init__(self, sample_rate: int, thresh_db: float = -35.0, frame_sec: float = 1.0,
+                 low_energy_ratio: float = 0.3, zcr_std: float = 0.08, flatness_max: float = 0.55,
+                 flux_cv_max: float = 2.0):
+        self.frame_sec = float(frame_sec)
+        self.per = max(1, int(round(self.frame_sec * sample_rate / self.HOP)))  # frames STFT por ventana
+        self.thresh = 10 ** (thresh_db / 10)   # potencia media relativa a fondo de escala
+        self.low_energy_ratio, self.zcr_std = low_energy_ratio, zcr_std
+        self.flatness_max, self.flux_cv_max = flatness_max, flux_cv_max
+        self.window = np.hanning(self.N_FFT).astype(np.float32)
+        hz = sample_rate / self.N_FFT
+        self.band = slice(int(100 / hz), int(4000 / hz) + 1)
+        self.rest = np.zeros(0, np.float32)    # muestras que todavía no completan un frame
+        self.prev = None                       # espectro normalizado del último frame (flujo)
+        self.feats = []                        # (potencia, zcr, planitud, flujo) por bloque
+
+    def feed(self, block: np.ndarray):
+        x = np.concatenate((self.rest, block.astype(np.float32) * (1 / 32768)))
+        n = (len(x) - self.N_FFT) // self.HOP + 1 if len(x) >= self.N_FFT else 0
+        if n <= 0:
+            self.rest = x
+            return
+        frames = sliding_window_view(x, self.N_FFT)[::self.HOP][:n]
+        self.rest = x[n * self.HOP:].copy()
+        power = np.einsum("ij,ij->i", frames, frames) / self.N_FFT
+        sign = np.signbit(frames)
+        zcr = np.count_nonzero(sign[:, 1:] != sign[:, :-1], axis=1) / self.N_FFT
+        mag = np.abs(np.fft.rfft(frames * self.window, axis=1))[:, self.band]
+        spec = mag * mag + 1e-10
+        flatness = np.exp(np.log(spec).mean(axis=1)) / spec.mean(axis=1)
+        norm = mag / (mag.sum(axis=1, keepdims=True) + 1e-10)
+        prev = norm[:1] if self.prev is None else self.prev
+        flux = np.sum(np.diff(np.concatenate((prev, norm)), axis=0) ** 2, axis=1)
+        self.prev = norm[-1:]
+        self.feats.append(np.stack((power, zcr, flatness, flux)).astype(np.float32))
+
+    def finish(self) -> np.ndarray:
+        """Etiquetas uint8 por ventana (SILENCE / SPEECH / MUSIC)."""
+        if not self.feats:
+            return np.zeros(0, np.uint8)
+        power, zcr, flatness, flux = np.concatenate(self.feats, axis=1).astype(np.float64)
+        idx = np.arange(0, len(power), self.per)
+        count = np.diff(np.append(idx, len(power)))
+        mean = lambda v: np.add.reduceat(v, idx) / count
+        p = mean(power)
+        low = mean((power < 0.5 * np.repeat(p, count)).astype(np.float64))
+        z_std = np.sqrt(np.maximum(0.0, mean(zcr * zcr) - mean(zcr) ** 2))
+        f_mean = mean(flux)
+        f_cv = np.sqrt(np.maximum(0.0, mean(flux * flux) - f_mean ** 2)) / (f_mean + 1e-12)
+        votes = ((z_std >= self.zcr_std).astype(np.int8) + (mean(flatness) <= self.flatness_max)
+                 + (f_cv <= self.flux_cv_max))
+        speech = (low >= self.low_energy_ratio) | ((low >= self.low_energy_ratio / 2) & (votes >= 2))
+        labels = np.where(p < self.thresh, SILENCE, np.where(speech, SPEECH, MUSIC)).astype(np.uint8)
+        if len(labels) >= 3:
+            # ventana suelta entre dos vecinas iguales → toma la etiqueta de las vecinas
+            mid = labels[1:-1]
+            lone = (labels[:-2] == labels[2:]) & (mid != labels[:-2])
+            mid[lone] = labels[:-2][lone]
+        return labels
@@ -0,0 +1,136 @@
+"""
+Reproceso de particiones históricas por fecha explícita.
+
+    python -m src.pipeline backfill --from 2026-09-01 --to 2026-09-30
+
+Cada día se procesa con cfg["date"] fijo (bronze/silver/gold y el lake de
+ese día). Los segmentos de todos los días van a un único pool de procesos
+(backfill.workers = límite global): cada worker corre la cadena
+analyze → transcribe → fingerprint de un segmento, con Whisper cargado una
+sola vez por proceso. Cuando un día tiene todos sus segmentos, el proceso
+principal arma el keeplist (serial: el índice de huellas aprende de a un
+día) y manda el assemble al mismo pool.
+"""
+import copy, glob, time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import date, timedelta
+from multiprocessing import get_context
+
+from .config import load_config
+from .paths import bronze_dir, silver_dir
+from .stage_cache import StageCache
+from .healthcheck import check_segment
+from .manifest import write_manifest
+from .audio_analysis import analyze_segment, load_audio_meta
+from .fingerprint import FingerprintIndex, fingerprint_segment
+from .transcribe import SegmentTranscriber, _pool_sizes
+from .cut_builder import run_cut_builder
+from .assemble import assemble_clean
+from . import lake, metrics
+
+def day_range(date_from: str, date_to: str) -> list:
+    d0, d1 = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    return [(d0 + timedelta(days=n)).isoformat() for n in range((d1 - d0).days + 1)]
+
+def day_config(cfg: dict, day: str) -> dict:
+    dcfg = copy.deepcopy(cfg)
+    dcfg["date"] = day
+    # el pool ya reparte los cores entre días: assemble codifica un tramo a la vez
+    dcfg.setdefault("assembly", {})["encode_workers"] = 1
+    return dcfg
+
+def _segment_job(cfg: dict, seg: str) -> dict:
+    """Corre en el worker: cadena por segmento; devuelve rc, audio y entradas de caché."""
+    t_start = time.time()
+    sdir = silver_dir(cfg)
+    sdir.mkdir(parents=True, exist_ok=True)
+    cache = StageCache.for_dir(sdir, cfg)
+    rc = analyze_segment(seg, sdir, cfg, cache)
+    if not rc:
+        rc = SegmentTranscriber(cfg, cache, inline=True)(seg)
+    fcfg = cfg.get("fingerprint", {})
+    if not rc and fcfg.get("enabled", True):
+        rc = fingerprint_segment(seg, sdir, cfg, cache, FingerprintIndex.for_cfg(cfg),
+                                 int(fcfg.get("min_matches", 30)))
+    return {"rc": rc, "audio_sec": float(load_audio_meta(sdir, seg, cfg).get("duration_sec") or 0.0),
+            "t_start": t_start, "cache": cache.updates()}
+
+def _report(day: str, st: dict):
+    wall = max(1e-6, time.time() - (st["t_start"] or time.time()))
+    speed = st["audio_sec"] / wall
+    status = "OK" if not st["rc"] else f"rc={st['rc']}"
+    print(f"[BACKFILL] {day}: {st['segments']} segmentos, audio={st['audio_sec'] / 3600:.2f}h "
+          f"wall={wall:.0f}s → {speed:.1f}x tiempo real ({status})")
+    metrics.emit("backfill_day", date=day, segments=st["segments"], audio_sec=st["audio_sec"],
+                 wall_sec=wall, realtime_x=speed, rc=st["rc"])
+
+def backfill(cfg: dict = None, date_from: str = None, date_to: str = None, workers: int = 0) -> int:
+    cfg = cfg or load_config()
+    date_to = date_to or date_from
+    workers = (workers or int(cfg.get("backfill", {}).get("workers", 0) or 0)
+               or _pool_sizes(cfg["whisper"])[0])
+
+    days = {}
+    for day in day_range(date_from, date_to):
+        dcfg = day_config(cfg, day)
+        segs = [s for s in sorted(glob.glob(str(bronze_dir(dcfg) / "raw_segment_*.ts"))) if check_segment(s)]
+        if not segs:
+            continue
+        write_manifest(dcfg, segs)
+        days[day] = {"cfg": dcfg, "segs": segs, "segments": len(segs), "pending": len(segs), "rc": 0,
+                     "audio_sec": 0.0, "t_start": None, "cache": StageCache.for_dir(silver_dir(dcfg), dcfg)}
+    if not days:
+        print(f"[BACKFILL] sin particiones Bronze entre {date_from} y {date_to}")
+        return 1
+    total = sum(st["segments"] for st in days.values())
+    print(f"[BACKFILL] {len(days)} día(s), {total} segmentos, workers={workers}")
+
+    rc = 0
+    t0 = time.perf_counter(); audio = 0.0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as ex:
+        futs = {}
+        for day, st in days.items():
+            for seg in st["segs"]:
+                futs[ex.submit(_segment_job, st["cfg"], seg)] = ("segment", day, seg)
+        while futs:
+            done, _ = wait(futs, return_when=FIRST_COMPLETED)
+            for fut in done:
+                kind, day, seg = futs.pop(fut)
+                st = days[day]
+                if kind == "assemble":
+                    try:
+                        st["rc"] = fut.result() or 0
+                    except Exception as e:
+                        print(f"[BACKFILL] {day}: assemble error: {e!r}")
+                        st["rc"] = 1
+                    rc = rc or st["rc"]
+                    _report(day, st)
+                    continue
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    print(f"[BACKFILL] {day}: error en {seg}: {e!r}")
+                    res = {"rc": 1}
+                st["pending"] -= 1
+                st["rc"] = st["rc"] or res["rc"]
+                st["audio_sec"] += res.get("audio_sec", 0.0); audio += res.get("audio_sec", 0.0)
+                if res.get("t_start"):
+                    st["t_start"] = min(st["t_start"] or res["t_start"], res["t_start"])
+                st["cache"].merge(res.get("cache", {}))
+                if st["pending"]:
+                    continue
+                # día completo en Silver → keeplist acá, assemble en el pool
+                st["cache"].save()
+                if not st["rc"]:
+                    st["rc"] = run_cut_builder(st["cfg"]) or 0
+                lake.compact_partition(st["cfg"])   # el día ya no recibe más filas
+                if st["rc"]:
+                    rc = rc or st["rc"]
+                    _report(day, st)
+                    continue
+                futs[ex.submit(assemble_clean, st["cfg"])] = ("assemble", day, None)
+
+    wall = time.perf_counter() - t0
+    print(f"[BACKFILL] total: {len(days)} día(s), audio={audio / 3600:.2f}h wall={wall:.0f}s "
+          f"→ {audio / max(1e-6, wall):.1f}x tiempo real")
+    return rc
@@ -0,0 +1,325 @@
+"""
+Benchmarks reproducibles por etapa sobre audio y transcripts sintéticos.
+
+    python -m src.bench                       # corre y compara contra bench_baseline.json
+    python -m src.bench --update-baseline     # guarda los resultados como nueva línea base
+    python -m src.bench --check               # CI: sin baseline (o con otros parámetros) falla
+    python -m src.bench --imports             # solo el presupuesto de import por comando
+    python -m src.bench --relay               # relay con entrada finita: tiene que terminar
+
+Todo offline: los transcripts sintéticos reemplazan a Whisper y el LLM es el
+servidor local de detect_ads_llm. Cada etapa corre en un proceso nuevo para
+medir wall, CPU (propio + hijos ffmpeg), pico de RSS y realtime factor.
+Antes se mide, también en un intérprete nuevo, cuánto tarda y cuánta RSS
+ocupa cargar cada comando de pipeline.py, y que no arrastre backends pesados.
+"""
+import argparse, copy, json, resource, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+from multiprocessing import get_context
+from pathlib import Path
+import numpy as np
+
+from .config import load_config
+from .paths import bronze_dir, silver_dir
+from .utils import ffmpeg_bin
+from .transcript import Transcript, transcript_path
+
+SAMPLE_RATE = 16000
+BASELINE = Path(__file__).resolve().parents[1] / "bench_baseline.json"
+
+# etapa -> "modulo:funcion"; todas reciben cfg
+STAGES = {
+    "analyze_segments":       "src.audio_analysis:analyze_segments",
+    "fingerprint_segments":   "src.fingerprint:fingerprint_segments",
+    "write_keep_list":        "src.detect_ads:write_keep_list",
+    "write_keep_list_hybrid": "src.detect_ads_hybrid:write_keep_list_hybrid",
+    "run_cut_builder":        "src.cut_builder:run_cut_builder",
+    "assemble_clean":         "src.assemble:assemble_clean",
+}
+
+# comandos de pipeline.py: cargar su etapa no puede traer ninguno de estos
+# (se importan recién al usarlos: modelo de Whisper, lake)
+HEAVY_MODULES = ("faster_whisper", "ctranslate2", "onnxruntime", "tokenizers", "huggingface_hub",
+                 "av", "torch", "pyarrow")
+
+# presupuesto por comando (bench --imports y tests/test_import_budget.py)
+IMPORT_SEC = 0.5
+IMPORT_RSS_MB = 64.0
+
+_IMPORT_PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+from src.pipeline import load_stage
+load_stage(sys.argv[1])
+dt = time.perf_counter() - t0
+try:  # VmHWM es del proceso nuevo; ru_maxrss hereda el pico del padre tras exec
+    rss = next(int(l.split()[1]) for l in open("/proc/self/status") if l.startswith("VmHWM"))
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"import_sec": dt, "rss_mb": rss / 1024,
+                  "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+# --- Generadores ---
+def synth_pcm(duration_sec: float, seed: int = 0) -> np.ndarray:
+    """
+    Mono 16 kHz int16 alternando bloques de 5–40 s: tono con armónicos
+    (música), ruido, silencio y ráfagas tipo voz (ruido con envolvente silábica ~4 Hz).
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration_sec * SAMPLE_RATE)
+    out = np.zeros(n, dtype=np.float32)
+    pos = 0
+    while pos < n:
+        k = min(n - pos, int(rng.uniform(5, 40) * SAMPLE_RATE))
+        t = np.arange(k, dtype=np.float32) / SAMPLE_RATE
+        kind = rng.choice(["tone", "noise", "silence", "speech"], p=[0.3, 0.15, 0.15, 0.4])
+        if kind == "tone":
+            f0 = rng.uniform(110, 880)
+            x = sum(np.sin(2 * np.pi * f0 * h * t) / h for h in (1, 2, 3))
+            x *= 0.3
+        elif kind == "noise":
+            x = rng.standard_normal(k).astype(np.float32) * 0.1
+        elif kind == "silence":
+            x = rng.standard_normal(k).astype(np.float32) * 1e-4
+        else:
+            env = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0, None) ** 2
+            carrier = np.sin(2 * np.pi * rng.uniform(100, 220) * t) + rng.standard_normal(k) * 0.3
+            x = 0.4 * env * carrier
+        out[pos:pos + k] = x
+        pos += k
+    return (np.clip(out, -1, 1) * 32767).astype(np.int16)
+
+def write_segment(path: Path, pcm: np.ndarray, cfg: dict, container: str = "adts"):
+    """Codifica PCM a AAC en ADTS (como graba record.py) o MPEG-TS."""
+    cmd = [ffmpeg_bin(cfg), "-hide_banner", "-loglevel", "error", "-y",
+           "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "-",
+           "-c:a", "aac", "-b:a", "64k", "-f", container, str(path)]
+    subprocess.run(cmd, input=pcm.tobytes(), check=True)
+
+AD_LINES = [
+    "Aprovechá la oferta de la semana, llamá al 261 555 1234",
+    "Envío gratis en toda la provincia, ingresá a https://tienda.example.com",
+    "Promoción válido hasta el domingo, términos y condiciones en nuestra web",
+    "Este programa lo auspicia Bodegas del Sur, visitanos en nuestra web",
+]
+PROGRAM_LINES = [
+    "Buenas tardes, seguimos con las noticias de la región",
+    "El gobierno provincial anunció nuevas obras en la ruta cuarenta",
+    "Vamos con el pronóstico: frío y cielo despejado para mañana",
+    "En el estudio nos acompaña el intendente para hablar del presupuesto",
+    "Pasamos a deportes, el clásico del domingo se juega a las cinco",
+]
+
+def synth_transcript(sdir: Path, seg: Path, duration_sec: float, ad_density: float, seed: int = 0,
+                     block_sec: float = 5.0):
+    """
+    Transcript (sidecar + VTT exportado) de bloques de block_sec. Las tandas publicitarias vienen agrupadas
+    (cadena de Markov) y ocupan ~ad_density del tiempo total.
+    """
+    rng = np.random.default_rng(seed)
+    stay = 0.9  # prob. de seguir en el mismo estado → tandas de ~50 s
+    p_enter = (1 - stay) * ad_density / max(1e-6, 1 - ad_density)
+    in_ad = False
+    blocks = []
+    t = 0.0
+    while t < duration_sec:
+        in_ad = rng.random() < (stay if in_ad else p_enter)
+        txt = str(rng.choice(AD_LINES if in_ad else PROGRAM_LINES))
+        e = min(duration_sec, t + block_sec)
+        blocks.append((t, e, txt))
+        t = e
+    tr = Transcript.from_blocks(blocks)
+    tr.to_vtt(sdir / (seg.stem + ".vtt"))
+    tr.save(transcript_path(sdir, seg))
+
+def build_dataset(cfg: dict, n_segments: int, segment_sec: float, ad_density: float, seed: int):
+    bdir = bronze_dir(cfg); sdir = silver_dir(cfg)
+    bdir.mkdir(parents=True, exist_ok=True); sdir.mkdir(parents=True, exist_ok=True)
+    for i in range(n_segments):
+        seg = bdir / f"raw_segment_{i:03d}_bench.ts"
+        write_segment(seg, synth_pcm(segment_sec, seed + i), cfg)
+        synth_transcript(sdir, seg, segment_sec, ad_density, seed + i)
+
+# --- Medición ---
+def _run_stage(target: str, cfg: dict) -> dict:
+    """Corre en un proceso nuevo: el pico de RSS es el de la etapa."""
+    mod, fn = target.split(":")
+    func = getattr(import_module(mod), fn)
+    s0 = resource.getrusage(resource.RUSAGE_SELF); c0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    t0 = time.perf_counter()
+    rc = func(cfg)
+    wall = time.perf_counter() - t0
+    s1 = resource.getrusage(resource.RUSAGE_SELF); c1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (s1.ru_utime - s0.ru_utime + s1.ru_stime - s0.ru_stime
+           + c1.ru_utime - c0.ru_utime + c1.ru_stime - c0.ru_stime)
+    return {"rc": rc or 0, "wall_sec": wall, "cpu_sec": cpu,
+            "peak_rss_mb": max(s1.ru_maxrss, c1.ru_maxrss) / 1024}
+
+def run_benchmarks(cfg: dict, stages, audio_sec: float, repeat: int = 1) -> dict:
+    results = {}
+    ctx = get_context("spawn")
+    for name in stages:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+                runs.append(ex.submit(_run_stage, STAGES[name], cfg).result())
+        best = min(runs, key=lambda r: r["wall_sec"])  # menos ruido que el promedio
+        best["rtf"] = best["wall_sec"] / audio_sec if audio_sec else 0.0
+        results[name] = best
+        print(f"[BENCH] {name:24s} wall={best['wall_sec']:8.3f}s cpu={best['cpu_sec']:8.3f}s "
+              f"rss={best['peak_rss_mb']:7.1f}MB rtf={best['rtf']:.5f} rc={best['rc']}")
+    return results
+
+def probe_import(command: str) -> dict:
+    """Carga la etapa `command` en un intérprete nuevo: {"import_sec", "rss_mb", "heavy"}."""
+    root = Path(__file__).resolve().parents[1]
+    out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, command], cwd=root, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+def import_budget(max_sec: float, max_rss_mb: float, repeat: int = 1) -> tuple:
+    """
+    Import de cada comando en un intérprete nuevo (sin lo que ya cargó el
+    bench). Devuelve (resultados, violaciones del presupuesto).
+    """
+    from .pipeline import STAGES as COMMANDS
+    results, over = {}, []
+    for cmd in COMMANDS:
+        runs = [probe_import(cmd) for _ in range(repeat)]
+        best = min(runs, key=lambda r: r["import_sec"])
+        results[cmd] = best
+        print(f"[BENCH] import {cmd:12s} {best['import_sec']*1000:7.1f}ms rss={best['rss_mb']:6.1f}MB"
+              + (f" pesados={','.join(best['heavy'])}" if best["heavy"] else ""))
+        if best["import_sec"] > max_sec:
+            over.append(f"import {cmd}: {best['import_sec']:.3f}s > {max_sec:.3f}s")
+        if best["rss_mb"] > max_rss_mb:
+            over.append(f"import {cmd}: rss {best['rss_mb']:.1f}MB > {max_rss_mb:.0f}MB")
+        if best["heavy"]:
+            over.append(f"import {cmd}: carga {', '.join(best['heavy'])} al arrancar")
+    return results, over
+
+def _relay_job(cfg: dict, src: str, out: str, delay: float, speed: float):
+    from .relay import relay
+    raise SystemExit(relay(cfg, src, out, delay, speed))
+
+def relay_check(cfg: dict, tmp: Path, seconds: float = 120.0, speed: float = 20.0, timeout: float = 120.0) -> list:
+    """
+    Relay sobre un archivo finito a `speed`x, sin ASR: el proceso tiene que
+    terminar solo y la salida durar lo mismo que la entrada (modo bridge).
+    Devuelve los problemas encontrados.
+    """
+    cfg = copy.deepcopy(cfg)
+    rcfg = cfg.get("relay", {})
+    # delay con margen para que el análisis no se atrase (sin puente por underrun)
+    delay = float(rcfg.get("window_sec", 30)) + float(rcfg.get("near_sec", 10)) + 10.0
+    cfg["relay"] = {**cfg.get("relay", {}), "asr": False, "ad_mode": "bridge", "format": "mp3",
+                    "sample_rate": SAMPLE_RATE, "channels": 1, "report_sec": 3600}
+    src, out = tmp / "relay_in.aac", tmp / "relay_out.mp3"
+    write_segment(src, synth_pcm(seconds, 7), cfg)
+    t0 = time.perf_counter()
+    proc = get_context("spawn").Process(target=_relay_job, args=(cfg, str(src), str(out), delay, speed))
+    proc.start(); proc.join(timeout)
+    wall = time.perf_counter() - t0
+    if proc.is_alive():
+        proc.kill(); proc.join()
+        return [f"relay: no terminó en {timeout:.0f}s con {seconds:.0f}s de entrada"]
+    problems = [] if proc.exitcode == 0 else [f"relay: rc={proc.exitcode}"]
+    pcm = subprocess.run([ffmpeg_bin(cfg), "-hide_banner", "-loglevel", "error", "-i", str(out),
+                          "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"], capture_output=True).stdout
+    dur = len(pcm) / 2 / SAMPLE_RATE
+    print(f"[BENCH] relay {seconds:.0f}s a {speed:g}x: terminó en {wall:.1f}s, salida={dur:.1f}s")
+    if abs(dur - seconds) > 1.0:   # el encoder agrega/recorta a lo sumo unas tramas
+        problems.append(f"relay: salida de {dur:.1f}s para {seconds:.0f}s de entrada")
+    return problems
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Etapas cuyo wall o pico de RSS empeoró más que `threshold` (fracción)."""
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        for metric in ("wall_sec", "peak_rss_mb"):
+            if base[metric] > 0 and cur[metric] > base[metric] * (1 + threshold):
+                regressions.append(f"{name}.{metric}: {base[metric]:.3f} -> {cur[metric]:.3f} "
+                                   f"(+{(cur[metric]/base[metric]-1)*100:.0f}%)")
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Stage benchmarks on synthetic data")
+    ap.add_argument("--stages", nargs="*", default=list(STAGES), choices=list(STAGES))
+    ap.add_argument("--segments", type=int, default=3)
+    ap.add_argument("--segment-sec", type=float, default=600.0)
+    ap.add_argument("--ad-density", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--baseline", default=str(BASELINE))
+    ap.add_argument("--threshold", type=float, default=0.20, help="regresión tolerada (0.20 = +20%%)")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--check", action="store_true",
+                    help="modo gate: falla si falta la baseline o no se puede comparar")
+    ap.add_argument("--out", default=None, help="JSON con los resultados de esta corrida")
+    ap.add_argument("--imports", action="store_true", help="solo medir el import de cada comando de pipeline")
+    ap.add_argument("--import-sec", type=float, default=IMPORT_SEC, help="presupuesto de import por comando (s)")
+    ap.add_argument("--relay", action="store_true", help="solo el chequeo de relay con entrada finita")
+    ap.add_argument("--import-rss-mb", type=float, default=IMPORT_RSS_MB, help="presupuesto de RSS tras el import (MB)")
+    args = ap.parse_args(argv)
+
+    if args.relay:
+        with tempfile.TemporaryDirectory(prefix="radio_bench_") as tmp:
+            problems = relay_check(load_config(), Path(tmp))
+        for r in problems:
+            print("[BENCH] FALLA", r)
+        return 1 if problems else 0
+    imports, over = import_budget(args.import_sec, args.import_rss_mb, args.repeat)
+    for r in over:
+        print("[BENCH] PRESUPUESTO", r)
+    if args.imports:
+        return 1 if over else 0
+
+    from .detect_ads_llm import serve
+    with tempfile.TemporaryDirectory(prefix="radio_bench_") as tmp:
+        cfg = copy.deepcopy(load_config())
+        root = Path(tmp)
+        cfg["paths"] = {**cfg["paths"], "data_root": str(root), "bronze": str(root / "bronze"),
+                        "silver": str(root / "silver"), "gold": str(root / "gold"), "logs": str(root / "logs")}
+        cfg["cache"] = {"enabled": False}
+        cfg["lake"] = {"enabled": False}
+        srv = serve(cfg, port=0)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        cfg["llm"] = {**cfg.get("llm", {}), "base_url": f"http://127.0.0.1:{srv.server_address[1]}/v1/chat/completions"}
+
+        t0 = time.perf_counter()
+        build_dataset(cfg, args.segments, args.segment_sec, args.ad_density, args.seed)
+        print(f"[BENCH] dataset: {args.segments} x {args.segment_sec:.0f}s en {time.perf_counter()-t0:.1f}s")
+        results = run_benchmarks(cfg, args.stages, args.segments * args.segment_sec, args.repeat)
+        srv.shutdown()
+
+    report = {"params": {k: getattr(args, k) for k in ("segments", "segment_sec", "ad_density", "seed")},
+              "stages": results, "imports": imports}
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    bpath = Path(args.baseline)
+    if args.update_baseline:
+        bpath.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print("[BENCH] baseline actualizada:", bpath)
+        return 1 if over else 0
+    if not bpath.exists():
+        print(f"[BENCH] {'FALLA' if args.check else 'aviso'}: sin baseline en {bpath}; "
+              "generarla en la máquina de referencia con --update-baseline")
+        return 2 if args.check else (1 if over else 0)
+    baseline = json.loads(bpath.read_text(encoding="utf-8"))
+    if baseline.get("params") != report["params"]:
+        print(f"[BENCH] {'FALLA' if args.check else 'aviso'}: parámetros distintos a los de la baseline",
+              baseline.get("params"))
+        if args.check:
+            return 2
+    regressions = compare(results, baseline, args.threshold)
+    for r in regressions:
+        print("[BENCH] REGRESIÓN", r)
+    return 1 if regressions or over else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,7 +14,10 @@ DEFAULTS = {
         "backend": "cli",
         "model": "small",
         "language": "es",
-        "output_format": "vtt"
+        "output_format": "vtt",
+        "workers": 0,
+        "cpu_threads": 2,
+        "compute_type": "int8"
     },
     "paths": {
         "data_root": "data",
@@ -46,3 +49,28 @@ def load_config(cfg_path: str = None) -> dict:
     for k, v in user.items():
         cfg[k] = v
     return cfg
+
+def _merge(base: dict, over: dict) -> dict:
+    out = dict(base)
+    for k, v in over.items():
+        out[k] = _merge(out[k], v) if isinstance(v, dict) and isinstance(out.get(k), dict) else v
+    return out
+
+def station_configs(cfg: dict) -> list:
+    """
+    Una config por emisora. Sin `stations:` es [cfg] tal cual. Con la lista,
+    cada entrada (station, stream_url/stream_page_url y cualquier override)
+    se mezcla sobre la config base y bronze/silver/gold pasan a
+    <raíz>/<station>/..., así cada emisora tiene su propia partición.
+    """
+    stations = cfg.get("stations") or []
+    if not stations:
+        return [cfg]
+    out = []
+    for st in stations:
+        scfg = _merge({k: v for k, v in cfg.items() if k != "stations"}, st)
+        name = scfg["station"]
+        scfg["paths"] = {**scfg["paths"], **{k: str(Path(scfg["paths"][k]) / name)
+                                             for k in ("bronze", "silver", "gold")}}
+        out.append(scfg)
+    return out
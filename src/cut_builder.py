@@ -2,140 +2,119 @@
 import json, glob
 from pathlib import Path
 from typing import List, Tuple
+import numpy as np
 
 from .config import load_config
 from .paths  import bronze_dir, silver_dir, gold_dir
-from .detect_ads import vtt_blocks, is_ad_text  # usamos lector VTT y heurística ya existente
-
-# --- Utilidades de tiempo ---
+from .stage_cache import StageCache
+from .transcript import Transcript, load_transcript, transcript_path
+from . import lake
+from .ad_rules import engine_for, AD_SCORE
+from .fingerprint import FingerprintIndex, load_matches, learn_intervals
+from .intervals import IntervalSet
+from .adts import segment_duration
+from .audio_analysis import load_audio_meta
+
+# --- Utilidades de tiempo (listas de tuplas; internamente IntervalSet) ---
 def merge_intervals(intervals: List[Tuple[float, float]], join_gap: float = 8.0) -> List[Tuple[float, float]]:
     """Une intervalos [s,e] que estén muy cerca (gap < join_gap)."""
-    if not intervals: return []
-    ints = sorted(intervals)
-    out = [ints[0]]
-    for s,e in ints[1:]:
-        ps,pe = out[-1]
-        if s - pe <= join_gap:
-            out[-1] = (ps, max(pe, e))
-        else:
-            out.append((s,e))
-    return out
+    return IntervalSet.from_pairs(intervals, join_gap).to_list()
 
 def subtract_intervals(full: Tuple[float,float], cuts: List[Tuple[float,float]]) -> List[Tuple[float,float]]:
     """Resta cuts del rango full y devuelve tramos válidos (keep)."""
-    s0, e0 = full
-    keeps = []
-    cursor = s0
-    for s,e in sorted(cuts):
-        if e <= cursor:  # totalmente antes
-            continue
-        if s > e0:       # totalmente después
-            break
-        if s > cursor:
-            keeps.append((cursor, min(s, e0)))
-        cursor = max(cursor, e)
-        if cursor >= e0:
-            break
-    if cursor < e0:
-        keeps.append((cursor, e0))
-    return [(max(s0, s), min(e0, e)) for s,e in keeps if e - s > 0]
+    return IntervalSet.from_pairs(cuts).complement(*full).to_list()
 
 # --- Candidatos por texto ---
-def text_ad_windows(vtt_path: Path, min_block: float = 4.0) -> List[Tuple[float,float]]:
+def text_ad_windows(tr: Transcript, min_block: float = 4.0, cfg: dict = None) -> IntervalSet:
     """
-    Devuelve ventanas [s,e] del VTT con bloques que caen como 'anuncio' por reglas simples.
+    Devuelve ventanas [s,e] del transcript con bloques que caen como 'anuncio' por reglas simples.
     Agrupa bloques consecutivos sospechosos en intervalos.
     """
-    def parse_ts(ts: str) -> float:
-        # "HH:MM:SS.mmm" o "HH:MM:SS,mmm"
-        ts = ts.replace(",", ".")
-        h,m,s = ts.split(":")
-        return int(h)*3600 + int(m)*60 + float(s)
-    cand = []
-    for s,e,txt in vtt_blocks(vtt_path):
-        if is_ad_text(txt, load_config()):
-            cand.append((parse_ts(s), parse_ts(e)))
+    scores, _ = engine_for(cfg or load_config()).score_blocks(tr.texts())
+    hit = np.flatnonzero(np.asarray(scores) >= AD_SCORE)
     # Une bloques cercanos
-    return merge_intervals(cand, join_gap=5.0)
+    return IntervalSet(tr.starts[hit], tr.ends[hit], gap=5.0)
 
 # --- Candidatos por audio ---
-def audio_music_windows(meta: dict, min_music: float = 25.0) -> List[Tuple[float,float]]:
+def audio_music_windows(meta: dict, min_music: float = 25.0) -> IntervalSet:
     """
-    A partir de metadatos de audio (silencios, first_speech_start, last_speech_end, voice_ratio),
-    infiere ventanas típicas de música/jingle prolongada (sin voz) que merecen ser consideradas.
+    A partir de metadatos de audio (silencios, tramos de música del clasificador,
+    first_speech_start, last_speech_end), infiere ventanas típicas de
+    música/jingle prolongada (sin voz) que merecen ser consideradas.
     """
-    windows = []
     dur = float(meta.get("duration_sec", 600))
-    silences = meta.get("silences", [])
-    # normaliza a tuplas float
-    silences = [(float(s), float(e)) for s,e in silences]
+    sil = np.asarray(meta.get("silences", []), dtype=np.float64).reshape(-1, 2)
+    mus = np.asarray(meta.get("music_runs", []), dtype=np.float64).reshape(-1, 2)
     # música/silencio largos
-    for s,e in silences:
-        if (e - s) >= min_music:
-            windows.append((s,e))
+    sil = np.vstack([sil, mus])
+    sil = sil[sil[:, 1] - sil[:, 0] >= min_music]
+    edges = []
     # si el inicio tiene música/voz muy tarde
     fs = float(meta.get("first_speech_start_sec", 0.0))
     if fs >= min_music:
-        windows.append((0.0, fs))
+        edges.append((0.0, fs))
     # si el final pierde voz mucho antes
     le = float(meta.get("last_speech_end_sec", dur))
     if dur - le >= min_music:
-        windows.append((le, dur))
-    return merge_intervals(windows, join_gap=5.0)
-
-# --- Híbrido simple: intersección o expansión contextual ---
-def decide_invalid_intervals(vtt_path: Path, audio_meta: dict, llm_cls: str = None,
-                             min_cut_sec: float = 20.0) -> List[Tuple[float,float]]:
+        edges.append((le, dur))
+    w = np.vstack([sil, np.reshape(edges, (-1, 2))])
+    return IntervalSet(w[:, 0], w[:, 1], gap=5.0)
+
+# --- Decisión híbrida ---
+def decide_invalid_intervals(tr: Transcript, audio_meta: dict, llm_cls: str = None,
+                             min_cut_sec: float = 20.0, cfg: dict = None,
+                             fp_windows: List[Tuple[float,float]] = None,
+                             txt_windows: List[Tuple[float,float]] = None,
+                             near_sec: float = 10.0) -> List[Tuple[float,float]]:
     """
     Construye intervalos NO VÁLIDOS combinando:
       - ventanas por texto (anuncio),
       - ventanas por audio (música/silencio prolongados),
-      - etiqueta LLM (si está disponible) para reforzar decisión ambigua.
+      - etiqueta LLM (si está disponible) para reforzar decisión ambigua,
+      - spots ya conocidos por huella acústica (fp_windows).
 
     Política:
-      - Si hay texto de anuncio → marcar esa ventana.
+      - Si hay texto de anuncio o un spot conocido → marcar esa ventana.
       - Si hay música sin voz prolongada y LLM=anuncio → marcar ventana de audio.
-      - Si hay música prolongada al borde de texto de anuncio → expandir al borde musical.
+      - Si hay música prolongada a <= near_sec de texto de anuncio (o encima)
+        → expandir al borde musical, incluido el hueco entre ambos.
       - Ignorar todo corte < min_cut_sec (tu regla).
+
+    Sin bucles anidados: la vecindad música↔texto sale de dos searchsorted
+    y todas las fuentes se unen en una sola pasada de barrido.
     """
-    txt = text_ad_windows(vtt_path)
-    mus = audio_music_windows(audio_meta) if audio_meta else []
-
-    # Si el LLM dijo anuncio para el SEGMENTO completo, podemos expandir: pero
-    # como queremos precisión, solo reforzamos donde haya música prolongada o texto cercano.
-    invalid = []
-
-    # 1) texto directo
-    invalid.extend(txt)
-
-    # 2) música prolongada + apoyo
-    if mus:
-        if txt:
-            # expande: si están cerca (<= 10s), unir
-            expanded = []
-            for ms in mus:
-                for tx in txt:
-                    # si se tocan o están muy cerca, unir
-                    gap = max(0.0, max(min(tx[1], ms[1]) - max(tx[0], ms[0]),  # overlap positivo
-                                       min(abs(ms[0]-tx[1]), abs(tx[0]-ms[1]))))  # proximidad
-                    if gap <= 10.0:
-                        expanded.append((min(ms[0], tx[0]), max(ms[1], tx[1])))
-            invalid.extend(expanded)
-        # si LLM dijo anuncio y hay música larga → considerá la música como inválida
-        if (llm_cls == "anuncio"):
-            invalid.extend(mus)
+    if txt_windows is not None:
+        txt = IntervalSet.of(txt_windows)
+    else:
+        txt = text_ad_windows(tr, cfg=cfg) if tr is not None else IntervalSet()
+    mus = audio_music_windows(audio_meta) if audio_meta else IntervalSet()
+    fp = IntervalSet.of(fp_windows or [])
+
+    # 1) texto directo y spots conocidos (no necesitan apoyo)
+    starts = [txt.starts, fp.starts]
+    ends = [txt.ends, fp.ends]
+
+    # 2) música prolongada + apoyo: textos que terminan después de s - near
+    #    y empiezan antes de e + near → [lo, hi) son los vecinos de cada música
+    lo = np.searchsorted(txt.ends, mus.starts - near_sec, side="left")
+    hi = np.searchsorted(txt.starts, mus.ends + near_sec, side="right")
+    near = hi > lo
+    if near.any():
+        starts.append(np.minimum(mus.starts[near], txt.starts[lo[near]]))
+        ends.append(np.maximum(mus.ends[near], txt.ends[hi[near] - 1]))
+    # si LLM dijo anuncio y hay música larga → considerá la música como inválida
+    if llm_cls == "anuncio":
+        starts.append(mus.starts); ends.append(mus.ends)
 
     # Unifica y aplica umbral de 20s
-    merged = merge_intervals(invalid, join_gap=5.0)
-    return [(s,e) for s,e in merged if (e - s) >= min_cut_sec]
+    merged = IntervalSet(np.concatenate(starts), np.concatenate(ends), gap=5.0)
+    return merged.min_length(min_cut_sec).to_list()
 
 def build_keep_trims_for_segment(seg_path: Path, invalid: List[Tuple[float,float]], full_duration: float) -> List[Tuple[float,float]]:
     """Devuelve lista de (inpoint,outpoint) válidos a mantener, restando 'invalid' del [0, full_duration]."""
-    full = (0.0, float(full_duration))
-    keeps = subtract_intervals(full, merge_intervals(invalid, join_gap=5.0))
+    keeps = IntervalSet.of(invalid).join(5.0).complement(0.0, float(full_duration))
     # fusiona keeps muy cercanos para evitar chiqui-cortes
-    nice = merge_intervals(keeps, join_gap=4.0)
-    return nice
+    return keeps.join(4.0).to_list()
 
 def write_keeplist_per_trims(keeps_by_file: dict, keeplist_path: Path):
     """
@@ -154,16 +133,55 @@ def write_keeplist_per_trims(keeps_by_file: dict, keeplist_path: Path):
                 f.write(f"inpoint {a:.3f}\n")
                 f.write(f"outpoint {b:.3f}\n")
 
-def run_cut_builder():
+def load_llm_decisions(llm_json: Path) -> dict:
+    """Mapa segmento -> 'anuncio'/'programa' desde decisions_llm.json (vacío si no existe)."""
+    llm_decisions = {}
+    if llm_json.exists():
+        try:
+            for row in json.loads(llm_json.read_text(encoding="utf-8")):
+                seg = row.get("segment"); dec = row.get("decision","")
+                # decision puede ser "drop:llm" o "keep:llm" -> nos interesa etiqueta
+                if "drop:llm" in dec:
+                    llm_decisions[seg] = "anuncio"
+                elif "keep:llm" in dec:
+                    llm_decisions[seg] = "programa"
+        except Exception:
+            pass
+    return llm_decisions
+
+def cut_segment(seg: str, sdir: Path, cfg: dict, llm_label: str = None, min_cut_sec: float = 20.0) -> dict:
+    """
+    Decisión de un segmento con lo que haya en Silver (transcript, audio_meta, huellas).
+    Devuelve {"keeps", "invalid", "confirmed"}; invalid = None si no hay info.
+    """
+    segp = Path(seg)
+    tr = load_transcript(sdir, seg, cfg)
+    audio_meta = load_audio_meta(sdir, seg, cfg)
+    fp_windows = load_matches(sdir, seg)
+    if tr is None and not audio_meta and not fp_windows:
+        # sin info -> conservar todo el segmento
+        return {"keeps": [(0.0, segment_duration(seg, 600.0))], "invalid": None, "confirmed": []}
+
+    txt = text_ad_windows(tr, cfg=cfg) if tr is not None else IntervalSet()
+    invalid = decide_invalid_intervals(tr, audio_meta, llm_cls=llm_label, min_cut_sec=min_cut_sec, cfg=cfg,
+                                       fp_windows=fp_windows, txt_windows=txt)
+    # cortes con apoyo de texto = anuncios confirmados → alimentan el índice de huellas
+    inv = IntervalSet.of(invalid)
+    confirmed = inv.select(inv.overlaps(txt)).to_list()
+    dur = float(audio_meta.get("duration_sec") or segment_duration(seg, 600.0))
+    return {"keeps": build_keep_trims_for_segment(segp, invalid, dur), "invalid": invalid, "confirmed": confirmed}
+
+def run_cut_builder(cfg: dict = None, precomputed: dict = None):
     """
     Lee por fecha actual:
       - segmentos Bronze,
-      - VTT en Silver,
+      - transcripts en Silver (sidecar binario),
       - metadatos de audio en Silver (si existen),
       - (opcional) decisiones del LLM por segmento (si existen) -> 'decisions_llm.json' o similar.
     Genera gold/.../keeplist.txt con recortes finos (respetando corte mínimo de 20s).
+    precomputed: seg -> resultado de cut_segment ya calculado (scheduler de run-post).
     """
-    cfg = load_config()
+    cfg = cfg or load_config()
     bdir = bronze_dir(cfg)
     sdir = silver_dir(cfg)
     gdir = gold_dir(cfg)
@@ -173,44 +191,40 @@ def run_cut_builder():
     segments = sorted(glob.glob(str(bdir / "raw_segment_*.ts")))
     keeps_by_file = {}
 
-    # opcional: mapa rápido LLM por segmento
-    llm_decisions = {}
+    keeplist = gdir / "keeplist.txt"
     llm_json = gdir / "decisions_llm.json"
-    if llm_json.exists():
-        try:
-            for row in json.loads(llm_json.read_text(encoding="utf-8")):
-                seg = row.get("segment"); dec = row.get("decision","")
-                # decision puede ser "drop:llm" o "keep:llm" -> nos interesa etiqueta
-                if "drop:llm" in dec:
-                    llm_decisions[seg] = "anuncio"
-                elif "keep:llm" in dec:
-                    llm_decisions[seg] = "programa"
-        except Exception:
-            pass
+    cache = StageCache.for_dir(gdir, cfg)
+    inputs = [p for s in segments
+              for p in [transcript_path(sdir, s)] + [sdir / (Path(s).stem + ext) for ext in ("_audio_meta.json", "_fp.json")]]
+    key = cache.key("cut-builder", inputs + [llm_json], cfg, ["ad_heuristics"])
+    if cache.fresh(keeplist, key):
+        print(f"[CUT] keeplist up to date: {keeplist}")
+        cache.save()
+        return 0
+
+    rows = []  # decisiones por intervalo para el lake
+    fp_index = FingerprintIndex.for_cfg(cfg)
+    learned = 0
+    # opcional: mapa rápido LLM por segmento
+    llm_decisions = load_llm_decisions(llm_json)
 
     for seg in segments:
         segp = Path(seg)
-        vtt = sdir / (segp.stem + ".vtt")
-        meta_path = sdir / (segp.stem + "_audio_meta.json")
-        audio_meta = {}
-        if meta_path.exists():
-            try:
-                audio_meta = json.loads(meta_path.read_text(encoding="utf-8"))
-            except Exception:
-                audio_meta = {}
-        if not vtt.exists() and not audio_meta:
-            # sin info -> conservar todo el segmento
-            keeps_by_file[seg] = [(0.0, 600.0)]
-            continue
-
-        llm_label = llm_decisions.get(segp.name)  # 'anuncio'/'programa'/None
-        invalid = decide_invalid_intervals(vtt, audio_meta, llm_cls=llm_label, min_cut_sec=min_cut_sec)
-        dur = float(audio_meta.get("duration_sec", 600.0))
-        keeps = build_keep_trims_for_segment(segp, invalid, dur)
+        res = (precomputed or {}).get(seg)
+        if res is None:
+            res = cut_segment(seg, sdir, cfg, llm_decisions.get(segp.name), min_cut_sec)
         # si por alguna razón quedamos sin keeps (todo anúncio), puedes optar por dejar 1 bloque grande mínimo
-        keeps_by_file[seg] = keeps if keeps else []
+        keeps_by_file[seg] = res["keeps"]
+        if res["invalid"] is None:
+            continue
+        learned += learn_intervals(cfg, sdir, seg, res["confirmed"], fp_index)
+        rows += [{"segment": segp.name, "kind": "interval", "decision": "drop", "reason": "cut_builder",
+                  "start": s, "end": e} for s, e in res["invalid"]]
 
-    keeplist = gdir / "keeplist.txt"
     write_keeplist_per_trims(keeps_by_file, keeplist)
+    cache.record(keeplist, key); cache.save()
+    lake.put_decisions(cfg, "cut_builder", rows)
+    if learned:
+        print(f"[CUT] {learned} spot(s) nuevo(s) en el índice de huellas ({len(fp_index)} en total)")
     print(f"[CUT] keeplist con recortes finos: {keeplist}")
     return 0
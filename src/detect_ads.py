@@ -1,52 +1,55 @@
-import re, glob
+import glob, json, os
 from pathlib import Path
 from .config import load_config
 from .paths import bronze_dir, silver_dir, gold_dir
-
-URL_RE   = re.compile(r'https?://\S+', re.IGNORECASE)
-PHONE_RE = re.compile(r'(?<!\d)(\+?\d[\d\s\-\(\)]{7,})(?!\d)')
-
-def vtt_blocks(vtt_path: Path):
-    # Yields (start, end, text)
-    start = end = None
-    buf = []
-    with open(vtt_path, encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if "-->" in line:
-                if buf and start and end:
-                    yield (start, end, " ".join(buf).strip())
-                    buf = []
-                times = line.split("-->")
-                start = times[0].strip()
-                end = times[1].strip().split(" ")[0]
-            elif line and not line.startswith("WEBVTT"):
-                buf.append(line)
-        if buf and start and end:
-            yield (start, end, " ".join(buf).strip())
+from .stage_cache import StageCache
+from .ad_rules import engine_for, AD_SCORE
+from .transcript import Transcript, load_transcript, transcript_path, parse_ts, fmt_ts, vtt_blocks
+from . import lake
 
 def is_ad_text(text: str, cfg: dict) -> bool:
-    text_l = text.lower()
-    score = 0
-    if cfg["ad_heuristics"]["patterns"].get("url"):
-        score += 2 * len(URL_RE.findall(text_l))
-    if cfg["ad_heuristics"]["patterns"].get("phone"):
-        score += 2 * len(PHONE_RE.findall(text_l))
-    for kw in cfg["ad_heuristics"]["keywords"]:
-        if kw in text_l:
-            score += 1
-    return score >= 2
+    return engine_for(cfg).is_ad(text)
 
-def segment_is_ad(vtt_path: Path, cfg: dict) -> bool:
-    hits = 0; total = 0
-    for _, _, txt in vtt_blocks(vtt_path):
-        total += 1
-        if is_ad_text(txt, cfg):
-            hits += 1
+def segment_ad_hits(tr: Transcript, cfg: dict):
+    """Puntúa todos los bloques del transcript en un batch; devuelve (hits, total)."""
+    scores, _ = engine_for(cfg).score_blocks(tr.texts())
+    return int((scores >= AD_SCORE).sum()), len(scores)
+
+def segment_is_ad(tr: Transcript, cfg: dict) -> bool:
+    hits, total = segment_ad_hits(tr, cfg)
     if total == 0:
         return False
     return hits >= cfg["ad_heuristics"]["min_hits_per_segment"] or (hits/total) >= cfg["ad_heuristics"]["ratio_threshold"]
 
+def decision_path(sdir: Path, seg: str) -> Path:
+    return Path(sdir) / (Path(seg).stem + "_ad.json")
+
+def segment_decision(seg: str, sdir: Path, cfg: dict, cache: StageCache) -> dict:
+    """
+    Decisión keep/drop de un segmento por heurísticas. Se guarda en Silver
+    (<stem>_ad.json) con su clave de caché (transcript + ad_heuristics):
+    follow la persiste a medida que cierra cada segmento y write_keep_list
+    solo calcula las que falten.
+    """
+    out = decision_path(sdir, seg)
+    key = cache.key("detect-ads-segment", [transcript_path(sdir, seg)], cfg, ["ad_heuristics"])
+    if cache.fresh(out, key):
+        try:
+            return json.loads(out.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+    tr = load_transcript(sdir, seg, cfg)
+    if tr is None:
+        decision, reason = "keep", "no_vtt"
+    else:
+        decision, reason = ("drop" if segment_is_ad(tr, cfg) else "keep"), "heuristics"
+    row = {"segment": Path(seg).name, "kind": "segment", "decision": decision, "reason": reason}
+    tmp = out.with_name(f".{out.name}.tmp")
+    tmp.write_text(json.dumps(row, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, out)
+    cache.record(out, key)
+    return row
+
 def write_keep_list(cfg: dict = None):
     cfg = cfg or load_config()
     bdir = bronze_dir(cfg)
@@ -55,18 +58,23 @@ def write_keep_list(cfg: dict = None):
     gdir.mkdir(parents=True, exist_ok=True)
 
     segments = sorted(glob.glob(str(bdir / "raw_segment_*.ts")))
-    keep = []
-    for seg in segments:
-        vtt = sdir / (Path(seg).stem + ".vtt")
-        if not vtt.exists():
-            keep.append(seg)
-            continue
-        if not segment_is_ad(vtt, cfg):
-            keep.append(seg)
-
     keepfile = gdir / "keeplist.txt"
+    cache = StageCache.for_dir(gdir, cfg)
+    key = cache.key("detect-ads", [transcript_path(sdir, s) for s in segments], cfg, ["ad_heuristics"])
+    if cache.fresh(keepfile, key):
+        print(f"Keep list up to date: {keepfile}")
+        cache.save()
+        return 0
+
+    scache = StageCache.for_dir(sdir, cfg)   # decisiones por segmento ya tomadas (follow)
+    rows = [segment_decision(seg, sdir, cfg, scache) for seg in segments]
+    scache.save()
+    keep = [seg for seg, r in zip(segments, rows) if r["decision"] == "keep"]
+
     with open(keepfile, "w", encoding="utf-8") as f:
         for k in keep:
             f.write(f"file '{k}'\n")
+    cache.record(keepfile, key); cache.save()
+    lake.put_decisions(cfg, "heuristics", rows)
     print(f"Keep list: {keepfile} (kept={len(keep)} of {len(segments)})")
     return 0
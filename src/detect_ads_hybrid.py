@@ -2,15 +2,15 @@ import os, glob, json
 from pathlib import Path
 from .config import load_config
 from .paths import bronze_dir, silver_dir, gold_dir
-from .detect_ads import vtt_blocks, is_ad_text   # reglas existentes
-from .detect_ads_llm import _read_vtt_text, _load_audio_meta, _mistral_classify
+from .stage_cache import StageCache
+from . import lake
+from .detect_ads import segment_ad_hits   # reglas existentes (motor compilado)
+from .detect_ads_llm import transcript_text, build_prompt, classify_prompts
+from .audio_analysis import load_audio_meta
+from .transcript import Transcript, load_transcript, transcript_path
 
-def _heuristics_score(vtt_path: Path, cfg: dict):
-    hits = total = 0
-    for _, _, txt in vtt_blocks(vtt_path):
-        total += 1
-        if is_ad_text(txt, cfg):
-            hits += 1
+def _heuristics_score(tr: Transcript, cfg: dict):
+    hits, total = segment_ad_hits(tr, cfg)
     ratio = (hits/total) if total else 0.0
     strong = (hits >= cfg["ad_heuristics"]["min_hits_per_segment"]) or (ratio >= cfg["ad_heuristics"]["ratio_threshold"])
     bl = cfg.get("llm", {}).get("heuristics_borderline", {})
@@ -26,15 +26,25 @@ def write_keep_list_hybrid(cfg: dict = None):
     segments = sorted(glob.glob(str(bdir / "raw_segment_*.ts")))
     max_chars = cfg.get("llm", {}).get("max_chars_per_segment", 9000)
 
-    keep, decisions = [], []
+    keepfile = gdir / "keeplist.txt"
+    decfile = gdir / "decisions_hybrid.json"
+    cache = StageCache.for_dir(gdir, cfg)
+    inputs = [p for s in segments for p in (transcript_path(sdir, s), sdir / (Path(s).stem + "_audio_meta.json"))]
+    key = cache.key("detect-ads-hybrid", inputs, cfg, ["ad_heuristics", "llm"])
+    if cache.fresh(keepfile, key) and cache.fresh(decfile, key):
+        print(f"[HYBRID] Keep list up to date: {keepfile}")
+        cache.save()
+        return 0
+
+    keep, decisions, borderline_rows = [], [], []
     for seg in segments:
-        vtt = sdir / (Path(seg).stem + ".vtt")
-        if not vtt.exists():
+        tr = load_transcript(sdir, seg, cfg)
+        if tr is None:
             keep.append(seg)
             decisions.append({"segment": Path(seg).name, "decision": "keep:no_vtt"})
             continue
 
-        hits, total, ratio, strong, borderline = _heuristics_score(vtt, cfg)
+        hits, total, ratio, strong, borderline = _heuristics_score(tr, cfg)
         if strong:
             decisions.append({"segment": Path(seg).name, "decision": "drop:heuristics", "hits": hits, "ratio": ratio})
             continue
@@ -43,25 +53,34 @@ def write_keep_list_hybrid(cfg: dict = None):
             decisions.append({"segment": Path(seg).name, "decision": "keep:heuristics", "hits": hits, "ratio": ratio})
             continue
 
-        # borderline → LLM
-        text = _read_vtt_text(vtt, max_chars)
-        meta = _load_audio_meta(sdir, seg)
-        try:
-            cls = _mistral_classify(text, meta, cfg)
-        except Exception as e:
-            cls = "programa"  # fail-open ante error API
-            decisions.append({"segment": Path(seg).name, "decision": f"keep:llm_error:{e}", "hits": hits, "ratio": ratio})
+        # borderline → LLM (se resuelven todos juntos más abajo)
+        text = transcript_text(tr, max_chars)
+        meta = load_audio_meta(sdir, seg, cfg)
+        row = {"segment": Path(seg).name, "decision": None, "hits": hits, "ratio": ratio}
+        decisions.append(row)
+        borderline_rows.append((seg, row, build_prompt(text, meta)))
 
-        if cls == "anuncio":
-            decisions.append({"segment": Path(seg).name, "decision": "drop:llm", "hits": hits, "ratio": ratio})
-        else:
-            keep.append(seg)
-            decisions.append({"segment": Path(seg).name, "decision": "keep:llm", "hits": hits, "ratio": ratio})
+    if borderline_rows:
+        labels = classify_prompts([p for _, _, p in borderline_rows], cfg)
+        for (seg, row, _), cls in zip(borderline_rows, labels):
+            if isinstance(cls, Exception):
+                row["decision"] = f"keep:llm_error:{cls}"  # fail-open ante error API
+                keep.append(seg)
+            elif cls == "anuncio":
+                row["decision"] = "drop:llm"
+            else:
+                row["decision"] = "keep:llm"
+                keep.append(seg)
+        keep.sort()
 
-    keepfile = gdir / "keeplist.txt"
     with open(keepfile, "w", encoding="utf-8") as f:
         for k in keep: f.write(f"file '{k}'\n")
 
-    (gdir / "decisions_hybrid.json").write_text(json.dumps(decisions, ensure_ascii=False, indent=2), encoding="utf-8")
+    decfile.write_text(json.dumps(decisions, ensure_ascii=False, indent=2), encoding="utf-8")
+    cache.record(keepfile, key); cache.record(decfile, key); cache.save()
+    lake.put_decisions(cfg, "hybrid", [
+        {"segment": d["segment"], "kind": "segment",
+         "decision": d["decision"].split(":")[0], "reason": d["decision"].split(":", 1)[1],
+         "hits": d.get("hits"), "ratio": d.get("ratio")} for d in decisions])
     print(f"[HYBRID] Keep list: {keepfile} (kept={len(keep)} of {len(segments)})")
     return 0
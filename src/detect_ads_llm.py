@@ -0,0 +1,192 @@
+import asyncio, hashlib, json, os, random, sys, threading, time
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import load_config
+from .transcript import Transcript, fmt_ts
+from .prompts import render
+from .ad_rules import engine_for, AD_SCORE
+
+MISTRAL_URL = "https://api.mistral.ai/v1/chat/completions"
+
+# --- Entrada para el LLM ---
+def transcript_text(tr: Transcript, max_chars: int = 9000) -> str:
+    """Texto del transcript con marca de inicio por bloque, recortado a max_chars."""
+    out, n = [], 0
+    for s, _, txt in tr.blocks():
+        line = f"[{fmt_ts(s)}] {txt}"
+        if n + len(line) > max_chars:
+            break
+        out.append(line); n += len(line) + 1
+    return "\n".join(out)
+
+def build_prompt(text: str, meta: dict) -> str:
+    return render("segment",
+                  voice_ratio=meta.get("voice_activity_ratio", "n/d"),
+                  silences=meta.get("silences", []),
+                  text=text)
+
+def _parse_label(content: str) -> str:
+    return "anuncio" if "anuncio" in (content or "").lower() else "programa"
+
+def prompt_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+# --- Caché persistente de respuestas ---
+class ResponseCache:
+    """JSONL append-only {key, label}: la misma tanda publicitaria no se paga dos veces."""
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.data = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                        self.data[row["key"]] = row["label"]
+                    except Exception:
+                        continue  # línea truncada
+
+    def get(self, key: str):
+        return self.data.get(key)
+
+    def put(self, key: str, label: str):
+        with self._lock:
+            self.data[key] = label
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "label": label}) + "\n")
+
+class RetryableError(Exception):
+    def __init__(self, msg, retry_after: float = None):
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+# --- Clasificador async ---
+class LLMClassifier:
+    """
+    Clasificación concurrente con:
+      - semáforo de concurrencia + requests.Session con pool de conexiones,
+      - reintentos con backoff exponencial (429/5xx/timeouts),
+      - caché persistente por hash del prompt y deduplicación de pedidos en vuelo.
+    """
+    def __init__(self, cfg: dict):
+        llm = cfg.get("llm", {})
+        self.url = llm.get("base_url") or MISTRAL_URL
+        self.model = llm.get("model", "mistral-small-latest")
+        self.timeout = float(llm.get("request_timeout_sec", 30))
+        self.max_retries = int(llm.get("max_retries", 4))
+        self.backoff = float(llm.get("backoff_base_sec", 1.0))
+        self.concurrency = max(1, int(llm.get("concurrency", 8)))
+        self.api_key = os.environ.get(llm.get("api_key_env", "MISTRAL_API_KEY"), "")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter); self.session.mount("https://", adapter)
+        self.cache = ResponseCache(Path(cfg["paths"]["data_root"]) / llm.get("cache_file", "llm_cache.jsonl"))
+        self._inflight = {}
+
+    def _post(self, prompt: str) -> str:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        body = {"model": self.model, "temperature": 0, "max_tokens": 5,
+                "messages": [{"role": "user", "content": prompt}]}
+        try:
+            r = self.session.post(self.url, json=body, headers=headers, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableError(str(e))
+        if r.status_code == 429 or r.status_code >= 500:
+            ra = r.headers.get("Retry-After")
+            raise RetryableError(f"HTTP {r.status_code}", float(ra) if ra and ra.isdigit() else None)
+        r.raise_for_status()
+        return _parse_label(r.json()["choices"][0]["message"]["content"])
+
+    async def _request(self, prompt: str, sem: asyncio.Semaphore) -> str:
+        async with sem:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await asyncio.to_thread(self._post, prompt)
+                except RetryableError as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = e.retry_after or self.backoff * (2 ** attempt) * (1 + random.random())
+                    print(f"[LLM] retry {attempt+1}/{self.max_retries} en {delay:.1f}s ({e})")
+                    await asyncio.sleep(delay)
+
+    async def classify(self, prompt: str, sem: asyncio.Semaphore) -> str:
+        key = prompt_key(self.model, prompt)
+        hit = self.cache.get(key)
+        if hit:
+            return hit
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.ensure_future(self._request(prompt, sem))
+        try:
+            label = await self._inflight[key]
+        finally:
+            self._inflight.pop(key, None)
+        if self.cache.get(key) is None:
+            self.cache.put(key, label)
+        return label
+
+    async def classify_many(self, prompts) -> list:
+        """Etiquetas en el mismo orden; los errores vuelven como excepción (no se propagan)."""
+        sem = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self.classify(p, sem) for p in prompts), return_exceptions=True)
+
+def classify_prompts(prompts, cfg: dict) -> list:
+    clf = LLMClassifier(cfg)
+    t0 = time.perf_counter()
+    labels = asyncio.run(clf.classify_many(list(prompts)))
+    print(f"[LLM] {len(labels)} prompts en {time.perf_counter()-t0:.1f}s (concurrency={clf.concurrency})")
+    return labels
+
+def _mistral_classify(text: str, meta: dict, cfg: dict) -> str:
+    """Clasificación de un solo segmento (compat); levanta excepción si falla."""
+    label = classify_prompts([build_prompt(text, meta)], cfg)[0]
+    if isinstance(label, Exception):
+        raise label
+    return label
+
+# --- Servidor local de reemplazo (tests/offline) ---
+def serve(cfg: dict = None, host: str = "127.0.0.1", port: int = 8765, latency: float = 0.0):
+    """
+    Imita /v1/chat/completions de Mistral: responde 'anuncio' o 'programa'
+    según las reglas de ad_heuristics sobre el prompt. Apuntar llm.base_url acá.
+    """
+    cfg = cfg or load_config()
+    engine = engine_for(cfg)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, para ejercitar el pool
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+            if latency:
+                time.sleep(latency)
+            # el prompt es el segmento entero: pedimos más que un bloque publicitario
+            label = "anuncio" if engine.score(prompt)[0] >= 2 * AD_SCORE else "programa"
+            out = json.dumps({"model": body.get("model"),
+                              "choices": [{"index": 0, "message": {"role": "assistant", "content": label}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer((host, port), Handler)
+    print(f"[LLM] stand-in server en http://{host}:{srv.server_address[1]}/v1/chat/completions")
+    return srv
+
+if __name__ == "__main__":
+    # python -m src.detect_ads_llm serve [port] [latency_sec]
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+        latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+        serve(port=port, latency=latency).serve_forever()
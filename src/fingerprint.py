@@ -0,0 +1,343 @@
+"""
+Huellas acústicas de tandas/spots ya conocidos.
+
+Por segmento: PCM mono 8 kHz → STFT (1024/256) → picos espectrales locales →
+hashes de pares (f_ancla, f_destino, Δt) con su tiempo de ancla. Los hashes
+se buscan en un índice en disco (arrays .npy ordenados, abiertos con mmap y
+consultados con searchsorted). Un spot aparece cuando muchos hashes
+coinciden con el mismo desfasaje temporal; el intervalo resultante es
+(start, end) en segundos, lo mismo que consume cut_builder.
+
+El índice crece solo: cut_builder agrega los cortes confirmados por texto
+que todavía no estaban cubiertos por un spot conocido, reutilizando los
+hashes ya calculados del segmento (sidecar <stem>_fp.npz, sin re-decodificar).
+"""
+import fcntl, glob, json, os, time
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .config import load_config
+from .paths import bronze_dir, silver_dir
+from .stage_cache import StageCache
+from .pcm import cached_pcm, pcm_blocks, SAMPLE_RATE as PCM_RATE
+from . import metrics
+
+SAMPLE_RATE = 8000
+N_FFT = 1024
+HOP = 256                       # 32 ms por frame
+FRAME_SEC = HOP / SAMPLE_RATE
+CHUNK_FRAMES = 4096             # STFT por tramos: memoria acotada
+PEAK_T, PEAK_F = 8, 12          # vecindario del máximo local (frames, bins)
+PEAKS_PER_SEC = 25
+ABS_FLOOR = np.log(0.1)         # magnitud mínima (descarta silencio/ruido de fondo)
+FAN_OUT, MAX_DT, MAX_DF = 5, 63, 96
+# hash = f_ancla << 15 | f_destino << 6 | dt: 6 bits de dt y 9 de f_destino,
+# así que los picos quedan en bins < 512 (se descarta Nyquist, el bin 512)
+F_BINS = 1 << 9
+MAX_PER_HASH = 64               # hashes demasiado comunes no discriminan
+CLUSTER_GAP = int(3.0 / FRAME_SEC)
+
+# --- Huella ---
+def _max_filter(S: np.ndarray, t: int, f: int) -> np.ndarray:
+    P = np.pad(S, ((t, t), (f, f)), constant_values=-np.inf)
+    P = sliding_window_view(P, 2 * f + 1, axis=1).max(axis=-1)
+    return sliding_window_view(P, 2 * t + 1, axis=0).max(axis=-1)
+
+def spectral_peaks(x: np.ndarray):
+    """x: float32 mono a SAMPLE_RATE → (t_frames int32, f_bins int32) ordenados por tiempo."""
+    if len(x) < N_FFT:
+        return np.zeros(0, np.int32), np.zeros(0, np.int32)
+    frames = sliding_window_view(x, N_FFT)[::HOP]
+    win = np.hanning(N_FFT).astype(np.float32)
+    n = len(frames)
+    ts, fs = [], []
+    for c0 in range(0, n, CHUNK_FRAMES):
+        c1 = min(n, c0 + CHUNK_FRAMES)
+        a, b = max(0, c0 - PEAK_T), min(n, c1 + PEAK_T)
+        S = np.log(np.abs(np.fft.rfft(frames[a:b] * win, axis=1)).astype(np.float32) + 1e-6)
+        S[:, :4] = -np.inf  # DC / rumble
+        S[:, F_BINS:] = -np.inf  # Nyquist: no entra en los 9 bits del hash
+        core = slice(c0 - a, c0 - a + (c1 - c0))
+        is_peak = (S == _max_filter(S, PEAK_T, PEAK_F))[core]
+        Sc = S[core]
+        is_peak &= Sc > max(ABS_FLOOR, float(np.median(Sc[np.isfinite(Sc)])) + 1.0)
+        t, f = np.nonzero(is_peak)
+        keep = int(PEAKS_PER_SEC * (c1 - c0) * FRAME_SEC)
+        if len(t) > keep:
+            top = np.argpartition(Sc[t, f], -keep)[-keep:]
+            t, f = t[top], f[top]
+        ts.append(t + c0); fs.append(f)
+    t = np.concatenate(ts).astype(np.int32); f = np.concatenate(fs).astype(np.int32)
+    order = np.lexsort((f, t))
+    return t[order], f[order]
+
+def peak_hashes(t: np.ndarray, f: np.ndarray):
+    """Pares ancla→destino (hasta FAN_OUT por ancla) → (hashes uint32, t_ancla uint32)."""
+    hs, ht = [], []
+    cnt = np.zeros(len(t), np.int32)
+    for k in range(1, 4 * FAN_OUT + 1):
+        if k >= len(t):
+            break
+        i = np.arange(len(t) - k); j = i + k
+        dt = t[j] - t[i]; df = f[j] - f[i]
+        ok = (dt >= 1) & (dt <= MAX_DT) & (np.abs(df) <= MAX_DF) & (cnt[i] < FAN_OUT)
+        cnt[i] += ok
+        i, j = i[ok], j[ok]
+        hs.append((f[i].astype(np.uint32) << 15) | (f[j].astype(np.uint32) << 6) | (t[j] - t[i]).astype(np.uint32))
+        ht.append(t[i].astype(np.uint32))
+    if not hs:
+        return np.zeros(0, np.uint32), np.zeros(0, np.uint32)
+    return np.concatenate(hs), np.concatenate(ht)
+
+# pasabajos de media banda (sinc con ventana de Hann, 31 taps) para 16 → 8 kHz
+_HALFBAND = np.sinc(np.arange(-15, 16) / 2) * np.hanning(33)[1:-1]
+_HALFBAND = (_HALFBAND / _HALFBAND.sum()).astype(np.float32)
+
+def fingerprint_file(path, cfg: dict, sdir: Path = None):
+    """
+    Audio a 8 kHz → (hashes, tiempos en frames, duración en s). Con sdir se
+    diezma el PCM 16 kHz de la caché de Silver (sin otro ffmpeg); si no,
+    se decodifica directo a 8 kHz.
+    """
+    if sdir is not None and cfg.get("pcm_cache", {}).get("enabled", True):
+        x16 = cached_pcm(path, cfg, sdir).astype(np.float32) / 32768.0
+        x = np.convolve(x16, _HALFBAND, mode="same")[::PCM_RATE // SAMPLE_RATE] if len(x16) else x16
+    else:
+        x = np.concatenate([b.astype(np.float32) / 32768.0
+                            for b in pcm_blocks(path, cfg, sample_rate=SAMPLE_RATE)] or [np.zeros(0, np.float32)])
+    h, t = peak_hashes(*spectral_peaks(x))
+    return h, t, len(x) / SAMPLE_RATE
+
+# --- Índice en disco ---
+def index_dir(cfg: dict) -> Path:
+    fcfg = cfg.get("fingerprint", {})
+    return Path(fcfg.get("index_dir") or Path(cfg["paths"]["data_root"]) / "fingerprints")
+
+class FingerprintIndex:
+    """
+    hashes.npy (uint32, ordenado) + spots.npy (id de spot) + times.npy
+    (frame dentro del spot), alineados; spots.json con los metadatos.
+    Lectura con mmap: consultar no carga el índice entero en memoria.
+    Un flock sobre .lock hace que varios procesos (backfill) no lean un
+    índice a medio reescribir ni pisen spots agregados por otro.
+    """
+    FILES = ("hashes", "spots", "times")
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.meta_path = self.path / "spots.json"
+        with self._locked(fcntl.LOCK_SH):
+            self._load()
+
+    def _load(self):
+        self.spots = json.loads(self.meta_path.read_text(encoding="utf-8")) if self.meta_path.exists() else []
+        if (self.path / "hashes.npy").exists():
+            self.hashes, self.spot_ids, self.times = (np.load(self.path / f"{n}.npy", mmap_mode="r") for n in self.FILES)
+        else:
+            self.hashes = np.zeros(0, np.uint32); self.spot_ids = np.zeros(0, np.uint32); self.times = np.zeros(0, np.uint32)
+
+    @contextmanager
+    def _locked(self, mode: int):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / ".lock", "a") as f:
+            fcntl.flock(f, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @classmethod
+    def for_cfg(cls, cfg: dict):
+        return cls(index_dir(cfg))
+
+    def __len__(self):
+        return len(self.spots)
+
+    def match(self, qh: np.ndarray, qt: np.ndarray, min_matches: int = 30) -> list:
+        """
+        Intervalos del query que coinciden con spots del índice:
+        [{"start", "end", "spot", "score"}], en segundos del query.
+        """
+        if not len(qh) or not len(self.hashes):
+            return []
+        lo = np.searchsorted(self.hashes, qh, "left")
+        hi = np.searchsorted(self.hashes, qh, "right")
+        cnt = hi - lo
+        cnt[cnt > MAX_PER_HASH] = 0
+        total = int(cnt.sum())
+        if total < min_matches:
+            return []
+        starts = np.cumsum(cnt) - cnt
+        idx = np.repeat(lo, cnt) + (np.arange(total) - np.repeat(starts, cnt))
+        tq = np.repeat(qt.astype(np.int64), cnt)
+        spot = np.asarray(self.spot_ids[idx]).astype(np.int64)
+        off = np.asarray(self.times[idx]).astype(np.int64) - tq  # constante si es el mismo spot alineado
+        # bins de desfasaje de 2 frames; cada bin suma a sus vecinos ±1 del
+        # mismo spot (jitter) y solo se toman máximos locales
+        key = (spot << 32) | ((off // 2) + (1 << 31))
+        uniq, counts = np.unique(key, return_counts=True)
+        left = np.zeros_like(counts); right = np.zeros_like(counts)
+        adj = np.diff(uniq) == 1
+        left[1:][adj] = counts[:-1][adj]; right[:-1][adj] = counts[1:][adj]
+        score = counts + left + right
+        lscore = np.concatenate(([0], np.where(adj, score[:-1], 0)))
+        rscore = np.concatenate((np.where(adj, score[1:], 0), [0]))
+        out = []
+        for b in np.flatnonzero((score >= min_matches) & (score >= lscore) & (score > rscore)):
+            m = np.abs(key - uniq[b]) <= 1
+            ts = np.sort(tq[m])
+            # cluster más denso: descarta coincidencias sueltas lejos del spot
+            cuts = np.flatnonzero(np.diff(ts) > CLUSTER_GAP) + 1
+            parts = np.split(ts, cuts)
+            best = max(parts, key=len)
+            if len(best) < min_matches:
+                continue
+            out.append({"start": round(float(best[0] * FRAME_SEC), 3),
+                        "end": round(float(best[-1] * FRAME_SEC + N_FFT / SAMPLE_RATE), 3),
+                        "spot": int(spot[m][0]), "score": int(len(best))})
+        # un mismo spot también "coincide" débilmente con desfasajes vecinos
+        # (material repetitivo): se funden los solapados y queda el mejor score
+        out.sort(key=lambda d: (d["spot"], d["start"]))
+        merged = []
+        for d in out:
+            p = merged[-1] if merged else None
+            if p and p["spot"] == d["spot"] and d["start"] <= p["end"]:
+                p["end"] = max(p["end"], d["end"]); p["score"] = max(p["score"], d["score"])
+            else:
+                merged.append(d)
+        merged.sort(key=lambda d: d["start"])
+        return merged
+
+    def add(self, hashes: np.ndarray, times: np.ndarray, meta: dict, min_matches: int = 0) -> int:
+        """
+        Agrega un spot (tiempos relativos a su inicio) y reescribe el índice de
+        forma atómica. Con min_matches, antes se busca el spot en el índice
+        vivo (bajo el mismo lock) y si ya está cubierto no se agrega: None.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            # otro proceso pudo haber agregado spots desde que se abrió el índice
+            if self.meta_path.exists() and len(json.loads(self.meta_path.read_text(encoding="utf-8"))) != len(self.spots):
+                self._load()
+            if min_matches and len(times):
+                hits = self.match(hashes, times, min_matches)
+                span = (0.0, float(times.max() + 1) * FRAME_SEC)
+                if _covered(span, [(d["start"], d["end"]) for d in hits]) >= 0.8:
+                    return None
+            return self._add(hashes, times, meta)
+
+    def _add(self, hashes: np.ndarray, times: np.ndarray, meta: dict) -> int:
+        sid = len(self.spots)
+        h = np.concatenate([np.asarray(self.hashes), hashes.astype(np.uint32)])
+        s = np.concatenate([np.asarray(self.spot_ids), np.full(len(hashes), sid, np.uint32)])
+        t = np.concatenate([np.asarray(self.times), times.astype(np.uint32)])
+        order = np.argsort(h, kind="stable")
+        for name, arr in zip(self.FILES, (h[order], s[order], t[order])):
+            tmp = self.path / f".{name}.tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, self.path / f"{name}.npy")
+        self.hashes, self.spot_ids, self.times = h[order], s[order], t[order]
+        self.spots.append({"id": sid, "added": time.time(), "n_hashes": int(len(hashes)), **meta})
+        tmp = self.meta_path.with_name(".spots.json.tmp")
+        tmp.write_text(json.dumps(self.spots, ensure_ascii=False, indent=1), encoding="utf-8")
+        tmp.replace(self.meta_path)
+        return sid
+
+# --- Etapa ---
+def sidecar_paths(sdir: Path, seg: str):
+    stem = Path(seg).stem
+    return sdir / f"{stem}_fp.npz", sdir / f"{stem}_fp.json"
+
+def fingerprint_segments(cfg: dict = None):
+    """
+    Huella de cada segmento Bronze + búsqueda en el índice. Escribe en Silver
+    <stem>_fp.npz (hashes para aprender) y <stem>_fp.json (spots encontrados).
+    """
+    cfg = cfg or load_config()
+    fcfg = cfg.get("fingerprint", {})
+    if not fcfg.get("enabled", True):
+        return 0
+    bdir = bronze_dir(cfg); sdir = silver_dir(cfg)
+    sdir.mkdir(parents=True, exist_ok=True)
+    segments = sorted(glob.glob(str(bdir / "raw_segment_*.ts")))
+    if not segments:
+        print("No hay segmentos en Bronze:", bdir)
+        return 1
+
+    index = FingerprintIndex.for_cfg(cfg)
+    min_matches = int(fcfg.get("min_matches", 30))
+    cache = StageCache.for_dir(sdir, cfg)
+    for seg in segments:
+        fingerprint_segment(seg, sdir, cfg, cache, index, min_matches)
+    cache.save()
+    return 0
+
+def fingerprint_segment(seg: str, sdir: Path, cfg: dict, cache: StageCache,
+                        index: FingerprintIndex, min_matches: int = 30) -> int:
+    """Huella + búsqueda de un segmento (salvo que sus sidecars estén en caché)."""
+    npz, out_json = sidecar_paths(sdir, seg)
+    idx_file = index.path / "hashes.npy"
+    key = cache.key("fingerprint", [seg] + ([idx_file] if idx_file.exists() else []), cfg, ["fingerprint"])
+    if cache.fresh(out_json, key) and npz.exists():
+        return 0
+    with metrics.span("fingerprint", segment=os.path.basename(seg)):
+        if npz.exists() and cache.fresh(npz, cache.key("fingerprint-hashes", [seg], cfg)):
+            z = np.load(npz); h, t, dur = z["hashes"], z["times"], float(z["duration_sec"])
+        else:
+            h, t, dur = fingerprint_file(seg, cfg, sdir)
+            np.savez(npz, hashes=h, times=t, duration_sec=dur)
+            cache.record(npz, cache.key("fingerprint-hashes", [seg], cfg))
+        matches = index.match(h, t, min_matches)
+    out_json.write_text(json.dumps({"segment": os.path.basename(seg), "duration_sec": dur,
+                                    "matches": matches}, indent=1), encoding="utf-8")
+    cache.record(out_json, key)
+    if matches:
+        print(f"[FP] {os.path.basename(seg)}: {len(matches)} spot(s) conocido(s)")
+    return 0
+
+def load_matches(sdir: Path, seg: str) -> list:
+    """Intervalos (start, end) de spots conocidos para un segmento; [] si no hay huella."""
+    _, js = sidecar_paths(sdir, seg)
+    if not js.exists():
+        return []
+    try:
+        return [(m["start"], m["end"]) for m in json.loads(js.read_text(encoding="utf-8"))["matches"]]
+    except (ValueError, KeyError):
+        return []
+
+def _covered(iv, known: list) -> float:
+    s, e = iv
+    return sum(max(0.0, min(e, ke) - max(s, ks)) for ks, ke in known) / max(1e-6, e - s)
+
+def learn_intervals(cfg: dict, sdir: Path, seg: str, intervals: list, index: "FingerprintIndex" = None) -> int:
+    """
+    Agrega al índice los intervalos confirmados de `seg` que no estén ya
+    cubiertos por spots conocidos. Usa los hashes del sidecar del segmento.
+    """
+    fcfg = cfg.get("fingerprint", {})
+    if not fcfg.get("enabled", True) or not fcfg.get("learn", True):
+        return 0
+    npz, _ = sidecar_paths(sdir, seg)
+    if not npz.exists():
+        return 0
+    if index is None:
+        index = FingerprintIndex.for_cfg(cfg)
+    known = load_matches(sdir, seg)
+    max_len = float(fcfg.get("max_spot_sec", 300))
+    z = np.load(npz); h, t = z["hashes"], z["times"]
+    added = 0
+    for s, e in intervals:
+        if e - s > max_len or _covered((s, e), known) >= 0.8:
+            continue
+        f0, f1 = int(s / FRAME_SEC), int(e / FRAME_SEC)
+        m = (t >= f0) & (t < f1)
+        if m.sum() < 4 * int(fcfg.get("min_matches", 30)):
+            continue
+        # el sidecar _fp.json es de antes de esta corrida: los spots aprendidos recién
+        # (en esta misma pasada o por otro día del backfill) se buscan en el índice vivo
+        sid = index.add(h[m], t[m] - f0, {"segment": os.path.basename(seg), "start": s, "end": e},
+                        min_matches=int(fcfg.get("min_matches", 30)))
+        known.append((s, e))
+        added += sid is not None
+    return added
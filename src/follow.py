@@ -0,0 +1,104 @@
+import glob, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .config import load_config
+from .paths import bronze_dir, silver_dir
+from .record import record_and_segment
+from .manifest import write_manifest
+from .healthcheck import check_segment
+from .stage_cache import StageCache
+from .transcribe import SegmentTranscriber
+from .detect_ads import segment_decision, write_keep_list
+from .assemble import assemble_clean
+from . import lake
+
+SEG_RE = re.compile(r"raw_segment_(\d+)_")
+
+def _seg_index(path: str) -> int:
+    m = SEG_RE.search(Path(path).name)
+    return int(m.group(1)) if m else -1
+
+def completed_segments(bdir: Path, ignore: set, recording: bool) -> list:
+    """
+    Segmentos nuevos ya cerrados. Mientras ffmpeg graba, el segment muxer
+    solo escribe el último archivo: un segmento está completo cuando ya
+    existe el siguiente. Al terminar la grabación, todos están completos.
+    """
+    segs = [s for s in glob.glob(str(bdir / "raw_segment_*.ts")) if s not in ignore]
+    segs.sort(key=_seg_index)
+    return segs[:-1] if recording else segs
+
+def follow(cfg: dict = None):
+    """
+    Graba y procesa en paralelo: cada segmento cerrado pasa por
+    manifest → healthcheck → transcribe → detect-ads mientras la grabación sigue.
+    Al terminar el programa solo queda keeplist + assemble.
+    """
+    cfg = cfg or load_config()
+    bdir = bronze_dir(cfg); sdir = silver_dir(cfg)
+    sdir.mkdir(parents=True, exist_ok=True)
+    poll = float(cfg.get("follow", {}).get("poll_sec", 2.0))
+
+    # ignoramos lo que ya estaba en la partición antes de arrancar
+    preexisting = set(glob.glob(str(bdir / "raw_segment_*.ts")))
+    rec_rc = {}
+    rec = threading.Thread(target=lambda: rec_rc.setdefault("rc", record_and_segment(cfg)), daemon=True)
+    rec.start()
+    print(f"[FOLLOW] watching {bdir} (poll={poll}s)")
+
+    seen = set(preexisting)
+    done = []      # segmentos válidos, en orden
+    pending = {}   # future -> segmento
+    # misma caché, plan de VAD, batch y lake que transcribe/run-post; los
+    # hilos solo esperan al pool de whisper (o al backend cli/python)
+    cache = StageCache.for_dir(sdir, cfg)
+    transcriber = SegmentTranscriber(cfg, cache)
+    ex = ThreadPoolExecutor(max_workers=transcriber.slots())
+    rc = 0
+    try:
+        while True:
+            recording = rec.is_alive()
+            for seg in completed_segments(bdir, seen, recording):
+                seen.add(seg)
+                if not check_segment(seg):
+                    continue
+                done.append(seg)
+                write_manifest(cfg, sorted(done, key=_seg_index))
+                pending[ex.submit(transcriber, seg)] = seg
+
+            for fut in [f for f in pending if f.done()]:
+                seg = pending.pop(fut)
+                try:
+                    seg_rc = fut.result()
+                except Exception as e:
+                    print("[FOLLOW] transcribe error en", seg, "->", e)
+                    seg_rc = 1
+                if seg_rc:
+                    rc = seg_rc
+                    continue
+                _detect(seg, sdir, cfg, cache)
+
+            if not recording and not pending and not completed_segments(bdir, seen, False):
+                break
+            time.sleep(poll)
+    finally:
+        ex.shutdown(wait=True)
+        transcriber.close()
+        cache.save()
+
+    if rec_rc.get("rc"):
+        print("[FOLLOW] record terminó con rc =", rec_rc["rc"])
+    if not done:
+        print("[FOLLOW] no se grabaron segmentos válidos")
+        return rec_rc.get("rc") or 1
+    rc = write_keep_list(cfg) or rc
+    lake.compact_partition(cfg)
+    if rc: return rc
+    return assemble_clean(cfg)
+
+def _detect(seg: str, sdir: Path, cfg: dict, cache: StageCache):
+    """Decide el segmento apenas se transcribe y lo deja en Silver: al final solo se arma el keeplist."""
+    row = segment_decision(seg, sdir, cfg, cache)
+    if row["reason"] != "no_vtt":
+        label = "anuncio" if row["decision"] == "drop" else "programa"
+        print(f"[FOLLOW] {Path(seg).name}: {label}")
@@ -1,21 +1,43 @@
 import glob, os, sys
 from .config import load_config
 from .paths import bronze_dir
+from .adts import scan_file
 
-def main():
-    cfg = load_config()
+MIN_SEGMENT_BYTES = 32_000  # <32KB probable segmento vacío (si no es ADTS legible)
+MIN_SEGMENT_SEC = 2.0       # menos audio que esto por tramas = segmento vacío
+
+def check_segment(path: str, info: dict = None) -> bool:
+    """
+    Valida un segmento por sus tramas ADTS (duración exacta, pérdidas de
+    sync); si es demasiado corto lo borra y devuelve False.
+    """
+    info = info or scan_file(path)[0]
+    if info["container"] is None:
+        tiny = os.path.getsize(path) < MIN_SEGMENT_BYTES
+    else:
+        tiny = info["duration_sec"] < MIN_SEGMENT_SEC
+    if tiny:
+        print("Removing tiny segment:", path)
+        os.remove(path)
+        return False
+    if info["sync_losses"]:
+        print(f"[HEALTH] {os.path.basename(path)}: {len(info['sync_losses'])} pérdida(s) de sync, "
+              f"{info['corrupt_bytes']} bytes corruptos")
+    return True
+
+def main(cfg: dict = None):
+    cfg = cfg or load_config()
     bdir = bronze_dir(cfg)
     segs = sorted(glob.glob(str(bdir / "raw_segment_*.ts")))
     expected = max(1, cfg["program_duration_sec"] // cfg["segment_time_sec"])
-    kept = 0
+    kept = 0; audio = 0.0
     for s in segs:
-        if os.path.getsize(s) < 32_000:  # <32KB probable segmento vacío
-            print("Removing tiny segment:", s)
-            os.remove(s)
-        else:
+        info = scan_file(s)[0]
+        if check_segment(s, info):
             kept += 1
+            audio += info["duration_sec"]
     ok = kept >= expected - 1  # tolerancia
-    print(f"Segments kept={kept}, expected~={expected}, OK={ok}")
+    print(f"Segments kept={kept}, expected~={expected}, audio={audio:.1f}s, OK={ok}")
     return 0 if ok else 2
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+"""
+Conjuntos de intervalos sobre arrays NumPy (inicios / fines en segundos).
+
+Un IntervalSet siempre está normalizado: ordenado, sin solapes y con los
+intervalos que se tocan ya unidos. Todas las operaciones son vectorizadas
+(sort + cummax + searchsorted), así que escalan a decenas de miles de
+ventanas sobre una grabación continua de 24 h.
+"""
+import numpy as np
+
+_EMPTY = np.zeros(0, dtype=np.float64)
+
+def _normalize(starts: np.ndarray, ends: np.ndarray, gap: float = 0.0):
+    """
+    Barrido sobre los inicios ordenados con el fin máximo acumulado: abre un
+    intervalo nuevo donde el hueco con lo anterior supera `gap`.
+    """
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return _EMPTY, _EMPTY
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    new = np.empty(len(starts), dtype=bool)
+    new[0] = True
+    new[1:] = starts[1:] - reach[:-1] > gap
+    idx = np.flatnonzero(new)
+    return starts[idx], np.maximum.reduceat(ends, idx)
+
+class IntervalSet:
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, starts=(), ends=(), gap: float = 0.0):
+        self.starts, self.ends = _normalize(np.asarray(starts, dtype=np.float64).ravel(),
+                                            np.asarray(ends, dtype=np.float64).ravel(), gap)
+
+    @classmethod
+    def from_pairs(cls, pairs, gap: float = 0.0) -> "IntervalSet":
+        a = np.asarray(list(pairs), dtype=np.float64).reshape(-1, 2)
+        return cls(a[:, 0], a[:, 1], gap)
+
+    @classmethod
+    def of(cls, x) -> "IntervalSet":
+        """Acepta un IntervalSet o una lista de (s, e)."""
+        return x if isinstance(x, IntervalSet) else cls.from_pairs(x)
+
+    @classmethod
+    def _raw(cls, starts: np.ndarray, ends: np.ndarray) -> "IntervalSet":
+        """Sin normalizar: solo para resultados que ya salen ordenados y disjuntos."""
+        out = cls.__new__(cls)
+        out.starts, out.ends = starts, ends
+        return out
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __repr__(self):
+        return f"IntervalSet({self.to_list()!r})"
+
+    def to_list(self) -> list:
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
+    def lengths(self) -> np.ndarray:
+        return self.ends - self.starts
+
+    def total(self) -> float:
+        return float(self.lengths().sum())
+
+    # --- Operaciones ---
+    def union(self, *others: "IntervalSet") -> "IntervalSet":
+        return IntervalSet(np.concatenate([self.starts] + [o.starts for o in others]),
+                           np.concatenate([self.ends] + [o.ends for o in others]))
+
+    __or__ = union
+
+    def join(self, gap: float) -> "IntervalSet":
+        """Une intervalos separados por huecos <= gap."""
+        return IntervalSet(self.starts, self.ends, gap)
+
+    def dilate(self, before: float, after: float = None) -> "IntervalSet":
+        """Agranda cada intervalo (negativo = erosiona; los que se anulan desaparecen)."""
+        after = before if after is None else after
+        return IntervalSet(self.starts - before, self.ends + after)
+
+    def min_length(self, min_len: float) -> "IntervalSet":
+        keep = self.lengths() >= min_len
+        return IntervalSet._raw(self.starts[keep], self.ends[keep])
+
+    def clip(self, lo: float, hi: float) -> "IntervalSet":
+        return IntervalSet(np.clip(self.starts, lo, hi), np.clip(self.ends, lo, hi))
+
+    def complement(self, lo: float, hi: float) -> "IntervalSet":
+        """Huecos de [lo, hi] no cubiertos por el conjunto."""
+        c = self.clip(lo, hi)
+        return IntervalSet(np.concatenate(([lo], c.ends)), np.concatenate((c.starts, [hi])))
+
+    def intersection(self, other: "IntervalSet") -> "IntervalSet":
+        # para cada intervalo propio, el rango [lo, hi) de intervalos de `other` que lo cortan
+        lo = np.searchsorted(other.ends, self.starts, side="right")
+        hi = np.searchsorted(other.starts, self.ends, side="left")
+        n = np.maximum(hi - lo, 0)
+        if not n.sum():
+            return IntervalSet()
+        mine = np.repeat(np.arange(len(self)), n)
+        theirs = np.repeat(lo - np.cumsum(n) + n, n) + np.arange(n.sum())
+        s = np.maximum(self.starts[mine], other.starts[theirs])
+        e = np.minimum(self.ends[mine], other.ends[theirs])
+        keep = e > s
+        return IntervalSet._raw(s[keep], e[keep])
+
+    __and__ = intersection
+
+    def subtract(self, other: "IntervalSet") -> "IntervalSet":
+        if not len(self) or not len(other):
+            return self
+        return self.intersection(other.complement(float(self.starts[0]), float(self.ends[-1])))
+
+    __sub__ = subtract
+
+    def overlaps(self, other: "IntervalSet", tol: float = 0.0) -> np.ndarray:
+        """Máscara: intervalos propios a distancia < tol de alguno de `other` (tol=0: solape estricto)."""
+        before_end = np.searchsorted(other.starts, self.ends + tol, side="left")
+        ended = np.searchsorted(other.ends, self.starts - tol, side="right")
+        return before_end > ended
+
+    def select(self, mask: np.ndarray) -> "IntervalSet":
+        return IntervalSet._raw(self.starts[mask], self.ends[mask])
@@ -0,0 +1,237 @@
+import fcntl, json, re
+from pathlib import Path
+
+from .paths import date_parts
+
+# pyarrow se importa recién al primer uso del lake: las etapas que no escriben
+# tablas (o un `pipeline manifest`) no pagan su import.
+pa = ds = pq = None
+PARTITIONING = None
+SCHEMAS = {}
+_loaded = None
+
+def _arrow() -> bool:
+    """Importa pyarrow una vez y arma esquemas/particionado; False si no está instalado."""
+    global pa, ds, pq, PARTITIONING, _loaded
+    if _loaded is not None:
+        return _loaded
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:  # el lake es opcional: sin pyarrow las etapas siguen escribiendo VTT/JSON
+        _loaded = False
+        return False
+    pa, ds, pq = pyarrow, pyarrow.dataset, pyarrow.parquet
+    # --- Esquemas (Silver/Gold como tablas columnares) ---
+    SCHEMAS.update({
+        "transcripts": pa.schema([
+            ("segment", pa.string()), ("block", pa.int32()),
+            ("start", pa.float64()), ("end", pa.float64()), ("text", pa.string()),
+        ]),
+        "audio_meta": pa.schema([
+            ("segment", pa.string()), ("duration_sec", pa.float64()),
+            ("voice_activity_ratio", pa.float64()),
+            ("silence_starts", pa.list_(pa.float64())), ("silence_ends", pa.list_(pa.float64())),
+            ("speech_ratio", pa.float64()), ("music_ratio", pa.float64()),
+            ("meta_json", pa.string()),   # el dict completo de analyze (timelines incluidos)
+        ]),
+        # kind = "segment" (decisión sobre el segmento entero) | "interval" (corte fino)
+        "decisions": pa.schema([
+            ("segment", pa.string()), ("kind", pa.string()), ("source", pa.string()),
+            ("decision", pa.string()), ("reason", pa.string()),
+            ("start", pa.float64()), ("end", pa.float64()),
+            ("hits", pa.int32()), ("ratio", pa.float64()),
+        ]),
+    })
+    PARTITIONING = ds.partitioning(pa.schema([("station", pa.string()), ("date", pa.string())]), flavor="hive")
+    _loaded = True
+    return True
+
+def _require():
+    if not _arrow():
+        raise RuntimeError("pyarrow no instalado: pip install pyarrow")
+
+_warned = False
+
+def enabled(cfg: dict) -> bool:
+    global _warned
+    if not cfg.get("lake", {}).get("enabled", True):
+        return False
+    if not _arrow():
+        if not _warned:
+            print("[LAKE] pyarrow no instalado: se omite la escritura de tablas")
+            _warned = True
+        return False
+    return True
+
+def lake_root(cfg: dict) -> Path:
+    return Path(cfg.get("lake", {}).get("root") or Path(cfg["paths"]["data_root"]) / "lake")
+
+def station(cfg: dict) -> str:
+    return cfg.get("station", "default")
+
+def partition_date(cfg: dict) -> str:
+    y, m, d, _ = date_parts(cfg["timezone"], cfg.get("date"))
+    return f"{y}-{m}-{d}"
+
+# Columna que identifica a un `part`: reescribir ese valor reemplaza sus filas.
+KEYS = {"transcripts": "segment", "audio_meta": "segment", "decisions": "source"}
+COMPACT_NAME = "compact.parquet"
+
+def _part_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+def _partition(table: str, cfg: dict, date: str = None) -> Path:
+    return lake_root(cfg) / table / f"station={station(cfg)}" / f"date={date or partition_date(cfg)}"
+
+def _locked(d: Path):
+    """flock exclusivo de la partición (escrituras y compactación)."""
+    d.mkdir(parents=True, exist_ok=True)
+    f = open(d / ".lock", "w")
+    fcntl.flock(f, fcntl.LOCK_EX)
+    return f
+
+def _write(tbl, out: Path):
+    tmp = out.with_name(f".{out.name}.tmp")  # pyarrow ignora los archivos con prefijo "."
+    pq.write_table(tbl, tmp, compression="zstd")
+    tmp.replace(out)
+
+def write_rows(table: str, rows: list, cfg: dict, part: str, date: str = None) -> Path:
+    """
+    Escribe `rows` en <root>/<table>/station=S/date=D/part-<part>.parquet.
+    Append por archivo: reescribir el mismo `part` (p.ej. el nombre del segmento)
+    reemplaza esas filas, así re-correr una etapa es idempotente. Si la
+    partición ya se compactó y traía filas de ese `part`, se sacan de ahí.
+    """
+    if not enabled(cfg):
+        return None
+    d = _partition(table, cfg, date)
+    out = d / f"part-{_part_name(part)}.parquet"
+    with _locked(d):
+        _write(pa.Table.from_pylist(rows, schema=SCHEMAS[table]), out)
+        comp = d / COMPACT_NAME
+        if comp.exists():
+            old = pq.read_table(comp)
+            stale = pa.compute.equal(old[KEYS[table]], part)
+            if pa.compute.any(stale).as_py():
+                _write(old.filter(pa.compute.invert(stale)), comp)
+    return out
+
+def compact(table: str, cfg: dict, date: str = None) -> int:
+    """
+    Junta los part-*.parquet de una partición en un único compact.parquet
+    (las filas de cada part reemplazan las de su clave) y borra los parts:
+    un escaneo de "el último mes" lee un archivo por día en vez de uno por
+    segmento. Devuelve cuántos parts se absorbieron.
+    """
+    if not enabled(cfg):
+        return 0
+    d = _partition(table, cfg, date)
+    if not d.exists():
+        return 0
+    with _locked(d):
+        parts = sorted(d.glob("part-*.parquet"))
+        if not parts:
+            return 0
+        new = pa.concat_tables([pq.read_table(p, schema=SCHEMAS[table]) for p in parts])
+        comp = d / COMPACT_NAME
+        if comp.exists():
+            old = pq.read_table(comp, schema=SCHEMAS[table])
+            keep = pa.compute.invert(pa.compute.is_in(old[KEYS[table]], value_set=pa.compute.unique(new[KEYS[table]])))
+            new = pa.concat_tables([old.filter(keep), new])
+        _write(new, comp)
+        for p in parts:
+            p.unlink()
+    return len(parts)
+
+def compact_partition(cfg: dict, date: str = None):
+    """Compacta todas las tablas de la partición del día."""
+    n = sum(compact(t, cfg, date) for t in KEYS) if enabled(cfg) else 0
+    if n:
+        print(f"[LAKE] compactados {n} parts en {lake_root(cfg)} (date={date or partition_date(cfg)})")
+    return n
+
+def key_rows(table: str, cfg: dict, key: str, date: str = None):
+    """
+    Filas de un `part` (segmento o fuente) de la partición del día: el
+    part-*.parquet si existe, si no compact.parquet filtrado. None si el
+    lake no está habilitado o no tiene esa clave (el caller cae al archivo).
+    """
+    if not enabled(cfg):
+        return None
+    d = _partition(table, cfg, date)
+    try:
+        tbl = pq.read_table(d / f"part-{_part_name(key)}.parquet", schema=SCHEMAS[table])
+    except FileNotFoundError:
+        try:
+            tbl = pq.read_table(d / COMPACT_NAME, schema=SCHEMAS[table], filters=[(KEYS[table], "=", key)])
+        except FileNotFoundError:
+            return None
+    return tbl if tbl.num_rows else None
+
+def scan(table: str, cfg: dict, columns: list = None, filter=None,
+         stations: list = None, date_from: str = None, date_to: str = None):
+    """
+    Lectura con pushdown: station/date podan directorios (partición hive) y
+    `filter` (expresión de pyarrow.dataset) se evalúa con las estadísticas de
+    cada row group antes de leer. Devuelve un pyarrow.Table.
+    """
+    _require()
+    root = lake_root(cfg) / table
+    if not root.exists():
+        return SCHEMAS[table].empty_table()
+    dset = ds.dataset(str(root), format="parquet", partitioning=PARTITIONING)
+    expr = filter
+    for cond in (
+        ds.field("station").isin(stations) if stations else None,
+        ds.field("date") >= date_from if date_from else None,
+        ds.field("date") <= date_to if date_to else None,
+    ):
+        if cond is not None:
+            expr = cond if expr is None else expr & cond
+    return dset.to_table(columns=columns, filter=expr)
+
+# --- Adaptadores desde las salidas de cada etapa ---
+def put_transcript(cfg: dict, segment: str, blocks) -> Path:
+    """blocks: iterable de (start_sec, end_sec, text)."""
+    rows = [{"segment": segment, "block": i, "start": s, "end": e, "text": t}
+            for i, (s, e, t) in enumerate(blocks)]
+    return write_rows("transcripts", rows, cfg, part=segment)
+
+def put_audio_meta(cfg: dict, meta: dict) -> Path:
+    sil = meta.get("silences", [])
+    row = {"segment": meta["segment"], "duration_sec": meta.get("duration_sec"),
+           "voice_activity_ratio": meta.get("voice_activity_ratio"),
+           "silence_starts": [float(s) for s, _ in sil], "silence_ends": [float(e) for _, e in sil],
+           "speech_ratio": meta.get("speech_ratio"), "music_ratio": meta.get("music_ratio"),
+           "meta_json": json.dumps(meta, ensure_ascii=False)}
+    return write_rows("audio_meta", [row], cfg, part=meta["segment"])
+
+def get_transcript(cfg: dict, segment: str):
+    """[(start, end, text)] de un segmento desde el lake, en orden de bloque; None si no está."""
+    tbl = key_rows("transcripts", cfg, segment)
+    if tbl is None:
+        return None
+    tbl = tbl.sort_by("block")
+    return list(zip(tbl["start"].to_pylist(), tbl["end"].to_pylist(), tbl["text"].to_pylist()))
+
+def get_audio_meta(cfg: dict, segment: str):
+    """Dict de analyze de un segmento desde el lake; None si no está (o es de un esquema sin meta_json)."""
+    tbl = key_rows("audio_meta", cfg, segment)
+    raw = tbl["meta_json"][0].as_py() if tbl is not None else None
+    return json.loads(raw) if raw else None
+
+def put_decisions(cfg: dict, source: str, rows: list) -> Path:
+    """rows con segment/kind/decision ("keep"|"drop") y opcionalmente reason/start/end/hits/ratio; un part por fuente."""
+    rows = [{"source": source, **r} for r in rows]
+    return write_rows("decisions", rows, cfg, part=source)
+
+def ad_intervals(cfg: dict, stations: list = None, date_from: str = None, date_to: str = None):
+    """Ej.: todos los cortes publicitarios de una emisora en un rango de fechas."""
+    _require()
+    return scan("decisions", cfg,
+                columns=["station", "date", "segment", "start", "end", "source"],
+                filter=(ds.field("kind") == "interval") & (ds.field("decision") == "drop"),
+                stations=stations, date_from=date_from, date_to=date_to)
@@ -2,20 +2,42 @@ import os, json, glob
 from pathlib import Path
 from .config import load_config
 from .paths import bronze_dir
+from .adts import scan_file, write_index
 
-def write_manifest(cfg: dict = None):
+def write_manifest(cfg: dict = None, segments: list = None):
+    """
+    Una línea por segmento con duración/tramas/tasa exactas leídas de los
+    encabezados ADTS (sin ffprobe) y el índice de offsets en frames/<stem>.npy.
+    """
     cfg = cfg or load_config()
     bdir = bronze_dir(cfg)
-    files = sorted(glob.glob(str(bdir / "raw_segment_*.ts")))
+    files = segments if segments is not None else sorted(glob.glob(str(bdir / "raw_segment_*.ts")))
     man = bdir / "manifest.jsonl"
     with open(man, "w", encoding="utf-8") as f:
         for fp in files:
             st = os.stat(fp)
+            info, offsets = scan_file(fp)
             item = {
                 "file": os.path.basename(fp),
                 "path": fp,
                 "bytes": st.st_size,
-                "duration_hint_sec": cfg["segment_time_sec"]
+                "container": info["container"],
+                "duration_sec": info["duration_sec"] if info["frames"] else None,
+                "frames": info["frames"],
+                "sample_rate": info["sample_rate"],
+                "channels": info["channels"],
+                "bitrate": info["bitrate"],
+                "sync_losses": info["sync_losses"],
+                "corrupt": info["corrupt"],
+                "index": str(write_index(fp, offsets).relative_to(bdir)) if info["frames"] else None,
             }
             f.write(json.dumps(item, ensure_ascii=False) + "\n")
     print("Manifest written:", man)
+
+def read_manifest(bdir: Path) -> dict:
+    """nombre de segmento -> entrada del manifest ({} si no hay manifest)."""
+    man = Path(bdir) / "manifest.jsonl"
+    if not man.exists():
+        return {}
+    with open(man, encoding="utf-8") as f:
+        return {item["file"]: item for item in map(json.loads, f) if item}
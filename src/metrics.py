@@ -0,0 +1,138 @@
+import cProfile, io, json, os, pstats, resource, socket, subprocess, threading, time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from .paths import logs_dir, strftime_for_file
+
+# Estado del proceso: apagado por defecto (span/emit no hacen nada).
+_STATE = {"enabled": False, "profile": False, "path": None, "run_id": None, "top": 25}
+# cProfile solo ve su propio hilo: cada hilo perfila su span más externo.
+_LOCAL = threading.local()
+
+def configure(cfg: dict, metrics: bool = False, profile: bool = False, top: int = 25):
+    """Activa la emisión de eventos JSONL en logs_dir(cfg)/metrics.jsonl (profile implica metrics)."""
+    enabled = bool(metrics or profile)
+    _STATE.update(enabled=enabled, profile=bool(profile), top=top)
+    if enabled:
+        d = logs_dir(cfg); d.mkdir(parents=True, exist_ok=True)
+        _STATE["path"] = d / "metrics.jsonl"
+        _STATE["run_id"] = f"{strftime_for_file(datetime.now())}-{os.getpid()}"
+        _STATE["prof_dir"] = d / "profiles"
+
+def enabled() -> bool:
+    return _STATE["enabled"]
+
+def _proc_io(own_thread: bool = False) -> dict:
+    """rchar/wchar de /proc/self/io (o del hilo actual); vacío si no hay /proc."""
+    try:
+        with open("/proc/thread-self/io" if own_thread else "/proc/self/io") as f:
+            return {k: int(v) for k, v in (line.split(":") for line in f)}
+    except OSError:
+        return {}
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _usage(own_thread: bool):
+    """getrusage del hilo actual (RUSAGE_THREAD, Linux) o de todo el proceso."""
+    if own_thread and hasattr(resource, "RUSAGE_THREAD"):
+        return resource.getrusage(resource.RUSAGE_THREAD), "thread"
+    return resource.getrusage(resource.RUSAGE_SELF), "process"
+
+def emit(event: str, **fields):
+    if not _STATE["enabled"]:
+        return
+    row = {"ts": time.time(), "run_id": _STATE["run_id"], "host": socket.gethostname(),
+           "pid": os.getpid(), "event": event, **fields}
+    with open(_STATE["path"], "a", encoding="utf-8") as f:
+        f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+
+def _hot_functions(prof: cProfile.Profile, top: int) -> list:
+    st = pstats.Stats(prof, stream=io.StringIO())
+    rows = []
+    for (file, line, func), (cc, nc, tt, ct, _) in st.stats.items():
+        rows.append({"func": f"{Path(file).name}:{line}:{func}", "ncalls": nc,
+                     "tottime": round(tt, 6), "cumtime": round(ct, 6)})
+    rows.sort(key=lambda r: r["tottime"], reverse=True)
+    return rows[:top]
+
+@contextmanager
+def span(stage: str, segment: str = None, **extra):
+    """
+    Mide una etapa (o etapa × segmento): wall, CPU propio y de hijos ya
+    esperados, RSS, bytes leídos/escritos. En el hilo principal el CPU y la
+    E/S son del proceso; en un hilo del pool (run-post) son solo del hilo
+    (RUSAGE_THREAD), para no sumar lo que corre en paralelo. Con --profile
+    agrega las funciones más calientes y guarda el .prof completo en
+    logs/profiles/ (perfila el span más externo de cada hilo: cProfile no se
+    puede anidar y solo ve el hilo que lo activó).
+    """
+    if not _STATE["enabled"]:
+        yield
+        return
+    worker = threading.current_thread() is not threading.main_thread()
+    t_start = time.time(); t0 = time.perf_counter()
+    s0, scope = _usage(worker); c0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    io0 = _proc_io(worker)
+    prof = None
+    if _STATE["profile"] and not getattr(_LOCAL, "profiling", False):
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+            _LOCAL.profiling = True
+        except ValueError:  # 3.12+: un solo profiler activo por proceso
+            prof = None
+    status = "ok"
+    try:
+        yield
+    except BaseException as e:
+        status = f"error:{type(e).__name__}"
+        raise
+    finally:
+        if prof:
+            prof.disable()
+            _LOCAL.profiling = False
+        s1, _ = _usage(worker); c1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        io1 = _proc_io(worker)
+        fields = {
+            "stage": stage, "segment": segment, "status": status,
+            "start": t_start, "end": time.time(), "wall_sec": time.perf_counter() - t0,
+            "cpu_user_sec": s1.ru_utime - s0.ru_utime, "cpu_sys_sec": s1.ru_stime - s0.ru_stime, "cpu_scope": scope,
+            "children_cpu_sec": (c1.ru_utime - c0.ru_utime) + (c1.ru_stime - c0.ru_stime),
+            "rss_mb": _rss_mb(), "maxrss_mb": s1.ru_maxrss / 1024,
+            "bytes_read": io1.get("rchar", 0) - io0.get("rchar", 0),
+            "bytes_written": io1.get("wchar", 0) - io0.get("wchar", 0),
+            **extra,
+        }
+        if prof:
+            fields["hot"] = _hot_functions(prof, _STATE["top"])
+            pdir = _STATE["prof_dir"]; pdir.mkdir(parents=True, exist_ok=True)
+            name = f"{_STATE['run_id']}_{stage}" + (f"_{Path(segment).stem}" if segment else "")
+            prof.dump_stats(str(pdir / f"{name}.prof"))
+        emit("stage", **fields)
+
+def call(cmd, shell: bool = False, **kwargs) -> int:
+    """
+    Igual que subprocess.call, pero espera con os.wait4 para registrar el
+    uso de recursos del hijo (ffmpeg/whisper): CPU, maxrss y bloques de E/S.
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, shell=shell, **kwargs)
+    try:
+        _, status, ru = os.wait4(proc.pid, 0)
+    except BaseException:
+        proc.kill(); proc.wait()
+        raise
+    rc = os.waitstatus_to_exitcode(status)
+    proc.returncode = rc
+    if _STATE["enabled"]:
+        argv = cmd if isinstance(cmd, str) else " ".join(str(c) for c in cmd)
+        emit("subprocess", cmd=argv[:500], prog=Path(argv.split()[0]).name, rc=rc,
+             wall_sec=time.perf_counter() - t0, cpu_user_sec=ru.ru_utime, cpu_sys_sec=ru.ru_stime, maxrss_mb=ru.ru_maxrss / 1024,
+             in_blocks=ru.ru_inblock, out_blocks=ru.ru_oublock)
+    return rc
@@ -2,20 +2,29 @@ from pathlib import Path
 from datetime import datetime
 from dateutil import tz
 
-def date_parts(tz_name: str):
-    now = datetime.now(tz.gettz(tz_name))
+def date_parts(tz_name: str, day: str = None):
+    """(AAAA, MM, DD, datetime) de `day` ("AAAA-MM-DD") o, sin día, de hoy en tz_name."""
+    if day:
+        now = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=tz.gettz(tz_name))
+    else:
+        now = datetime.now(tz.gettz(tz_name))
     return now.strftime("%Y"), now.strftime("%m"), now.strftime("%d"), now
 
-def bronze_dir(cfg: dict):
-    y,m,d,_ = date_parts(cfg["timezone"])
+def today(cfg: dict) -> str:
+    return date_parts(cfg["timezone"])[3].strftime("%Y-%m-%d")
+
+# La partición sale de `day`, o de cfg["date"] (fijado al arrancar el
+# pipeline o por backfill), o de hoy.
+def bronze_dir(cfg: dict, day: str = None):
+    y,m,d,_ = date_parts(cfg["timezone"], day or cfg.get("date"))
     return Path(cfg["paths"]["bronze"]) / y / m / d
 
-def silver_dir(cfg: dict):
-    y,m,d,_ = date_parts(cfg["timezone"])
+def silver_dir(cfg: dict, day: str = None):
+    y,m,d,_ = date_parts(cfg["timezone"], day or cfg.get("date"))
     return Path(cfg["paths"]["silver"]) / y / m / d
 
-def gold_dir(cfg: dict):
-    y,m,d,_ = date_parts(cfg["timezone"])
+def gold_dir(cfg: dict, day: str = None):
+    y,m,d,_ = date_parts(cfg["timezone"], day or cfg.get("date"))
     return Path(cfg["paths"]["gold"]) / y / m / d
 
 def logs_dir(cfg: dict):
@@ -0,0 +1,185 @@
+import fcntl, json, os, subprocess, time
+from pathlib import Path
+import numpy as np
+
+from .utils import ffmpeg_bin
+from . import metrics
+
+SAMPLE_RATE = 16000
+# 30 s por bloque: múltiplo de los frames de VAD (30 ms) y de energía (10 ms)
+BLOCK_SAMPLES = SAMPLE_RATE * 30
+
+def _read_full(stream, mv: memoryview) -> int:
+    """Llena mv desde stream (readinto) hasta EOF; devuelve bytes leídos."""
+    got = 0
+    while got < len(mv):
+        n = stream.readinto(mv[got:])
+        if not n:
+            break
+        got += n
+    return got
+
+def pcm_blocks(path, cfg: dict, block_samples: int = BLOCK_SAMPLES, sample_rate: int = SAMPLE_RATE):
+    """
+    Decodifica `path` una sola vez con ffmpeg (mono, s16le) y va entregando
+    bloques int16 de tamaño fijo. El buffer se reutiliza entre iteraciones:
+    el consumidor no debe guardar referencias al bloque (copiar si hace falta).
+    """
+    cmd = [
+        ffmpeg_bin(cfg), "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-i", str(path), "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "-"
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=0)
+    buf = np.empty(block_samples, dtype=np.int16)
+    mv = memoryview(buf).cast("B")
+    try:
+        while True:
+            n = _read_full(proc.stdout, mv)
+            if n >= 2:
+                yield buf[: n // 2]
+            if n < len(mv):
+                break
+    finally:
+        proc.stdout.close()
+        rc = proc.wait()
+    if rc != 0:
+        raise RuntimeError(f"ffmpeg decode failed ({rc}): {path}")
+
+# --- Caché de PCM decodificado en Silver ---
+# <silver>/pcm/<stem>.s16: int16 16 kHz mono crudo. La primera etapa que pide
+# un segmento lo decodifica (flock exclusivo: las demás esperan en vez de
+# lanzar otro ffmpeg) y todas mapean el mismo archivo, con flock compartido
+# mientras validan y mapean para que el desalojo no lo borre en el medio.
+# Tope de disco global (pcm_cache.max_gb) con desalojo LRU por atime, que se
+# marca en cada uso; los .s16 vivos se llevan en <silver>/.pcm_index.json.
+
+INDEX_NAME = ".pcm_index.json"
+
+def decode_cfg(cfg: dict) -> dict:
+    """Lo que necesita un worker para decodificar: paths + pcm_cache."""
+    return {"paths": cfg.get("paths") or {}, "pcm_cache": cfg.get("pcm_cache") or {}}
+
+def pcm_path(sdir: Path, seg: str) -> Path:
+    return Path(sdir) / "pcm" / (Path(seg).stem + ".s16")
+
+def _cache_root(cfg: dict, sdir: Path) -> Path:
+    """Raíz de Silver: paths.silver, o <silver> deducido de sdir (<silver>/YYYY/MM/DD)."""
+    root = (cfg.get("paths") or {}).get("silver")
+    if root:
+        return Path(root)
+    sdir = Path(sdir).resolve()
+    return sdir.parents[2] if len(sdir.parents) > 2 else sdir
+
+def _valid(p: Path, seg: str) -> bool:
+    try:
+        return p.stat().st_mtime_ns >= os.stat(seg).st_mtime_ns
+    except OSError:
+        return False
+
+def _lock_path(p: Path) -> Path:
+    return p.with_name(f".{p.name}.lock")
+
+def _load_index(root: Path) -> dict:
+    """{ruta relativa a root: bytes}; la primera vez se arma recorriendo el árbol."""
+    try:
+        with open(root / INDEX_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {str(p.relative_to(root)): p.stat().st_size for p in root.glob("**/pcm/*.s16")}
+    except (OSError, ValueError):
+        return {}
+
+def _save_index(root: Path, index: dict):
+    tmp = root / f"{INDEX_NAME}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, root / INDEX_NAME)
+
+def _evict(cfg: dict, root: Path, keep: Path):
+    """Registra `keep` en el índice y borra los .s16 menos usados hasta quedar bajo pcm_cache.max_gb."""
+    limit = float((cfg.get("pcm_cache") or {}).get("max_gb", 4)) * 2**30
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / f"{INDEX_NAME}.lock", "w") as ilock:
+        fcntl.flock(ilock, fcntl.LOCK_EX)
+        index = _load_index(root)
+        index[os.path.relpath(keep, root)] = keep.stat().st_size
+        files = []
+        for rel in list(index):
+            try:
+                st = (root / rel).stat()
+            except OSError:
+                del index[rel]
+                continue
+            files.append((st.st_atime_ns, st.st_size, rel))
+        total = sum(size for _, size, _ in files)
+        for _, size, rel in sorted(files):
+            if total <= limit:
+                break
+            p = root / rel
+            try:
+                if p.samefile(keep):
+                    continue
+            except OSError:   # otro proceso ya lo borró: se limpia la entrada
+                del index[rel]
+                total -= size
+                continue
+            with open(_lock_path(p), "w") as lock:
+                try:   # en uso (validando/mapeando/decodificando): se saltea
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+                try:
+                    p.unlink()   # quien ya lo tenga mapeado lo sigue viendo
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+            del index[rel]
+            total -= size
+            metrics.emit("pcm_cache", action="evict", file=p.name, bytes=size)
+        _save_index(root, index)
+
+def _map(p: Path) -> np.ndarray:
+    st = p.stat()
+    os.utime(p, ns=(time.time_ns(), st.st_mtime_ns))   # atime = último uso (LRU); mtime intacto
+    if not st.st_size:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(p, dtype=np.int16, mode="r")
+
+def cached_pcm(seg: str, cfg: dict, sdir: Path = None) -> np.ndarray:
+    """
+    PCM 16 kHz mono int16 de `seg`: memmap de solo lectura desde la caché de
+    Silver (se decodifica una sola vez). Sin sdir o con pcm_cache.enabled
+    en false, decodifica a memoria como antes.
+    """
+    if sdir is None or not (cfg.get("pcm_cache") or {}).get("enabled", True):
+        blocks = [b.copy() for b in pcm_blocks(seg, cfg)]
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.int16)
+    p = pcm_path(sdir, seg)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    with open(_lock_path(p), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        if _valid(p, seg):
+            return _map(p)
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not _valid(p, seg):
+            t0 = time.perf_counter()
+            tmp = p.with_name(f".{p.name}.tmp")
+            with open(tmp, "wb") as f:
+                for block in pcm_blocks(seg, cfg):
+                    f.write(memoryview(block).cast("B"))
+            os.replace(tmp, p)
+            metrics.emit("pcm_cache", action="decode", file=p.name, bytes=p.stat().st_size,
+                         wall_sec=time.perf_counter() - t0)
+            _evict(cfg, _cache_root(cfg, sdir), p)
+        return _map(p)
+
+def segment_blocks(seg: str, cfg: dict, sdir: Path = None, block_samples: int = BLOCK_SAMPLES):
+    """Como pcm_blocks, pero con vistas sin copia sobre la caché si hay sdir."""
+    if sdir is None or not (cfg.get("pcm_cache") or {}).get("enabled", True):
+        yield from pcm_blocks(seg, cfg, block_samples)
+        return
+    x = cached_pcm(seg, cfg, sdir)
+    for i in range(0, len(x), block_samples):
+        yield x[i:i + block_samples]
@@ -1,44 +1,67 @@
 import argparse
+from importlib import import_module
 from .config import load_config
-from .record import record_and_segment
-from .manifest import write_manifest
-from .transcribe import transcribe_segments
-from .detect_ads import write_keep_list
-from .assemble import assemble_clean
-from .healthcheck import main as healthcheck_main
+from .paths import today
+from . import metrics
+
+# comando -> ("modulo:funcion", args extra desde argparse). El módulo se importa
+# recién al invocar el comando: `manifest` o `record` no cargan Whisper ni el DAG.
+STAGES = {
+    "record":      ("record:record_and_segment", None),
+    # todas las emisoras de `stations:` en paralelo, con reintentos
+    "record-all":  ("record_supervisor:supervise", None),
+    "manifest":    ("manifest:write_manifest", None),
+    "fingerprint": ("fingerprint:fingerprint_segments", None),
+    "transcribe":  ("transcribe:transcribe_segments", None),
+    "detect-ads":  ("detect_ads:write_keep_list", None),
+    "assemble":    ("assemble:assemble_clean", None),
+    # DAG por (etapa, segmento): análisis, huellas y Whisper en paralelo
+    "run-post":    ("scheduler:run_post", None),
+    # graba y procesa cada segmento apenas se cierra
+    "follow":      ("follow:follow", None),
+    # reproceso de días ya grabados, días y segmentos en un pool de procesos
+    "backfill":    ("backfill:backfill", lambda a: (a.date_from, a.date_to, a.workers)),
+    # salida en vivo sin anuncios, con delay fijo
+    "relay":       ("relay:relay", lambda a: (a.input, a.output, a.delay, a.speed)),
+}
+
+def load_stage(command: str):
+    """Función de la etapa `command`, importando su módulo recién ahora."""
+    mod, fn = STAGES[command][0].split(":")
+    return getattr(import_module(f".{mod}", __package__), fn)
+
+def _stage(name, fn, *args):
+    with metrics.span(name):
+        return fn(*args)
 
 def main():
     ap = argparse.ArgumentParser(description="Radio Data Lake Pipeline")
-    ap.add_argument("command", choices=[
-        "record", "manifest", "transcribe", "detect-ads", "assemble", "run-post"
-    ], help="Pipeline stage")
+    ap.add_argument("command", choices=list(STAGES), help="Pipeline stage")
     ap.add_argument("--config", default=None, help="Path to config.yaml")
+    ap.add_argument("--no-cache", action="store_true", help="Recompute every stage, ignoring the stage cache")
+    ap.add_argument("--metrics", action="store_true", help="Write per-stage/per-segment JSONL events to logs/metrics.jsonl")
+    ap.add_argument("--profile", action="store_true", help="Like --metrics, plus cProfile hot functions per stage")
+    ap.add_argument("--date", default=None, help="Date partition YYYY-MM-DD (default: today, fixed at start)")
+    ap.add_argument("--from", dest="date_from", default=None, help="backfill: first day YYYY-MM-DD")
+    ap.add_argument("--to", dest="date_to", default=None, help="backfill: last day YYYY-MM-DD (default: --from)")
+    ap.add_argument("--workers", type=int, default=0, help="backfill: global process limit (default: backfill.workers)")
+    ap.add_argument("--input", default=None, help="relay: stream URL or local file (default: relay.input / stream_url)")
+    ap.add_argument("--output", default=None, help="relay: output file or URL (default: relay.output / gold relay_clean)")
+    ap.add_argument("--delay", type=float, default=None, help="relay: broadcast delay in seconds (default: relay.delay_sec)")
+    ap.add_argument("--speed", type=float, default=1.0, help="relay: replay speed for local files (1 = realtime)")
     args = ap.parse_args()
+    if args.command == "backfill" and not args.date_from:
+        ap.error("backfill requires --from")
 
     cfg = load_config(args.config)
+    # la partición se fija al arrancar: una corrida que cruza medianoche no se parte en dos días
+    cfg["date"] = args.date or today(cfg)
+    if args.no_cache:
+        cfg["cache"] = {**cfg.get("cache", {}), "enabled": False}
+    metrics.configure(cfg, metrics=args.metrics, profile=args.profile)
 
-    if args.command == "record":
-        return record_and_segment(cfg)
-    elif args.command == "manifest":
-        return write_manifest(cfg)
-    elif args.command == "transcribe":
-        return transcribe_segments(cfg)
-    elif args.command == "detect-ads":
-        return write_keep_list(cfg)
-    elif args.command == "assemble":
-        return assemble_clean(cfg)
-    elif args.command == "run-post":
-        rc = write_manifest(cfg)
-        if rc: return rc
-        # validar segmentos antes de seguir
-        rc = healthcheck_main()
-        if rc: return rc
-        rc = transcribe_segments(cfg)
-        if rc: return rc
-        rc = write_keep_list(cfg)
-        if rc: return rc
-        rc = assemble_clean(cfg)
-        return rc
+    extra = STAGES[args.command][1]
+    return _stage(args.command, load_stage(args.command), cfg, *(extra(args) if extra else ()))
 
 if __name__ == "__main__":
     raise SystemExit(main())
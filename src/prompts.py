@@ -0,0 +1,16 @@
+import yaml
+from pathlib import Path
+
+PROMPTS_FILE = Path(__file__).resolve().parent / "config" / "prompts.yaml"
+_PROMPTS = None
+
+def load_prompts() -> dict:
+    """Plantillas de config/prompts.yaml (se leen una sola vez)."""
+    global _PROMPTS
+    if _PROMPTS is None:
+        with open(PROMPTS_FILE, "r", encoding="utf-8") as f:
+            _PROMPTS = (yaml.safe_load(f) or {}).get("llm_prompts", {})
+    return _PROMPTS
+
+def render(name: str, **kwargs) -> str:
+    return load_prompts()[name].format(**kwargs)
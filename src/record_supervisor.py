@@ -0,0 +1,241 @@
+"""
+Supervisor de grabación multi-emisora (asyncio).
+
+Cada emisora de `stations:` corre como un ffmpeg hijo en su propia partición
+Bronze. El supervisor:
+  - reinicia con backoff exponencial (recording.max_retries / retry_delay_sec)
+    cuando el proceso sale antes de tiempo o se cuelga, continuando la
+    numeración de segmentos;
+  - detecta cuelgues mirando el crecimiento del último segmento
+    (recording.stall_timeout_sec);
+  - admite emisoras contra un presupuesto global de procesos
+    (recording.max_concurrent) y de CPU en cores (recording.cpu_budget).
+
+    python -m src.record_supervisor serve <archivo> [port] [kbps]   # stream de prueba local
+"""
+import asyncio, glob, os, signal, sys, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .config import load_config, station_configs
+from .paths import bronze_dir
+from .record import segment_pattern, record_command
+from . import metrics
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+def _proc_cpu_sec(pid: int) -> float:
+    """utime+stime de un proceso vivo desde /proc (0 si ya no existe)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLK_TCK
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+class Budget:
+    """
+    Presupuesto global compartido por todas las emisoras: cantidad de
+    grabadores simultáneos y suma de costo de CPU estimado (en cores).
+    Si una emisora sola excede el presupuesto de CPU se la admite igual
+    cuando no hay otra corriendo, para no bloquear para siempre.
+    """
+    def __init__(self, max_concurrent: int = 0, cpu_budget: float = 0.0):
+        self.max_concurrent = max_concurrent or sys.maxsize
+        self.cpu_budget = cpu_budget or float("inf")
+        self.active = 0
+        self.cpu = 0.0
+        self._cond = asyncio.Condition()
+
+    def _fits(self, cost: float) -> bool:
+        if self.active >= self.max_concurrent:
+            return False
+        return self.active == 0 or self.cpu + cost <= self.cpu_budget
+
+    async def acquire(self, cost: float):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._fits(cost))
+            self.active += 1
+            self.cpu += cost
+
+    async def release(self, cost: float):
+        async with self._cond:
+            self.active -= 1
+            self.cpu -= cost
+            self._cond.notify_all()
+
+class StationRecorder:
+    def __init__(self, cfg: dict, budget: Budget):
+        self.cfg = cfg
+        self.name = cfg.get("station", "default")
+        self.budget = budget
+        rec = cfg.get("recording", {})
+        self.max_retries = int(rec.get("max_retries", 5))
+        self.retry_delay = float(rec.get("retry_delay_sec", 10))
+        self.backoff_max = float(rec.get("retry_backoff_max_sec", 300))
+        self.stall_timeout = float(rec.get("stall_timeout_sec", 60))
+        self.check_every = min(5.0, self.stall_timeout / 3)
+        default_cost = 0.05 if cfg.get("copy_mode", True) else 0.5
+        self.cpu_cost = float(cfg.get("cpu_cost", rec.get("cpu_cost", default_cost)))
+        self.outdir = bronze_dir(cfg)
+        self.restarts = 0
+
+    def _segments(self, pattern: str) -> list:
+        return sorted(glob.glob(pattern.replace("%03d", "[0-9]*")))
+
+    def _last_size(self, pattern: str):
+        segs = self._segments(pattern)
+        if not segs:
+            return None
+        try:
+            return segs[-1], os.path.getsize(segs[-1])
+        except OSError:
+            return None
+
+    async def _stop(self, proc, grace: float = 5.0):
+        """SIGTERM al grupo (ffmpeg cierra el segmento abierto), SIGKILL si no responde."""
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(proc.wait(), grace)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_once(self, cmd, shell: bool, pattern: str):
+        """Corre un intento; devuelve (rc, stalled, progresó)."""
+        kw = {"start_new_session": True, "stdin": asyncio.subprocess.DEVNULL}
+        proc = await (asyncio.create_subprocess_shell(cmd, **kw) if shell
+                      else asyncio.create_subprocess_exec(*cmd, **kw))
+        last = self._last_size(pattern)
+        last_change = time.monotonic()
+        progressed = False
+        cpu0 = _proc_cpu_sec(proc.pid); t0 = time.monotonic()
+        try:
+            while True:
+                try:
+                    rc = await asyncio.wait_for(proc.wait(), self.check_every)
+                    return rc, False, progressed
+                except asyncio.TimeoutError:
+                    pass
+                cur = self._last_size(pattern)
+                if cur != last:
+                    last, last_change, progressed = cur, time.monotonic(), True
+                elif time.monotonic() - last_change > self.stall_timeout:
+                    print(f"[REC:{self.name}] sin crecimiento hace {self.stall_timeout:.0f}s; reiniciando")
+                    await self._stop(proc)
+                    return proc.returncode, True, progressed
+                cpu = _proc_cpu_sec(proc.pid)
+                metrics.emit("recorder", station=self.name, pid=proc.pid, segment=last and Path(last[0]).name,
+                             bytes=last and last[1], cpu_cores=(cpu - cpu0) / max(1e-6, time.monotonic() - t0))
+        except asyncio.CancelledError:
+            await self._stop(proc)
+            raise
+
+    async def run(self, deadline: float) -> int:
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        pattern = segment_pattern(self.cfg, self.outdir)
+        has_url = bool((self.cfg.get("stream_url") or "").strip())
+        has_page = bool((self.cfg.get("stream_page_url") or "").strip())
+        failures = 0
+        while True:
+            await self.budget.acquire(self.cpu_cost)
+            try:
+                # -t se calcula después de esperar el presupuesto
+                remaining = int(deadline - time.time())
+                if remaining <= 1:
+                    return 0
+                # tras un fallo con stream_url, alterna con streamlink si hay página
+                use_page = has_page and (not has_url or failures % 2 == 1)
+                start = len(self._segments(pattern))
+                cmd, shell = record_command(self.cfg, pattern, remaining, start_number=start, use_page=use_page)
+                print(f"[REC:{self.name}] start (seg {start}, {remaining}s, {'streamlink' if shell else 'ffmpeg'})")
+                rc, stalled, progressed = await self._run_once(cmd, shell, pattern)
+            finally:
+                await self.budget.release(self.cpu_cost)
+
+            if not stalled and rc == 0 and deadline - time.time() <= 5:
+                return 0
+            failures = 1 if progressed else failures + 1
+            metrics.emit("recorder_restart", station=self.name, rc=rc, stalled=stalled, failures=failures)
+            if failures > self.max_retries:
+                print(f"[REC:{self.name}] sin éxito tras {self.max_retries} reintentos (rc={rc})")
+                return rc or 1
+            delay = min(self.backoff_max, self.retry_delay * 2 ** (failures - 1))
+            self.restarts += 1
+            print(f"[REC:{self.name}] terminó (rc={rc}{', colgado' if stalled else ''}); "
+                  f"reintento {failures}/{self.max_retries} en {delay:.0f}s")
+            await asyncio.sleep(min(delay, max(0.0, deadline - time.time())))
+
+async def supervise_async(cfg: dict) -> int:
+    rec = cfg.get("recording", {})
+    budget = Budget(int(rec.get("max_concurrent", 0) or 0), float(rec.get("cpu_budget", 0) or 0))
+    recorders = [StationRecorder(scfg, budget) for scfg in station_configs(cfg)]
+    deadline = time.time() + int(cfg["program_duration_sec"])
+    print(f"[REC] {len(recorders)} emisora(s): " + ", ".join(r.name for r in recorders))
+    rcs = await asyncio.gather(*(r.run(deadline) for r in recorders), return_exceptions=True)
+    failed = 0
+    for r, rc in zip(recorders, rcs):
+        if isinstance(rc, BaseException):
+            print(f"[REC:{r.name}] error: {rc!r}")
+        if rc:
+            failed += 1
+        print(f"[REC:{r.name}] rc={rc} reinicios={r.restarts}")
+    return 1 if failed else 0
+
+def supervise(cfg: dict = None) -> int:
+    return asyncio.run(supervise_async(cfg or load_config()))
+
+# --- Stream de prueba local ---
+def serve_stream(path: str, host: str = "127.0.0.1", port: int = 8000, kbps: float = 128.0,
+                 stall_after: float = None, drop_after: float = None):
+    """
+    Sirve `path` en loop como si fuera un stream en vivo, a `kbps` (0 = sin
+    límite). stall_after: a los N s deja de mandar bytes sin cerrar (cuelgue);
+    drop_after: a los N s corta la conexión. Apuntar stream_url acá.
+    """
+    data = Path(path).read_bytes()
+    chunk = 4096
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/aac")
+            self.end_headers()
+            t0 = time.monotonic(); sent = 0
+            try:
+                while True:
+                    for i in range(0, len(data), chunk):
+                        el = time.monotonic() - t0
+                        if drop_after is not None and el >= drop_after:
+                            return
+                        if stall_after is not None and el >= stall_after:
+                            time.sleep(3600)
+                            return
+                        self.wfile.write(data[i:i + chunk])
+                        sent += min(chunk, len(data) - i)
+                        if kbps:
+                            ahead = sent / (kbps * 125) - (time.monotonic() - t0)
+                            if ahead > 0:
+                                time.sleep(ahead)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    print(f"[REC] stream de prueba en http://{host}:{srv.server_address[1]}/")
+    return srv
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "serve":
+        port = int(sys.argv[3]) if len(sys.argv) > 3 else 8000
+        kbps = float(sys.argv[4]) if len(sys.argv) > 4 else 128.0
+        serve_stream(sys.argv[2], port=port, kbps=kbps).serve_forever()
+    else:
+        sys.exit(supervise())
@@ -0,0 +1,386 @@
+"""
+Relay en vivo: el stream sale limpio de anuncios con un delay fijo.
+
+    python -m src.pipeline relay [--input URL|archivo] [--output destino] [--delay 90] [--speed 1]
+
+Un solo ffmpeg decodifica la entrada a dos pipes: PCM 16 kHz mono para el
+análisis y PCM a la tasa de salida para el relay. Cada uno va a un ring
+buffer en memoria indexado por muestra absoluta. Tres hilos:
+
+  - ingesta: pipes de ffmpeg → rings;
+  - análisis: ventanas deslizantes (relay.window_sec, con relay.tail_sec de
+    solape) → silencios + VAD continuos, Whisper sobre la ventana y reglas
+    de texto; la misma decisión híbrida de cut_builder sobre lo acumulado.
+    Un candidato que todavía toca el borde analizado no se decide: el
+    horizonte "decidido" se queda en su inicio hasta que cierre;
+  - salida: a ritmo de reloj, `delay` segundos detrás de la entrada, lee
+    del ring lo ya decidido y lo manda al encoder. Los anuncios se
+    reemplazan por el puente (relay.ad_mode=bridge, delay constante) o se
+    saltean (drop, el delay se achica). Si el análisis no llegó, sale puente.
+
+Un archivo local se reproduce a tiempo real (-readrate), así se prueba sin
+stream; --speed > 1 acelera la prueba. Cada report_sec se informa delay
+real, atraso del análisis y RTF de cada ventana.
+"""
+import os, subprocess, threading, time
+import numpy as np
+import webrtcvad
+
+from .config import load_config
+from .utils import ffmpeg_bin
+from .paths import gold_dir
+from .pcm import SAMPLE_RATE, _read_full
+from .audio_analysis import SilenceTracker, VAD_FRAME, speech_runs
+from .cut_builder import decide_invalid_intervals, text_ad_windows
+from .transcript import Transcript
+from .intervals import IntervalSet
+from .assemble import FORMATS, _encode_args
+from . import metrics
+
+FADE_SEC = 0.01   # rampa en cada empalme para que no haya clicks
+
+class Ring:
+    """Buffer circular de PCM int16 (muestras x canales) indexado por muestra absoluta."""
+    def __init__(self, seconds: float, rate: int, channels: int = 1):
+        self.rate = rate
+        self.buf = np.zeros((int(seconds * rate), channels), dtype=np.int16)
+        self.written = 0       # muestras escritas desde el arranque
+        self.done = False
+
+    def write(self, block: np.ndarray):
+        cap = len(self.buf)
+        if len(block) > cap:
+            self.written += len(block) - cap
+            block = block[-cap:]
+        i = self.written % cap
+        k = min(len(block), cap - i)
+        self.buf[i:i + k] = block[:k]
+        self.buf[:len(block) - k] = block[k:]
+        self.written += len(block)   # recién después de copiar: el lector no ve datos a medias
+
+    def oldest(self) -> int:
+        return max(0, self.written - len(self.buf))
+
+    def read(self, a: int, b: int) -> np.ndarray:
+        cap = len(self.buf)
+        i = a % cap
+        if i + b - a <= cap:
+            return self.buf[i:i + b - a].copy()
+        return np.concatenate((self.buf[i:], self.buf[:b - a - (cap - i)]))
+
+def _pump(stream, ring: Ring, block_sec: float = 0.25):
+    """Hilo de ingesta: pipe de ffmpeg → ring, en bloques fijos."""
+    ch = ring.buf.shape[1]
+    buf = np.empty((int(block_sec * ring.rate), ch), dtype=np.int16)
+    mv = memoryview(buf).cast("B")
+    try:
+        while True:
+            n = _read_full(stream, mv)
+            if n >= 2 * ch:
+                ring.write(buf[: n // (2 * ch)])
+            if n < len(mv):
+                break
+    finally:
+        ring.done = True
+
+def _bridge(cfg: dict, rate: int, channels: int) -> np.ndarray:
+    """Audio de puente (relay.bridge_file en loop) o silencio."""
+    path = cfg.get("relay", {}).get("bridge_file") or ""
+    if path and os.path.exists(path):
+        out = subprocess.run([ffmpeg_bin(cfg), "-hide_banner", "-loglevel", "error", "-nostdin", "-i", path,
+                              "-vn", "-ac", str(channels), "-ar", str(rate), "-f", "s16le", "-"],
+                             capture_output=True)
+        pcm = np.frombuffer(out.stdout, dtype=np.int16)
+        if out.returncode == 0 and len(pcm) >= channels:
+            return pcm[: len(pcm) // channels * channels].reshape(-1, channels)
+    return np.zeros((rate, channels), dtype=np.int16)
+
+class Relay:
+    def __init__(self, cfg: dict, src: str, output: str, delay: float = None, speed: float = 1.0):
+        rcfg = cfg.get("relay", {})
+        self.cfg, self.src, self.output = cfg, src, output
+        self.delay = float(delay if delay is not None else rcfg.get("delay_sec", 90))
+        self.speed = float(speed or 1.0)
+        self.window = float(rcfg.get("window_sec", 30))
+        self.tail = float(rcfg.get("tail_sec", 5))
+        self.mode = rcfg.get("ad_mode", "bridge")
+        self.min_cut = float(rcfg.get("min_cut_sec", 20))
+        self.near = float(rcfg.get("near_sec", 10))
+        self.report_sec = float(rcfg.get("report_sec", 10))
+        self.rate = int(rcfg.get("sample_rate", 44100))
+        self.channels = int(rcfg.get("channels", 2))
+        self.fmt = rcfg.get("format") or cfg.get("final_format", "mp3")
+        # el ring tiene que cubrir el delay más una ventana de análisis y margen
+        span = self.delay + self.window + 60
+        self.a_ring = Ring(span, SAMPLE_RATE, 1)
+        self.o_ring = Ring(span, self.rate, self.channels)
+        acfg = cfg.get("audio_analysis", {})
+        self.silences = SilenceTracker(SAMPLE_RATE, thresh_db=float(acfg.get("silence_thresh_db", -35)),
+                                       min_len_ms=int(acfg.get("min_silence_ms", 1000)))
+        self.vad = webrtcvad.Vad(int(acfg.get("vad_mode", 2)))
+        self.speech = bytearray()
+        self.txt = IntervalSet()
+        self.drop = IntervalSet()      # intervalos a sacar (segundos desde el arranque)
+        self.decided = 0.0             # todo lo anterior ya tiene decisión final
+        self.analyzed = 0.0
+        self.window_rtf = 0.0
+        self.pos = 0                   # muestra (tasa de salida) que sale ahora
+        self.stats = {"cut_sec": 0.0, "bridge_sec": 0.0, "underrun_sec": 0.0}
+        self._fade = int(FADE_SEC * self.rate)
+        self._ramp = np.linspace(0.0, 1.0, self._fade, dtype=np.float32)[:, None]
+        self._contiguous = False
+        self.model = None
+        self.error = None
+        self.finished = False          # el análisis ya decidió toda la entrada
+
+    # --- Entrada / salida ---
+    def _ingest(self):
+        r, w = os.pipe()
+        cmd = [ffmpeg_bin(self.cfg), "-hide_banner", "-loglevel", "error", "-nostdin"]
+        if os.path.exists(self.src):
+            cmd += ["-readrate", str(self.speed)]   # archivo local: replay a tiempo real
+        cmd += ["-i", self.src,
+                "-map", "0:a:0", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1",
+                "-map", "0:a:0", "-ac", str(self.channels), "-ar", str(self.rate), "-f", "s16le", f"pipe:{w}"]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, pass_fds=(w,), bufsize=0)
+        os.close(w)
+        out = os.fdopen(r, "rb", buffering=0)
+        threads = [threading.Thread(target=_pump, args=(proc.stdout, self.a_ring), daemon=True),
+                   threading.Thread(target=_pump, args=(out, self.o_ring), daemon=True)]
+        for t in threads:
+            t.start()
+        return proc, threads
+
+    def _encoder(self):
+        _, _, muxer = FORMATS[self.fmt]
+        cmd = [ffmpeg_bin(self.cfg), "-hide_banner", "-loglevel", "warning", "-y", "-nostdin",
+               "-f", "s16le", "-ar", str(self.rate), "-ac", str(self.channels), "-i", "pipe:0"]
+        cmd += _encode_args(self.fmt, self.cfg) + ["-f", muxer, str(self.output)]
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    # --- Análisis ---
+    def _load_asr(self):
+        wcfg = self.cfg.get("whisper", {})
+        if not self.cfg.get("relay", {}).get("asr", True):
+            return
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            print("[RELAY] faster-whisper no disponible: solo audio (silencios/VAD)")
+            return
+        model = self.cfg.get("relay", {}).get("model") or wcfg.get("model", "small")
+        self.model = WhisperModel(model, device="cpu", compute_type=wcfg.get("compute_type", "int8"),
+                                  cpu_threads=int(wcfg.get("cpu_threads", 2)))
+
+    def _transcribe(self, pcm: np.ndarray, t0: float, until: float) -> IntervalSet:
+        """Ventana → bloques con tiempo absoluto (solo los que arrancan antes de `until`) → ventanas de anuncio."""
+        segs, _ = self.model.transcribe(pcm.astype(np.float32) * (1 / 32768),
+                                        language=self.cfg.get("whisper", {}).get("language", "es"))
+        blocks = [(t0 + x.start, t0 + x.end, x.text.strip()) for x in segs if t0 + x.start < until]
+        return text_ad_windows(Transcript.from_blocks(blocks), cfg=self.cfg)
+
+    def _feed(self, pcm: np.ndarray):
+        """Silencios y VAD continuos sobre audio nuevo (cada muestra una sola vez)."""
+        self.silences.feed(pcm)
+        mv = memoryview(np.ascontiguousarray(pcm)).cast("B")
+        vad_bytes = VAD_FRAME * 2
+        for off in range(0, len(mv) - vad_bytes + 1, vad_bytes):
+            self.speech.append(self.vad.is_speech(mv[off:off + vad_bytes], SAMPLE_RATE))
+
+    def _decide(self, horizon: float, final: bool):
+        sil = list(self.silences.spans)
+        if self.silences.run_start is not None:   # silencio todavía abierto
+            sil.append((self.silences.run_start * self.silences.frame_sec, horizon))
+        # huecos sin voz del VAD (música/jingles aunque no haya silencio), incluido el abierto al final
+        runs = np.asarray(speech_runs(np.frombuffer(bytes(self.speech), dtype=np.uint8)), dtype=np.float64)
+        edges = np.concatenate(([0.0], runs.ravel(), [horizon]))
+        sil += list(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+        meta = {"duration_sec": horizon, "silences": sil,
+                "first_speech_start_sec": 0.0, "last_speech_end_sec": horizon}
+        kw = dict(cfg=self.cfg, txt_windows=self.txt, fp_windows=[], near_sec=self.near)
+        drop = IntervalSet.of(decide_invalid_intervals(None, meta, min_cut_sec=self.min_cut, **kw))
+        ready = horizon
+        if not final:
+            # candidatos (aun cortos) que llegan al borde: esperar a que cierren
+            cand = IntervalSet.of(decide_invalid_intervals(None, meta, min_cut_sec=0.0, **kw))
+            ready = horizon - self.near - 5.0
+            open_ = cand.select(cand.ends >= ready)
+            if len(open_):
+                ready = min(ready, float(open_.starts[0]))
+        self.drop = drop
+        self.decided = max(self.decided, ready)
+
+    def _analyze(self):
+        try:
+            self._analyze_loop()
+            self.finished = True
+        except Exception as e:
+            self.error = e
+            print(f"[RELAY] error en el análisis: {e!r}")
+
+    def _analyze_loop(self):
+        win, tail = int(self.window * SAMPLE_RATE), int(self.tail * SAMPLE_RATE)
+        commit = 0
+        while True:
+            avail, final = self.a_ring.written, self.a_ring.done
+            if avail < commit + win and not final:
+                time.sleep(0.1)
+                continue
+            end = min(commit + win, avail)
+            last = final and end == avail
+            if end <= commit:
+                self._decide(commit / SAMPLE_RATE, True)
+                return
+            t0 = time.perf_counter()
+            commit = max(commit, self.a_ring.oldest())
+            pcm = self.a_ring.read(commit, end)[:, 0]
+            nxt = end if last else max(commit + 1, end - tail)
+            self._feed(pcm[: nxt - commit])
+            if self.model is not None:
+                self.txt = self.txt | self._transcribe(pcm, commit / SAMPLE_RATE, nxt / SAMPLE_RATE)
+            self._decide(nxt / SAMPLE_RATE, last)
+            self.window_rtf = (time.perf_counter() - t0) / max(1e-6, (nxt - commit) / SAMPLE_RATE)
+            self.analyzed = nxt / SAMPLE_RATE
+            commit = nxt
+            if last:
+                return
+
+    # --- Salida ---
+    def _bridge_pcm(self, n: int) -> np.ndarray:
+        reps = -(-n // len(self.bridge)) + 1
+        i = self._bridge_pos % len(self.bridge)
+        out = np.tile(self.bridge, (reps, 1))[i:i + n]
+        self._bridge_pos += n
+        return out
+
+    def _source(self, a: int, b: int, fade_out: bool) -> np.ndarray:
+        pcm = self.o_ring.read(a, b)
+        f = min(self._fade, len(pcm))
+        if f and (not self._contiguous or fade_out):
+            pcm = pcm.astype(np.float32)
+            if not self._contiguous:
+                pcm[:f] *= self._ramp[:f]
+            if fade_out:
+                pcm[-f:] *= self._ramp[:f][::-1]
+            pcm = pcm.astype(np.int16)
+        self._contiguous = not fade_out
+        return pcm
+
+    def _take(self, n: int) -> np.ndarray:
+        """n muestras de salida: fuente ya decidida, sin anuncios; puente donde no hay."""
+        out, rate = [], self.rate
+        drop, decided = self.drop, self.decided
+        # fin de la entrada y todo decidido: se sale hasta la última muestra, nunca puente después
+        end = self.o_ring.written if self.finished and self.o_ring.done else None
+        while n > 0:
+            if end is not None and self.pos >= end:
+                break
+            if self.pos < self.o_ring.oldest():        # el ring se pisó: saltar a lo más viejo
+                self.pos = self.o_ring.oldest()
+                self._contiguous = False
+            t = self.pos / rate
+            k = int(np.searchsorted(drop.ends, t, side="right"))
+            if k < len(drop) and drop.starts[k] <= t:
+                e = int(drop.ends[k] * rate)
+                if end is not None:
+                    e = min(e, end)
+                self._contiguous = False
+                if self.mode == "drop":
+                    self.stats["cut_sec"] += (e - self.pos) / rate
+                    self.pos = e
+                    continue
+                m = min(n, e - self.pos)
+                out.append(self._bridge_pcm(m)); self.pos += m; n -= m
+                self.stats["cut_sec"] += m / rate; self.stats["bridge_sec"] += m / rate
+                continue
+            limit = end if end is not None else min(int(decided * rate), self.o_ring.written)
+            ad_next = k < len(drop) and int(drop.starts[k] * rate) <= limit
+            if ad_next:
+                limit = int(drop.starts[k] * rate)
+            if limit <= self.pos:
+                # el análisis (o la entrada) no llegó: puente sin avanzar la fuente
+                out.append(self._bridge_pcm(n))
+                self.stats["underrun_sec"] += n / rate; self.stats["bridge_sec"] += n / rate
+                self._contiguous = False
+                break
+            m = min(n, limit - self.pos)
+            out.append(self._source(self.pos, self.pos + m, ad_next and m == limit - self.pos))
+            self.pos += m; n -= m
+        return np.concatenate(out) if out else np.zeros((0, self.channels), dtype=np.int16)
+
+    def _report(self):
+        delay = (self.o_ring.written - self.pos) / self.rate
+        lag = self.a_ring.written / SAMPLE_RATE - self.analyzed
+        print(f"[RELAY] t={self.pos / self.rate:.0f}s delay={delay:.1f}s análisis={lag:.1f}s atrás "
+              f"(decidido hasta {self.decided:.0f}s, RTF ventana={self.window_rtf:.2f}) "
+              f"cortado={self.stats['cut_sec']:.0f}s puente={self.stats['bridge_sec']:.0f}s")
+        metrics.emit("relay", position_sec=self.pos / self.rate, delay_sec=delay, analysis_lag_sec=lag,
+                     decided_sec=self.decided, window_rtf=self.window_rtf, **self.stats)
+
+    def run(self) -> int:
+        self.bridge = _bridge(self.cfg, self.rate, self.channels)
+        self._bridge_pos = 0
+        self._load_asr()
+        print(f"[RELAY] {self.src} → {self.output} (delay={self.delay:.0f}s, modo={self.mode}, "
+              f"ASR={'sí' if self.model is not None else 'no'}, velocidad={self.speed:g}x)")
+        margin = self.window + self.near + 5.0
+        if self.delay < margin:
+            print(f"[RELAY] delay < {margin:.0f}s (ventana + near_sec + 5): va a salir puente al arrancar")
+        proc, pumps = self._ingest()
+        analyzer = threading.Thread(target=self._analyze, daemon=True)
+        analyzer.start()
+        # arranque: juntar `delay` segundos de entrada
+        need = int(self.delay * self.rate)
+        while self.o_ring.written < need and not self.o_ring.done:
+            time.sleep(0.05)
+        enc = self._encoder()
+        tick = int(0.2 * self.rate)
+        t0 = time.monotonic(); emitted = 0; next_report = t0
+        try:
+            while True:
+                if self.error is not None:
+                    break
+                if self.finished and self.o_ring.done and self.pos >= self.o_ring.written:
+                    break
+                due = int((time.monotonic() - t0) * self.speed * self.rate) - emitted
+                if due < tick:
+                    time.sleep((tick - due) / self.rate / self.speed)
+                    continue
+                pcm = self._take(due)
+                enc.stdin.write(pcm.tobytes())
+                emitted += len(pcm)
+                if time.monotonic() >= next_report:
+                    self._report()
+                    next_report += self.report_sec / self.speed
+        except (BrokenPipeError, KeyboardInterrupt) as e:
+            print(f"[RELAY] corte: {e!r}")
+        finally:
+            try:
+                enc.stdin.close()
+            except BrokenPipeError:
+                pass
+            rc = enc.wait() or (1 if self.error is not None else 0)
+            proc.terminate(); proc.wait()
+        self._report()
+        out_sec = emitted / self.rate
+        print(f"[RELAY] fin: {out_sec:.0f}s emitidos, {self.stats['cut_sec']:.0f}s de anuncios, "
+              f"{self.stats['underrun_sec']:.0f}s de puente por atraso del análisis")
+        return rc
+
+def relay(cfg: dict = None, src: str = None, output: str = None, delay: float = None, speed: float = 1.0) -> int:
+    cfg = cfg or load_config()
+    rcfg = cfg.get("relay", {})
+    src = src or rcfg.get("input") or (cfg.get("stream_url") or "").strip()
+    if not src:
+        print("[RELAY] sin entrada: usar --input o stream_url")
+        return 2
+    fmt = rcfg.get("format") or cfg.get("final_format", "mp3")
+    if fmt not in FORMATS:
+        print(f"[RELAY] formato no soportado: {fmt}")
+        return 2
+    if not output:
+        output = rcfg.get("output") or ""
+    if not output:
+        gdir = gold_dir(cfg); gdir.mkdir(parents=True, exist_ok=True)
+        output = str(gdir / f"relay_clean{FORMATS[fmt][0]}")
+    return Relay(cfg, src, output, delay, speed).run()
@@ -0,0 +1,195 @@
+"""
+Scheduler de dependencias para run-post.
+
+Cada tarea es (etapa, segmento) con sus dependencias y una clase de recurso;
+cada clase tiene su propio límite de concurrencia (post.limits), así Whisper
+(procesos pesados) no frena a los pasos livianos y viceversa. Un segmento
+avanza por su cadena apenas tiene sus entradas, sin esperar a los demás:
+
+    analyze ──── transcribe ──┐        (transcribe espera a analyze solo
+    fingerprint ──────────────┴─ cut    si whisper.vad recorta por voz)
+    cut(seg 0..N) ── keeplist ── assemble
+
+Si una tarea falla, solo se cancelan las que dependen de ella.
+"""
+import glob, heapq, os, time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+from .config import load_config
+from .paths import bronze_dir, silver_dir, gold_dir
+from .stage_cache import StageCache
+from .manifest import write_manifest
+from .healthcheck import main as healthcheck_main
+from .audio_analysis import analyze_segment
+from .fingerprint import FingerprintIndex, fingerprint_segment
+from .transcribe import SegmentTranscriber
+from .cut_builder import cut_segment, load_llm_decisions, run_cut_builder
+from .assemble import assemble_clean
+from . import lake, metrics
+
+class Task:
+    def __init__(self, stage: str, segment: str, fn, deps=(), resource: str = "cpu", priority=(0,)):
+        self.stage = stage
+        self.segment = segment
+        self.name = f"{stage}:{segment}" if segment else stage
+        self.fn = fn
+        self.deps = list(deps)
+        self.resource = resource
+        self.priority = priority
+
+def _run(task: Task):
+    """Corre una tarea en el hilo del pool; devuelve (rc, wall)."""
+    t0 = time.perf_counter()
+    try:
+        with metrics.span(task.stage, segment=task.segment, resource=task.resource):
+            rc = task.fn() or 0
+    except Exception as e:
+        print(f"[DAG] {task.name} error: {e!r}")
+        rc = 1
+    return rc, time.perf_counter() - t0
+
+def run_dag(tasks: list, limits: dict) -> int:
+    """
+    Ejecuta `tasks` respetando dependencias y `limits` (clase -> tareas
+    simultáneas). Entre las listas gana la de menor prioridad (segmento más
+    viejo primero). Devuelve el primer rc distinto de 0, o 0.
+    """
+    by_name = {t.name: t for t in tasks}
+    children = {t.name: [] for t in tasks}
+    missing = {t.name: len(t.deps) for t in tasks}
+    for t in tasks:
+        for d in t.deps:
+            children[d].append(t.name)
+    ready = [(t.priority, t.name) for t in tasks if not t.deps]
+    heapq.heapify(ready)
+    active = {r: 0 for r in limits}
+    status, walls, running = {}, {}, {}
+    rc = 0
+    t_start = time.perf_counter()
+
+    def cancel(name):
+        stack = [name]
+        while stack:
+            for c in children[stack.pop()]:
+                if c not in status:
+                    status[c] = "skipped"
+                    stack.append(c)
+
+    with ThreadPoolExecutor(max_workers=max(1, sum(limits.values()))) as ex:
+        while ready or running:
+            held = []
+            while ready:
+                item = heapq.heappop(ready)
+                t = by_name[item[1]]
+                if status.get(t.name) == "skipped":
+                    continue
+                if active[t.resource] < limits[t.resource]:
+                    active[t.resource] += 1
+                    running[ex.submit(_run, t)] = t
+                else:
+                    held.append(item)
+            for item in held:
+                heapq.heappush(ready, item)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                t = running.pop(fut)
+                active[t.resource] -= 1
+                trc, walls[t.name] = fut.result()
+                if trc:
+                    status[t.name] = "failed"
+                    rc = rc or trc
+                    cancel(t.name)
+                    continue
+                status[t.name] = "ok"
+                for c in children[t.name]:
+                    missing[c] -= 1
+                    if missing[c] == 0 and c not in status:
+                        heapq.heappush(ready, (by_name[c].priority, c))
+
+    # camino crítico: la cadena de tareas más lenta (cota inferior del wall)
+    chain = {}
+    for t in tasks:
+        if t.name in walls:
+            chain[t.name] = walls[t.name] + max((chain.get(d, 0.0) for d in t.deps), default=0.0)
+    wall = time.perf_counter() - t_start
+    crit = max(chain.values(), default=0.0)
+    serial = sum(walls.values())
+    failed = sum(1 for s in status.values() if s == "failed")
+    skipped = sum(1 for s in status.values() if s == "skipped")
+    print(f"[DAG] {len(walls)} tareas en {wall:.1f}s (camino crítico {crit:.1f}s, "
+          f"suma serial {serial:.1f}s, fallidas={failed}, canceladas={skipped})")
+    metrics.emit("dag", tasks=len(tasks), wall_sec=wall, critical_path_sec=crit,
+                 serial_sec=serial, failed=failed, skipped=skipped)
+    return rc
+
+# --- DAG de run-post ---
+def _limits(cfg: dict, transcriber: SegmentTranscriber) -> dict:
+    lim = cfg.get("post", {}).get("limits", {})
+    return {
+        "whisper": int(lim.get("whisper", 0) or 0) or transcriber.slots(),
+        "cpu": int(lim.get("cpu", 0) or 0) or (os.cpu_count() or 1),
+        "light": int(lim.get("light", 4) or 4),
+    }
+
+def run_post(cfg: dict = None) -> int:
+    """
+    manifest → healthcheck y después el DAG por segmento:
+    analyze / fingerprint / transcribe → cut → keeplist → assemble.
+    """
+    cfg = cfg or load_config()
+    with metrics.span("manifest"):
+        write_manifest(cfg)
+    # validar segmentos antes de seguir
+    with metrics.span("healthcheck"):
+        rc = healthcheck_main(cfg)
+    if rc:
+        return rc
+
+    segments = sorted(glob.glob(str(bronze_dir(cfg) / "raw_segment_*.ts")))
+    sdir = silver_dir(cfg)
+    sdir.mkdir(parents=True, exist_ok=True)
+    cache = StageCache.for_dir(sdir, cfg)   # una sola instancia: las etapas comparten manifest
+    transcriber = SegmentTranscriber(cfg, cache)
+    fcfg = cfg.get("fingerprint", {})
+    index = FingerprintIndex.for_cfg(cfg) if fcfg.get("enabled", True) else None
+    llm = load_llm_decisions(gold_dir(cfg) / "decisions_llm.json")
+    cuts = {}
+
+    def cut(seg):
+        cuts[seg] = cut_segment(seg, sdir, cfg, llm.get(Path(seg).name))
+
+    tasks = []
+    for i, seg in enumerate(segments):
+        name = Path(seg).name
+        chain = [Task("analyze", name, lambda seg=seg: analyze_segment(seg, sdir, cfg, cache),
+                      resource="cpu", priority=(i, 0))]
+        # no depende de analyze: si el audio_meta todavía no está, speech_plan
+        # corre solo el VAD sobre la misma caché de PCM
+        chain.append(Task("transcribe", name, lambda seg=seg: transcriber(seg),
+                          resource="whisper", priority=(i, 1)))
+        if index is not None:
+            chain.append(Task("fingerprint", name,
+                              lambda seg=seg: fingerprint_segment(seg, sdir, cfg, cache, index,
+                                                                  int(fcfg.get("min_matches", 30))),
+                              resource="cpu", priority=(i, 2)))
+        chain.append(Task("cut", name, lambda seg=seg: cut(seg), deps=[t.name for t in chain],
+                          resource="light", priority=(i, 3)))
+        tasks += chain
+    n = len(segments)
+    tasks.append(Task("keeplist", None, lambda: run_cut_builder(cfg, cuts),
+                      deps=[t.name for t in tasks if t.stage == "cut"], resource="light", priority=(n, 0)))
+    tasks.append(Task("assemble", None, lambda: assemble_clean(cfg),
+                      deps=["keeplist"], resource="cpu", priority=(n, 1)))
+
+    limits = _limits(cfg, transcriber)
+    print(f"[DAG] {n} segmento(s), {len(tasks)} tareas, límites {limits}")
+    try:
+        rc = run_dag(tasks, limits)
+    finally:
+        transcriber.close()
+        cache.save()
+    lake.compact_partition(cfg)   # un parquet por tabla y día
+    return rc
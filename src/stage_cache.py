@@ -0,0 +1,90 @@
+import hashlib, json, os, threading
+from pathlib import Path
+
+CACHE_FILE = "_stage_cache.json"
+
+def config_slice(cfg: dict, keys) -> dict:
+    """Subconjunto de config del que depende una etapa (p.ej. ["ad_heuristics", "whisper.model"])."""
+    out = {}
+    for k in keys:
+        v = cfg
+        for part in k.split("."):
+            v = v.get(part) if isinstance(v, dict) else None
+        out[k] = v
+    return out
+
+class StageCache:
+    """
+    Manifest de caché por partición: para cada salida de Silver/Gold guarda
+    la clave (hash de contenido de las entradas + claves de config de la etapa).
+    Si la clave no cambió y la salida sigue existiendo, la etapa se saltea.
+
+    Los hashes de archivos se memorizan por (size, mtime_ns) para no releer
+    los segmentos Bronze en cada corrida. Una misma instancia se puede
+    compartir entre hilos (el scheduler de run-post corre etapas en paralelo).
+    """
+    def __init__(self, path: Path, enabled: bool = True):
+        self.path = Path(path)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._new = {"files": {}, "outputs": {}}
+        self.data = {"files": {}, "outputs": {}}
+        if self.path.exists():
+            try:
+                self.data = json.loads(self.path.read_text(encoding="utf-8"))
+            except Exception:
+                pass  # manifest corrupto -> recalcular todo
+        self.data.setdefault("files", {}); self.data.setdefault("outputs", {})
+
+    @classmethod
+    def for_dir(cls, d: Path, cfg: dict):
+        return cls(Path(d) / CACHE_FILE, enabled=cfg.get("cache", {}).get("enabled", True))
+
+    def file_hash(self, path) -> str:
+        path = str(path)
+        st = os.stat(path)
+        memo = self.data["files"].get(path)
+        if memo and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            return memo[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self.data["files"][path] = self._new["files"][path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def key(self, stage: str, inputs, cfg: dict, cfg_keys=()) -> str:
+        h = hashlib.sha256(stage.encode())
+        for p in inputs:
+            h.update(str(p).encode())
+            h.update(self.file_hash(p).encode() if os.path.exists(p) else b"-")
+        h.update(json.dumps(config_slice(cfg, cfg_keys), sort_keys=True, ensure_ascii=False).encode())
+        return h.hexdigest()
+
+    def fresh(self, output, key: str) -> bool:
+        if not self.enabled:
+            return False
+        return self.data["outputs"].get(str(output)) == key and Path(output).exists()
+
+    def record(self, output, key: str):
+        with self._lock:
+            self.data["outputs"][str(output)] = self._new["outputs"][str(output)] = key
+
+    def updates(self) -> dict:
+        """Entradas escritas por esta instancia (un worker de otro proceso las devuelve al padre)."""
+        with self._lock:
+            return {k: dict(v) for k, v in self._new.items()}
+
+    def merge(self, updates: dict):
+        with self._lock:
+            for k, v in updates.items():
+                self.data[k].update(v)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
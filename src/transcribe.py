@@ -1,14 +1,304 @@
-import os, glob, shlex, subprocess
+import os, glob, re, resource, shlex, threading, time
+from bisect import bisect_right
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
 from pathlib import Path
+import numpy as np
 from .config import load_config
 from .paths import bronze_dir, silver_dir
-from faster_whisper import WhisperModel
+from .stage_cache import StageCache
+from .transcript import write_transcript, load_transcript, transcript_path
+from .audio_analysis import load_audio_meta, speech_regions, vad_meta
+from .pcm import cached_pcm, decode_cfg, SAMPLE_RATE
+from . import lake, metrics
+
+# claves de config que cambian el texto transcripto (workers/cpu_threads no)
+CACHE_KEYS = ["whisper.backend", "whisper.model", "whisper.language", "whisper.output_format",
+              "whisper.compute_type", "whisper.vad", "whisper.batch", "whisper.word_timestamps"]
+# separador de silencio entre regiones de voz concatenadas
+REGION_GAP_SEC = 0.2
 
 def _call(cmd):
     print("Running:", cmd if isinstance(cmd,str) else " ".join(shlex.quote(c) for c in cmd))
-    return subprocess.call(cmd, shell=isinstance(cmd, str))
+    return metrics.call(cmd, shell=isinstance(cmd, str))
+
+def _mapped(x, f):
+    """Segmento de Whisper con sus tiempos (y los de sus palabras) pasados por f."""
+    words = [SimpleNamespace(start=f(w.start), end=f(w.end), word=w.word) for w in (getattr(x, "words", None) or ())]
+    return SimpleNamespace(start=f(x.start), end=f(x.end), text=x.text, words=words)
+
+# --- Pool de workers con modelo "caliente" ---
+# Cada proceso carga WhisperModel una sola vez (initializer) y después
+# recibe segmentos de a uno. El modelo vive en un global del proceso worker.
+_WORKER_MODEL = None
+_WORKER_BATCHED = None
+_WORD_TIMESTAMPS = False
+
+def _pool_sizes(wcfg: dict):
+    """Devuelve (workers, cpu_threads) para repartir los cores de la máquina."""
+    cores = os.cpu_count() or 1
+    threads = max(1, int(wcfg.get("cpu_threads", 2)))
+    workers = int(wcfg.get("workers", 0) or 0)
+    if workers <= 0:
+        workers = max(1, cores // threads)
+    return workers, threads
+
+def _init_worker(model_size: str, compute_type: str, cpu_threads: int, word_timestamps: bool = False):
+    global _WORKER_MODEL, _WORD_TIMESTAMPS
+    _WORD_TIMESTAMPS = bool(word_timestamps)
+    from faster_whisper import WhisperModel
+    _WORKER_MODEL = WhisperModel(model_size, device="cpu", compute_type=compute_type,
+                                 cpu_threads=cpu_threads, num_workers=1)
+
+def _batched():
+    """BatchedInferencePipeline sobre el modelo del worker; None si faster-whisper no lo trae (< 1.1)."""
+    global _WORKER_BATCHED
+    if _WORKER_BATCHED is None:
+        try:
+            from faster_whisper import BatchedInferencePipeline
+        except ImportError:
+            print("[WHISPER] faster-whisper sin BatchedInferencePipeline: chunks de a uno")
+            _WORKER_BATCHED = False
+        else:
+            _WORKER_BATCHED = BatchedInferencePipeline(model=_WORKER_MODEL)
+    return _WORKER_BATCHED or None
+
+def _clip_timestamps(bounds: list) -> list:
+    """
+    clip_timestamps del pipeline batcheado desde [(inicio, fin)] en muestras.
+    faster-whisper 1.1.x los usa como índices de muestra; desde 1.2 los
+    multiplica por la tasa de muestreo, así que van en segundos (sobre la
+    grilla de muestras).
+    """
+    import faster_whisper
+    version = tuple(int(x) for x in re.findall(r"\d+", getattr(faster_whisper, "__version__", "1.2"))[:2])
+    if version >= (1, 2):
+        return [{"start": s / SAMPLE_RATE, "end": e / SAMPLE_RATE} for s, e in bounds]
+    return [{"start": int(s), "end": int(e)} for s, e in bounds]
+
+def batch_cfg(wcfg: dict) -> dict:
+    """Config de whisper.batch si está activo, si no None."""
+    bcfg = wcfg.get("batch", {})
+    return bcfg if bcfg.get("enabled", False) else None
+
+def _cpu_sec() -> float:
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    return ru.ru_utime + ru.ru_stime
+
+# --- Solo regiones con voz ---
+def gather_regions(seg: str, regions: list, cfg: dict, sdir: Path = None):
+    """
+    Toma el PCM 16 kHz de `seg` (caché de Silver si hay sdir: analyze ya lo
+    decodificó) y copia solo las regiones pedidas,
+    una detrás de otra con REGION_GAP_SEC de silencio entre ellas.
+    Devuelve (audio float32, spans, duración total del segmento) con
+    spans = [(inicio_en_audio, inicio_original, duración)] en segundos.
+    """
+    gap = int(REGION_GAP_SEC * SAMPLE_RATE)
+    bounds = [(int(s * SAMPLE_RATE), int(e * SAMPLE_RATE)) for s, e in regions]
+    out = np.zeros(sum(e - s for s, e in bounds) + gap * max(0, len(bounds) - 1), dtype=np.float32)
+    spans, dst = [], 0
+    for s, e in bounds:
+        spans.append((dst / SAMPLE_RATE, s / SAMPLE_RATE, (e - s) / SAMPLE_RATE))
+        dst += e - s + gap
+    pcm = cached_pcm(seg, cfg, sdir)
+    for (s, e), (c, _, _) in zip(bounds, spans):
+        s, e = min(s, len(pcm)), min(e, len(pcm))
+        d = int(c * SAMPLE_RATE)
+        out[d:d + e - s] = pcm[s:e] * (1 / 32768)
+    return out, spans, len(pcm) / SAMPLE_RATE
+
+def to_original(t: float, spans: list, starts: list = None) -> float:
+    """Tiempo en el audio concatenado → tiempo en el segmento original."""
+    starts = starts or [c for c, _, _ in spans]
+    k = max(0, bisect_right(starts, t) - 1)
+    c, o, d = spans[k]
+    return o + min(max(0.0, t - c), d)
+
+# --- Chunks alineados a silencios + inferencia batcheada ---
+def _cut_points(meta: dict, spans: list) -> np.ndarray:
+    """
+    Cortes candidatos en el audio concatenado: el centro de cada silencio de
+    audio_analysis y de cada pausa entre tramos de voz del VAD que cae dentro
+    de una región, y el centro de cada hueco entre regiones.
+    """
+    c = np.array([x[0] for x in spans]); o = np.array([x[1] for x in spans]); d = np.array([x[2] for x in spans])
+    runs = np.asarray(meta.get("speech_runs") or [], dtype=np.float64).reshape(-1, 2)
+    pauses = np.stack((runs[:-1, 1], runs[1:, 0]), axis=1)
+    mid = np.concatenate((np.asarray(meta.get("silences") or [], dtype=np.float64).reshape(-1, 2), pauses)).mean(axis=1)
+    k = np.searchsorted(o, mid, side="right") - 1
+    ok = k >= 0
+    mid, k = mid[ok], k[ok]
+    inside = mid <= o[k] + d[k]
+    return np.sort(np.concatenate((c[k[inside]] + mid[inside] - o[k[inside]], c[1:] - REGION_GAP_SEC / 2)))
+
+def chunk_bounds(length: float, cuts: np.ndarray, max_sec: float = 30.0, min_sec: float = 15.0) -> list:
+    """
+    Parte [0, length] en chunks de a lo sumo max_sec: cada uno termina en el
+    último corte candidato después de min_sec, o a max_sec si no hay ninguno.
+    """
+    out, s = [], 0.0
+    while length - s > max_sec:
+        k = int(np.searchsorted(cuts, s + max_sec, side="right"))
+        c = float(cuts[k - 1]) if k and cuts[k - 1] >= s + min_sec else s + max_sec
+        out.append((s, c))
+        s = c
+    if length > s:
+        out.append((s, length))
+    return out
+
+def _decode(seg: str, cfg: dict, sdir: Path = None) -> np.ndarray:
+    return cached_pcm(seg, cfg, sdir).astype(np.float32) * (1 / 32768)
+
+def _chunk_by_chunk(audio: np.ndarray, clips: list, lang: str):
+    """Sin pipeline batcheado: mismo resultado pasando los chunks de a uno."""
+    for c in clips:
+        segs, _ = _WORKER_MODEL.transcribe(audio[int(c["start"] * SAMPLE_RATE):int(c["end"] * SAMPLE_RATE)],
+                                           language=lang, word_timestamps=_WORD_TIMESTAMPS)
+        for x in segs:
+            yield _mapped(x, lambda t, c0=c["start"]: c0 + t)
+
+def _transcribe_chunks(items: list, sdir: str, lang: str, bcfg: dict, dcfg: dict = None) -> list:
+    """
+    Corre en el worker: `items` = [(seg, regiones o None)]. Arma un único
+    buffer con el audio de todos los segmentos, lo parte en chunks parejos
+    alineados a silencios y los pasa juntos por el pipeline batcheado
+    (batch_size chunks por pasada del modelo). Los tiempos vuelven a cada
+    segmento original y se escribe un VTT por segmento.
+    Devuelve [(seg, audio_sec, wall_sec, cpu_sec)], con wall/cpu del lote
+    repartidos según la duración de cada segmento.
+    """
+    t0 = time.perf_counter(); c0 = _cpu_sec()
+    cfg = dcfg or {"paths": {}}
+    max_sec = float(bcfg.get("chunk_sec", 30.0))
+    min_sec = float(bcfg.get("min_chunk_sec", max_sec / 2))
+    audios, owners, clips, bounds, segs = [], [], [], [], []
+    off = 0
+    for i, (seg, regions) in enumerate(items):
+        if regions is None:
+            audio = _decode(seg, cfg, sdir)
+            duration = len(audio) / SAMPLE_RATE
+            spans = [(0.0, 0.0, duration)]
+        else:
+            audio, spans, duration = gather_regions(seg, regions, cfg, sdir)
+        base = off / SAMPLE_RATE
+        for s, e in chunk_bounds(len(audio) / SAMPLE_RATE, _cut_points(load_audio_meta(sdir, seg), spans),
+                                 max_sec, min_sec):
+            # límites en muestras para el pipeline; los segundos quedan para mapear a cada segmento
+            b0, b1 = off + int(round(s * SAMPLE_RATE)), off + int(round(e * SAMPLE_RATE))
+            bounds.append((b0, b1))
+            clips.append({"start": b0 / SAMPLE_RATE, "end": b1 / SAMPLE_RATE})
+            owners.append(i)
+        segs.append((seg, spans, duration, base))
+        audios.append(audio)
+        off += len(audio)
+    audio = np.concatenate(audios) if audios else np.zeros(0, dtype=np.float32)
+    out = [[] for _ in items]
+    if clips:
+        pipe = _batched()
+        if pipe is not None:
+            result, _ = pipe.transcribe(audio, language=lang, clip_timestamps=_clip_timestamps(bounds),
+                                        vad_filter=False,
+                                        batch_size=int(bcfg.get("batch_size", 8)),
+                                        word_timestamps=_WORD_TIMESTAMPS)
+        else:
+            result = _chunk_by_chunk(audio, clips, lang)
+        clip_starts = [c["start"] for c in clips]
+        for x in result:
+            k = max(0, bisect_right(clip_starts, x.start) - 1)
+            seg, spans, _, base = segs[owners[k]]
+            hi = clips[k]["end"]
+            out[owners[k]].append(_mapped(x, lambda t: to_original(min(t, hi) - base, spans)))
+    for (seg, _, _, _), lines in zip(segs, out):
+        write_transcript(sdir, seg, lines)
+    wall = time.perf_counter() - t0; cpu = _cpu_sec() - c0
+    total = sum(d for _, _, d, _ in segs) or 1.0
+    lens = [c["end"] - c["start"] for c in clips]
+    print(f"[WHISPER] lote: {len(items)} segmento(s), {len(clips)} chunks "
+          f"(prom {np.mean(lens) if lens else 0:.1f}s), wall={wall:.1f}s")
+    return [(seg, d, wall * d / total, cpu * d / total) for seg, _, d, _ in segs]
+
+def _transcribe_one(seg: str, sdir: str, lang: str, regions: list = None, dcfg: dict = None, batch: dict = None):
+    """
+    Corre en el worker: transcribe un segmento (o solo sus regiones de voz)
+    y devuelve (seg, audio_sec, wall_sec, cpu_sec).
+    """
+    if batch:
+        return _transcribe_chunks([(seg, regions)], sdir, lang, batch, dcfg)[0]
+    t0 = time.perf_counter(); c0 = _cpu_sec()
+    cfg = dcfg or {"paths": {}}
+    if regions is None:
+        audio = _decode(seg, cfg, sdir)
+        segs, _ = _WORKER_MODEL.transcribe(audio, language=lang, word_timestamps=_WORD_TIMESTAMPS)
+        write_transcript(sdir, seg, segs)  # segs es lazy: transcribe acá
+        return seg, len(audio) / SAMPLE_RATE, time.perf_counter() - t0, _cpu_sec() - c0
+    audio, spans, duration = gather_regions(seg, regions, cfg, sdir)
+    segs, _ = _WORKER_MODEL.transcribe(audio, language=lang, word_timestamps=_WORD_TIMESTAMPS)
+    starts = [c for c, _, _ in spans]
+    write_transcript(sdir, seg, (_mapped(x, lambda t: to_original(t, spans, starts)) for x in segs))
+    return seg, duration, time.perf_counter() - t0, _cpu_sec() - c0
 
-def transcribe_segments(cfg: dict = None):
+def open_whisper_pool(wcfg: dict, max_segments: int = None) -> ProcessPoolExecutor:
+    """Arranca el pool de workers; cada uno carga el modelo una sola vez."""
+    workers, threads = _pool_sizes(wcfg)
+    if max_segments:
+        workers = min(workers, max_segments)
+    model_size = wcfg.get("model", "small")
+    compute_type = wcfg.get("compute_type", "int8")
+    print(f"[WHISPER] pool: workers={workers} cpu_threads={threads} model={model_size} compute_type={compute_type}")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                               initializer=_init_worker,
+                               initargs=(model_size, compute_type, threads, wcfg.get("word_timestamps", False)))
+
+def submit_segment(ex: ProcessPoolExecutor, seg: str, sdir: Path, lang: str, regions: list = None,
+                   dcfg: dict = None, batch: dict = None):
+    return ex.submit(_transcribe_one, seg, str(sdir), lang, regions, dcfg, batch)
+
+def submit_batch(ex: ProcessPoolExecutor, segs: list, sdir: Path, lang: str, plan: dict, batch: dict,
+                 dcfg: dict = None):
+    return ex.submit(_transcribe_chunks, [(seg, plan.get(seg)) for seg in segs], str(sdir), lang, batch, dcfg)
+
+def batch_lots(segments: list, workers: int, per_lot: int) -> list:
+    """Segmentos consecutivos en lotes de hasta per_lot, sin dejar workers ociosos."""
+    per_lot = max(1, min(per_lot, -(-len(segments) // max(1, workers))))
+    return [segments[i:i + per_lot] for i in range(0, len(segments), per_lot)]
+
+def report_rtf(seg: str, audio_sec: float, wall: float, cpu: float = None):
+    rtf = wall / audio_sec if audio_sec else 0.0
+    print(f"[WHISPER] {Path(seg).name}: audio={audio_sec:.1f}s wall={wall:.1f}s RTF={rtf:.3f}")
+    metrics.emit("segment", stage="transcribe", segment=Path(seg).name, audio_sec=audio_sec,
+                 wall_sec=wall, cpu_sec=cpu, rtf=rtf)
+
+def _transcribe_pool(segments, sdir: Path, lang: str, wcfg: dict, on_done=None, plan: dict = None, dcfg: dict = None) -> int:
+    t_start = time.perf_counter()
+    total_audio = 0.0
+    rc = 0
+    plan = plan or {}
+    batch = batch_cfg(wcfg)
+    with open_whisper_pool(wcfg, len(segments)) as ex:
+        if batch:
+            lots = batch_lots(segments, _pool_sizes(wcfg)[0], int(batch.get("segments", 4)))
+            futs = {submit_batch(ex, lot, sdir, lang, plan, batch, dcfg): lot for lot in lots}
+        else:
+            futs = {submit_segment(ex, seg, sdir, lang, plan.get(seg), dcfg): [seg] for seg in segments}
+        for fut in as_completed(futs):
+            try:
+                res = fut.result()
+            except Exception as e:
+                print("[WHISPER] error en", ", ".join(futs[fut]), "->", e)
+                rc = 1
+                continue
+            for seg, audio_sec, wall, cpu in (res if batch else [res]):
+                total_audio += audio_sec
+                report_rtf(seg, audio_sec, wall, cpu)
+                if on_done: on_done(seg)
+    elapsed = time.perf_counter() - t_start
+    if total_audio:
+        print(f"[WHISPER] total: audio={total_audio:.1f}s wall={elapsed:.1f}s RTF={elapsed/total_audio:.3f}")
+    return rc
+
+def transcribe_segments(cfg: dict = None, segments: list = None):
     cfg = cfg or load_config()
     bdir = bronze_dir(cfg)
     sdir = silver_dir(cfg)
@@ -19,11 +309,144 @@ def transcribe_segments(cfg: dict = None):
     lang = cfg["whisper"].get("language","es")
     outfmt = cfg["whisper"].get("output_format","vtt")
 
-    segments = sorted(glob.glob(str(bdir / "raw_segment_*.ts")))
+    segments = segments if segments is not None else sorted(glob.glob(str(bdir / "raw_segment_*.ts")))
     if not segments:
         print("No segments found in", bdir)
         return 1
 
+    # saltear segmentos cuyo VTT ya corresponde al mismo audio + config de whisper
+    cache = StageCache.for_dir(sdir, cfg)
+    vcfg = cfg["whisper"].get("vad", {})
+    gate = vcfg.get("enabled", True)
+    keys = {seg: segment_key(cache, cfg, sdir, seg) for seg in segments}
+    segments = [seg for seg in segments if not cache.fresh(transcript_path(sdir, seg), keys[seg])]
+    if not segments:
+        print("[WHISPER] all transcripts up to date")
+        cache.save()
+        return 0
+    plan = speech_plan(segments, sdir, vcfg, cfg) if gate else {}
+    done = lambda seg: _finish(cfg, cache, sdir, seg, keys[seg])
+    # sin voz suficiente: transcript vacío, no pasa por Whisper
+    for seg in [s for s in segments if plan.get(s) == []]:
+        write_transcript(sdir, seg, [])
+        done(seg)
+    segments = [s for s in segments if plan.get(s) != []]
+    try:
+        return _run_backend(backend, segments, sdir, model, lang, outfmt, cfg, done, plan) if segments else 0
+    finally:
+        cache.save()
+
+def segment_key(cache: StageCache, cfg: dict, sdir: Path, seg: str) -> str:
+    """
+    Clave de caché del transcript: audio + config de whisper (+ vad_mode si
+    el VAD recorta). El plan sale del mismo VAD esté o no el audio_meta
+    (speech_plan lo calcula si falta), así que el JSON no entra en la clave.
+    """
+    gate = cfg["whisper"].get("vad", {}).get("enabled", True)
+    return cache.key("transcribe", [seg], cfg, CACHE_KEYS + (["audio_analysis.vad_mode"] if gate else []))
+
+def _finish(cfg: dict, cache: StageCache, sdir: Path, seg: str, key: str):
+    # el backend cli solo deja el VTT: load_transcript arma el sidecar la primera vez
+    tr = load_transcript(sdir, seg)
+    cache.record(transcript_path(sdir, seg), key)
+    if lake.enabled(cfg) and tr is not None:
+        lake.put_transcript(cfg, Path(seg).name, tr.blocks())
+
+class SegmentTranscriber:
+    """
+    Transcripción de a un segmento para el scheduler de run-post: misma
+    caché, plan de VAD y lake que transcribe_segments. Con backend "faster"
+    el pool de workers se abre al primer segmento y se comparte; con
+    inline=True (ya dentro de un worker, p.ej. backfill) el modelo se carga
+    una vez en este proceso y se transcribe acá mismo.
+    """
+    def __init__(self, cfg: dict, cache: StageCache, inline: bool = False):
+        self.cfg = cfg
+        self.cache = cache
+        self.sdir = silver_dir(cfg)
+        self.wcfg = cfg["whisper"]
+        self.backend = self.wcfg.get("backend", "cli")
+        self.inline = inline
+        self.ex = None
+        self._lock = threading.Lock()
+
+    def slots(self) -> int:
+        """Segmentos en vuelo que tiene sentido admitir a la vez."""
+        return _pool_sizes(self.wcfg)[0] if self.backend == "faster" else 1
+
+    def __call__(self, seg: str) -> int:
+        cfg, sdir, wcfg = self.cfg, self.sdir, self.wcfg
+        key = segment_key(self.cache, cfg, sdir, seg)
+        if self.cache.fresh(transcript_path(sdir, seg), key):
+            return 0
+        vcfg = wcfg.get("vad", {})
+        plan = speech_plan([seg], sdir, vcfg, cfg) if vcfg.get("enabled", True) else {}
+        done = lambda s: _finish(cfg, self.cache, sdir, s, key)
+        if plan.get(seg) == []:
+            write_transcript(sdir, seg, [])
+            done(seg)
+            return 0
+        lang = wcfg.get("language", "es")
+        if self.backend != "faster":
+            return _run_backend(self.backend, [seg], sdir, wcfg.get("model", "small"), lang,
+                                wcfg.get("output_format", "vtt"), cfg, done, plan)
+        batch = batch_cfg(wcfg)
+        if self.inline:
+            if _WORKER_MODEL is None:
+                _init_worker(wcfg.get("model", "small"), wcfg.get("compute_type", "int8"), _pool_sizes(wcfg)[1],
+                             wcfg.get("word_timestamps", False))
+            _, audio_sec, wall, cpu = _transcribe_one(seg, str(sdir), lang, plan.get(seg), decode_cfg(cfg), batch)
+        else:
+            with self._lock:
+                if self.ex is None:
+                    self.ex = open_whisper_pool(wcfg)
+            _, audio_sec, wall, cpu = submit_segment(self.ex, seg, sdir, lang, plan.get(seg), decode_cfg(cfg),
+                                                     batch).result()
+        report_rtf(seg, audio_sec, wall, cpu)
+        done(seg)
+        return 0
+
+    def close(self):
+        if self.ex is not None:
+            self.ex.shutdown(wait=True)
+            self.ex = None
+
+def speech_plan(segments: list, sdir: Path, vcfg: dict, cfg: dict = None) -> dict:
+    """
+    seg -> regiones de voz a transcribir, [] para saltear el segmento
+    (voz total < min_speech_sec), None para transcribirlo entero (sin
+    timeline de VAD o con voz casi continua). Con cfg, si analyze todavía
+    no dejó el timeline se corre solo el VAD (vad_meta) sobre la caché de
+    PCM: transcribe no tiene que esperar al análisis.
+    """
+    pad = float(vcfg.get("pad_sec", 0.3))
+    gap = float(vcfg.get("merge_gap_sec", 1.0))
+    min_speech = float(vcfg.get("min_speech_sec", 5.0))
+    max_share = float(vcfg.get("max_speech_share", 0.9))
+    plan = {}
+    for seg in segments:
+        meta = load_audio_meta(sdir, seg, cfg)
+        if cfg is not None and meta.get("speech_runs") is None:
+            meta = vad_meta(seg, cfg, sdir)
+        regions = speech_regions(meta, pad, gap)
+        if regions is None:
+            plan[seg] = None
+            continue
+        dur = float(meta.get("duration_sec") or 0.0)
+        speech = sum(e - s for s, e in regions)
+        if speech < min_speech:
+            plan[seg] = []
+            print(f"[WHISPER] {Path(seg).name}: sin voz ({speech:.1f}s) → se saltea")
+        elif dur and speech >= max_share * dur:
+            plan[seg] = None
+        else:
+            plan[seg] = regions
+            print(f"[WHISPER] {Path(seg).name}: {len(regions)} regiones de voz, {speech:.0f}s de {dur:.0f}s")
+        metrics.emit("vad_gate", segment=Path(seg).name, duration_sec=dur, speech_sec=speech,
+                     regions=len(regions), skipped=plan[seg] == [])
+    return plan
+
+def _run_backend(backend, segments, sdir, model, lang, outfmt, cfg, done, plan=None):
     if backend == "cli":
         for seg in segments:
             cmd = [
@@ -36,24 +459,22 @@ def transcribe_segments(cfg: dict = None):
             ]
             rc = _call(cmd)
             if rc != 0: return rc
+            done(seg)
         return 0
     elif backend == "python":
         try:
             from faster_whisper import WhisperModel
         except ImportError:
-            print("Install openai-whisper or switch to 'cli' backend in config.yaml")
+            print("Install faster-whisper or switch to 'cli' backend in config.yaml")
             return 2
-        m = WhisperModel(model, device="cpu", compute_type="float16")
+        # float16 no existe en CPU: mismo compute_type que el pool
+        m = WhisperModel(model, device="cpu", compute_type=cfg["whisper"].get("compute_type", "int8"),
+                         cpu_threads=_pool_sizes(cfg["whisper"])[1])
         for seg in segments:
-            result = m.transcribe(seg, language=lang, task="transcribe")
-            vtt_path = sdir / (Path(seg).stem + ".vtt")
-            with open(vtt_path, "w", encoding="utf-8") as f:
-                f.write("WEBVTT\n\n")
-                for chunk in result["segments"]:
-                    def fmt(t):
-                        h = int(t//3600); m=int((t%3600)//60); s=(t%60)
-                        return f"{h:02d}:{m:02d}:{s:06.3f}".replace(".",",")
-                    f.write(f"{fmt(chunk['start'])} --> {fmt(chunk['end'])}\n{chunk['text'].strip()}\n\n")
+            segs, _ = m.transcribe(seg, language=lang, task="transcribe",
+                                   word_timestamps=cfg["whisper"].get("word_timestamps", False))
+            write_transcript(sdir, seg, segs)
+            done(seg)
         return 0
     elif backend == "faster":
         try:
@@ -61,19 +482,8 @@ def transcribe_segments(cfg: dict = None):
         except ImportError:
             print("Install faster-whisper or switch backend in config.yaml")
             return 2
-        model_size = model
-        model = WhisperModel(model_size, device="cpu")
-        for seg in segments:
-            segs, info = model.transcribe(seg, language=lang)
-            vtt_path = sdir / (Path(seg).stem + ".vtt")
-            with open(vtt_path, "w", encoding="utf-8") as f:
-                f.write("WEBVTT\n\n")
-                for segm in segs:
-                    def fmt(t):
-                        h = int(t//3600); m=int((t%3600)//60); s=(t%60)
-                        return f"{h:02d}:{m:02d}:{s:06.3f}".replace(".",",")
-                    f.write(f"{fmt(segm.start)} --> {fmt(segm.end)}\n{segm.text.strip()}\n\n")
-        return 0
+        return _transcribe_pool(segments, sdir, lang, cfg["whisper"], on_done=done,
+                                plan=plan, dcfg=decode_cfg(cfg))
     else:
         print("Unknown whisper backend:", backend)
         return 3
@@ -0,0 +1,206 @@
+"""
+Transcript parseado una sola vez: arrays NumPy de inicios/fines por bloque,
+el texto de todos los bloques en un único buffer UTF-8 indexado por offsets
+y, si Whisper las dio, palabras con sus tiempos.
+
+transcribe lo guarda como sidecar binario (<stem>_transcript.bin en Silver)
+y todos los detectores lo leen de ahí con mmap; el VTT queda solo como
+formato de exportación. Layout (little-endian, todo alineado a 8 bytes):
+
+    header  magic "RDTR", versión u32, n, nw, len(texto), len(texto palabras) u64
+    f8[n] starts, f8[n] ends, i8[n+1] offsets
+    f8[nw] w_starts, f8[nw] w_ends, i8[nw] w_block, i8[nw+1] w_offsets
+    texto de bloques, texto de palabras
+"""
+import mmap, os, struct
+from pathlib import Path
+import numpy as np
+
+from . import lake
+
+MAGIC = b"RDTR"
+VERSION = 1
+_HEADER = struct.Struct("<4sIQQQQ")        # 40 bytes
+_HEADER_SIZE = 48
+
+# --- VTT (solo import/export) ---
+def parse_ts(ts: str) -> float:
+    # "HH:MM:SS.mmm" o "HH:MM:SS,mmm"
+    ts = ts.replace(",", ".")
+    h,m,s = ts.split(":")
+    return int(h)*3600 + int(m)*60 + float(s)
+
+def fmt_ts(t: float) -> str:
+    h = int(t//3600); m=int((t%3600)//60); s=(t%60)
+    return f"{h:02d}:{m:02d}:{s:06.3f}".replace(".",",")
+
+def vtt_blocks(vtt_path: Path):
+    # Yields (start, end, text)
+    start = end = None
+    buf = []
+    with open(vtt_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if "-->" in line:
+                if buf and start and end:
+                    yield (start, end, " ".join(buf).strip())
+                    buf = []
+                times = line.split("-->")
+                start = times[0].strip()
+                end = times[1].strip().split(" ")[0]
+            elif line and not line.startswith("WEBVTT"):
+                buf.append(line)
+        if buf and start and end:
+            yield (start, end, " ".join(buf).strip())
+
+def _pack(texts: list):
+    """Textos → (buffer UTF-8, offsets de inicio de cada uno + fin)."""
+    raw = [t.encode("utf-8") for t in texts]
+    offs = np.zeros(len(raw) + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in raw], out=offs[1:])
+    return b"".join(raw), offs
+
+class Transcript:
+    __slots__ = ("starts", "ends", "offsets", "text", "w_starts", "w_ends", "w_block", "w_offsets", "w_text", "_mm")
+
+    def __init__(self, starts, ends, offsets, text, w_starts=None, w_ends=None, w_block=None,
+                 w_offsets=None, w_text=b"", _mm=None):
+        self.starts, self.ends, self.offsets, self.text = starts, ends, offsets, text
+        self.w_starts = np.zeros(0) if w_starts is None else w_starts
+        self.w_ends = np.zeros(0) if w_ends is None else w_ends
+        self.w_block = np.zeros(0, dtype=np.int64) if w_block is None else w_block
+        self.w_offsets = np.zeros(1, dtype=np.int64) if w_offsets is None else w_offsets
+        self.w_text = w_text
+        self._mm = _mm
+
+    # --- Construcción ---
+    @classmethod
+    def from_segments(cls, segs) -> "Transcript":
+        """Segmentos de Whisper (start, end, text y opcionalmente words[start, end, word])."""
+        starts, ends, texts = [], [], []
+        ws, we, wb, wt = [], [], [], []
+        for x in segs:
+            for w in getattr(x, "words", None) or ():
+                ws.append(w.start); we.append(w.end); wb.append(len(texts)); wt.append(w.word.strip())
+            starts.append(x.start); ends.append(x.end); texts.append(x.text.strip())
+        text, offs = _pack(texts)
+        w_text, w_offs = _pack(wt)
+        return cls(np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64), offs, text,
+                   np.asarray(ws, dtype=np.float64), np.asarray(we, dtype=np.float64),
+                   np.asarray(wb, dtype=np.int64), w_offs, w_text)
+
+    @classmethod
+    def from_blocks(cls, blocks) -> "Transcript":
+        """Iterable de (start_sec, end_sec, text)."""
+        blocks = list(blocks)
+        text, offs = _pack([t for _, _, t in blocks])
+        return cls(np.asarray([s for s, _, _ in blocks], dtype=np.float64),
+                   np.asarray([e for _, e, _ in blocks], dtype=np.float64), offs, text)
+
+    @classmethod
+    def from_vtt(cls, vtt_path: Path) -> "Transcript":
+        return cls.from_blocks((parse_ts(s), parse_ts(e), t) for s, e, t in vtt_blocks(vtt_path))
+
+    # --- Acceso ---
+    def __len__(self):
+        return len(self.starts)
+
+    def block(self, i: int) -> str:
+        return bytes(self.text[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def texts(self) -> list:
+        """Texto de cada bloque (una sola decodificación del buffer)."""
+        offs = self.offsets.tolist()
+        buf = bytes(self.text)
+        return [buf[a:b].decode("utf-8") for a, b in zip(offs[:-1], offs[1:])]
+
+    def words(self, i: int = None) -> list:
+        """[(start, end, palabra)] de todo el transcript o solo del bloque i."""
+        idx = range(len(self.w_starts)) if i is None else np.flatnonzero(self.w_block == i).tolist()
+        buf = bytes(self.w_text)
+        offs = self.w_offsets
+        return [(float(self.w_starts[k]), float(self.w_ends[k]), buf[offs[k]:offs[k + 1]].decode("utf-8"))
+                for k in idx]
+
+    def blocks(self):
+        """(start_sec, end_sec, text) por bloque, como vtt_blocks pero con tiempos en segundos."""
+        return zip(self.starts.tolist(), self.ends.tolist(), self.texts())
+
+    # --- Persistencia ---
+    def save(self, path: Path) -> Path:
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}")
+        n, nw = len(self.starts), len(self.w_starts)
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, n, nw, len(self.text), len(self.w_text)).ljust(_HEADER_SIZE, b"\0"))
+            for a, dt in ((self.starts, "<f8"), (self.ends, "<f8"), (self.offsets, "<i8"), (self.w_starts, "<f8"),
+                          (self.w_ends, "<f8"), (self.w_block, "<i8"), (self.w_offsets, "<i8")):
+                f.write(np.ascontiguousarray(a, dtype=dt).tobytes())
+            f.write(bytes(self.text)); f.write(bytes(self.w_text))
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "Transcript":
+        """Mapea el sidecar: los arrays y el texto son vistas sobre el mmap, sin copia."""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= _HEADER_SIZE:
+                raise ValueError(f"transcript vacío o truncado: {path}")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n, nw, tlen, wtlen = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"transcript con formato desconocido: {path}")
+        pos = _HEADER_SIZE
+        arrays = []
+        for count, dt in ((n, "<f8"), (n, "<f8"), (n + 1, "<i8"), (nw, "<f8"), (nw, "<f8"), (nw, "<i8"), (nw + 1, "<i8")):
+            arrays.append(np.frombuffer(mm, dtype=dt, count=count, offset=pos))
+            pos += count * 8
+        text = memoryview(mm)[pos:pos + tlen]
+        w_text = memoryview(mm)[pos + tlen:pos + tlen + wtlen]
+        s, e, o, ws, we, wb, wo = arrays
+        return cls(s, e, o, text, ws, we, wb, wo, w_text, _mm=mm)
+
+    def to_vtt(self, vtt_path: Path) -> Path:
+        with open(vtt_path, "w", encoding="utf-8") as f:
+            f.write("WEBVTT\n\n")
+            for s, e, t in self.blocks():
+                f.write(f"{fmt_ts(s)} --> {fmt_ts(e)}\n{t}\n\n")
+        return Path(vtt_path)
+
+def transcript_path(sdir: Path, seg: str) -> Path:
+    return Path(sdir) / (Path(seg).stem + "_transcript.bin")
+
+def load_transcript(sdir: Path, seg: str, cfg: dict = None):
+    """
+    Transcript de un segmento: con cfg y el lake habilitado, desde la tabla
+    transcripts; si no (o el segmento no está en el lake), desde su sidecar.
+    None si no hay transcripción. Si solo hay VTT (CLI de whisper,
+    particiones viejas) o el VTT es más nuevo, se parsea una vez y se deja
+    el sidecar para las próximas lecturas.
+    """
+    if cfg is not None:
+        blocks = lake.get_transcript(cfg, Path(seg).name)
+        if blocks is not None:
+            return Transcript.from_blocks(blocks)
+    p = transcript_path(sdir, seg)
+    vtt = Path(sdir) / (Path(seg).stem + ".vtt")
+    try:
+        vtt_mtime = vtt.stat().st_mtime_ns
+    except OSError:
+        vtt_mtime = None
+    try:
+        if vtt_mtime is None or p.stat().st_mtime_ns >= vtt_mtime:
+            return Transcript.load(p)
+    except (OSError, ValueError):
+        if vtt_mtime is None:
+            return None
+    tr = Transcript.from_vtt(vtt)
+    tr.save(p)
+    return tr
+
+def write_transcript(sdir: Path, seg: str, segs) -> Transcript:
+    """Guarda el sidecar y exporta el VTT (el VTT primero: el sidecar queda igual o más nuevo)."""
+    tr = Transcript.from_segments(segs)
+    tr.to_vtt(Path(sdir) / (Path(seg).stem + ".vtt"))
+    tr.save(transcript_path(sdir, seg))
+    return tr
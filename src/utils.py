@@ -3,6 +3,7 @@ import shlex
 from dateutil import tz
 from datetime import datetime
 import os
+import shutil
 
 def run(cmd, shell=False):
     """Run a subprocess command and stream output. Returns returncode."""
@@ -18,3 +19,7 @@ def now_local(tz_name: str = "UTC"):
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
     return path
+
+def ffmpeg_bin(cfg: dict) -> str:
+    """Ruta de ffmpeg: paths.ffmpeg en config o el de PATH."""
+    return cfg.get("paths", {}).get("ffmpeg") or shutil.which("ffmpeg") or "ffmpeg"
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# los tests importan el paquete como `src.*`, igual que pipeline.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,28 @@
+from src.assemble import edit_points, split_entries
+
+SEG = "/bronze/raw_segment_{:03d}_20261018.ts"
+DUR = {SEG.format(i): 600.02 for i in range(6)}
+
+def _e(i, inpoint=None, outpoint=None):
+    return {"file": SEG.format(i), "inpoint": inpoint, "outpoint": outpoint}
+
+def test_fine_keeplist_whole_segments_are_continuous():
+    # write_keep_list_fine escribe inpoint/outpoint aun para segmentos enteros
+    entries = [_e(0, 0.0, 600.02), _e(1, 0.0, 600.0), _e(2, 0.0, 250.0), _e(2, 300.0, 600.02), _e(3, 0.0, 600.02)]
+    assert edit_points(entries, DUR) == [False, False, True, False]
+
+def test_fine_keeplist_cut_at_segment_start_is_edit():
+    entries = [_e(0, 0.0, 600.02), _e(1, 12.5, 600.02)]
+    assert edit_points(entries, DUR) == [True]
+
+def test_segment_keeplist_skipped_segment_is_edit():
+    # detect_ads.write_keep_list: solo líneas `file`
+    entries = [_e(0), _e(1), _e(3), _e(4)]
+    assert edit_points(entries, DUR) == [False, True, False]
+
+def test_split_only_at_edit_points():
+    entries = [_e(i) for i in (0, 1, 2, 4, 5)]
+    edits = edit_points(entries, DUR)
+    chunks = split_entries(entries, 4, DUR, edits)
+    assert [len(c) for c in chunks] == [3, 2]
+    assert split_entries([_e(i) for i in range(6)], 4, DUR, [False] * 5) == [[_e(i) for i in range(6)]]
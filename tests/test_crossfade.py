@@ -0,0 +1,28 @@
+import io
+
+import numpy as np
+
+from src.assemble_crossfade import CrossfadeWriter
+
+def _blocks(x, n=1000):
+    return (x[i:i + n] for i in range(0, len(x), n))
+
+def _render(parts, crossfades, xfade=500):
+    out = io.BytesIO()
+    w = CrossfadeWriter(out, xfade, 1)
+    for x, cf in zip(parts, crossfades):
+        w.add(_blocks(x), crossfade=cf)
+    w.close()
+    return np.frombuffer(out.getvalue(), dtype=np.int16), w.joins
+
+def test_continuous_join_is_butt_joined():
+    tone = (8000 * np.sin(np.arange(6000) / 10)).astype(np.float32)[:, None]
+    y, joins = _render([tone[:2500], tone[2500:]], [True, False])
+    assert joins == 0
+    assert np.array_equal(y, tone[:, 0].astype(np.int16))
+
+def test_edit_point_is_crossfaded():
+    a = np.full((3000, 1), 1000, np.float32); b = np.full((3000, 1), -1000, np.float32)
+    y, joins = _render([a, b], [True, True])
+    assert joins == 1 and len(y) == 6000 - 500
+    assert np.all(np.abs(y[2500:3000]) < 1000)   # la unión está mezclada
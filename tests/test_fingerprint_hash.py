@@ -0,0 +1,20 @@
+import numpy as np
+
+from src.fingerprint import F_BINS, SAMPLE_RATE, peak_hashes, spectral_peaks
+
+def test_peaks_fit_hash_layout():
+    # tono casi en Nyquist: antes daba picos en el bin 512 y pisaba el bit bajo de f_ancla
+    t = np.arange(SAMPLE_RATE * 20) / SAMPLE_RATE
+    rng = np.random.default_rng(0)
+    x = (np.sin(2 * np.pi * (SAMPLE_RATE / 2 - 0.1) * t) + 0.5 * np.sin(2 * np.pi * 1000 * t) * (t % 2 < 1)
+         + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+    tt, f = spectral_peaks(x)
+    assert len(f) and f.max() < F_BINS
+
+def test_hash_fields_round_trip():
+    t = np.array([0, 3, 10, 70], np.int32)
+    f = np.array([511, 450, 511, 430], np.int32)
+    h, anchors = peak_hashes(t, f)
+    i = anchors.astype(np.int64)
+    pairs = {(int(a), int(h_ >> 15), int((h_ >> 6) & (F_BINS - 1)), int(h_ & 63)) for a, h_ in zip(i, h)}
+    assert (0, 511, 450, 3) in pairs and (3, 450, 511, 7) in pairs
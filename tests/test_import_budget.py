@@ -0,0 +1,13 @@
+import pytest
+
+from src.bench import IMPORT_RSS_MB, IMPORT_SEC, probe_import
+from src.pipeline import STAGES
+
+@pytest.mark.parametrize("command", list(STAGES))
+def test_command_import_budget(command):
+    # mejor de 3: el primer arranque paga la caché de disco fría
+    runs = [probe_import(command) for _ in range(3)]
+    best = min(runs, key=lambda r: r["import_sec"])
+    assert not best["heavy"], f"{command} carga {best['heavy']} al arrancar"
+    assert best["import_sec"] <= IMPORT_SEC, f"{command}: {best['import_sec']:.3f}s"
+    assert best["rss_mb"] <= IMPORT_RSS_MB, f"{command}: {best['rss_mb']:.1f}MB"
@@ -0,0 +1,21 @@
+from pathlib import Path
+from unittest import mock
+
+from src import pcm
+
+def test_evict_drops_entries_removed_by_another_process(tmp_path):
+    for n in "abc":
+        (tmp_path / f"{n}.s16").write_bytes(b"\0" * 1024)
+    for n in "ab":
+        pcm._evict({}, tmp_path, tmp_path / f"{n}.s16")
+    samefile = Path.samefile
+
+    def racy(self, other):   # otro proceso borra a.s16 entre el stat y el samefile
+        if self.name == "a.s16" and self.exists():
+            self.unlink()
+        return samefile(self, other)
+
+    with mock.patch.object(Path, "samefile", racy):
+        pcm._evict({"pcm_cache": {"max_gb": 1500 / 2**30}}, tmp_path, tmp_path / "c.s16")
+    assert sorted(p.name for p in tmp_path.glob("*.s16")) == ["c.s16"]
+    assert pcm._load_index(tmp_path) == {"c.s16": 1024}